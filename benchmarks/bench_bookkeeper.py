@@ -0,0 +1,289 @@
+"""
+Benchmarks for repositories and presenter refresh paths.
+
+Generates synthetic ledgers over a category tree, times every repository
+operation for each backend and the presenter refresh paths against a stub
+view. Results are printed (or written to --output) as JSON, so runs can be
+compared with each other.
+
+Usage (from the project root):
+    python -m benchmarks.bench_bookkeeper --sizes 10000 100000 1000000
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from os import path
+from typing import Any, Callable, Iterator
+
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.columnar_repository import ColumnarExpenseRepository
+import bookkeeper.repository.databases as my_dbs
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.repository.raw_sqlite_repository import RawSQLiteRepository
+from bookkeeper.repository.sqlite_profile import PROFILES
+from bookkeeper.utils import read_tree
+
+Repos = dict[str, AbstractRepository[Any]]
+
+LOAD_BATCH = 10000  # expenses per add_many while loading a ledger
+SAMPLE = 1000  # objects per timed single-object operation series
+
+
+def category_tree_lines(n_top: int = 12, n_sub: int = 8, n_leaf: int = 4) -> list[str]:
+    """ Indented text of a three-level category tree for read_tree """
+    lines = []
+    for i in range(n_top):
+        lines.append(f'category {i}')
+        for j in range(n_sub):
+            lines.append(f'    category {i}.{j}')
+            lines.extend(f'        category {i}.{j}.{k}' for k in range(n_leaf))
+    return lines
+
+
+def generate_expenses(size: int, category_pks: list[int],
+                      seed: int = 0) -> Iterator[Expense]:
+    """ Random expenses over the last three years """
+    rnd = random.Random(seed)
+    today = date.today()
+    for _ in range(size):
+        day = today - timedelta(days=rnd.randrange(3 * 365))
+        yield Expense(amount=round(rnd.uniform(10, 5000), 2),
+                      category=rnd.choice(category_pks),
+                      expense_date=day.isoformat(),
+                      added_date=f'{day.isoformat()} 12:00',
+                      comment=rnd.choice(['', 'card', 'cash', 'online']))
+
+
+def memory_repos(profile: str | None = None) -> Repos:  # pylint: disable=unused-argument
+    """ Empty in-memory repositories """
+    return {'Category': MemoryRepository[Category](indexed_fields=['name', 'parent']),
+            'Expense': MemoryRepository[Expense](),
+            'Budget': MemoryRepository[Budget](indexed_fields=['period'])}
+
+
+def columnar_repos(profile: str | None = None) -> Repos:
+    """ In-memory repositories with columnar expense storage """
+    repos = memory_repos(profile)
+    repos['Expense'] = ColumnarExpenseRepository()
+    return repos
+
+
+def sqlite_repos(profile: str | None = None) -> Repos:
+    """ Empty repositories in a temporary sqlite database """
+    if my_dbs.db.provider is None:  # pony database is bound once per process
+        SQLiteRepository.bind_database(path.join(tempfile.mkdtemp(), 'bench.db'),
+                                       profile)
+    elif profile is not None:
+        SQLiteRepository.set_profile(profile)
+    repos: Repos = {cls.__name__: SQLiteRepository(cls, cls.__name__)
+                    for cls in (Category, Expense, Budget)}
+    for repo in repos.values():
+        repo.delete_many([obj.pk for obj in repo.iter_all(batch_size=LOAD_BATCH)])
+    return repos
+
+
+def raw_sqlite_repos(profile: str | None = None) -> Repos:
+    """ Empty repositories in a new temporary database opened by sqlite3 module """
+    RawSQLiteRepository.bind_database(path.join(tempfile.mkdtemp(), 'bench.db'), profile)
+    return {cls.__name__: RawSQLiteRepository(cls, cls.__name__)
+            for cls in (Category, Expense, Budget)}
+
+
+BACKENDS: dict[str, Callable[[str | None], Repos]] = {
+    'memory': memory_repos,
+    'columnar': columnar_repos,
+    'sqlite': sqlite_repos,
+    'sqlite3': raw_sqlite_repos,
+}
+
+
+def load_ledger(repos: Repos, size: int) -> None:
+    """ Fill repositories with a category tree, budgets and <size> expenses """
+    cats = Category.create_from_tree(read_tree(category_tree_lines()), repos['Category'])
+    repos['Budget'].add_many([Budget(period) for period in ['День', 'Неделя', 'Месяц']])
+    batch = []
+    for exp in generate_expenses(size, [c.pk for c in cats]):
+        batch.append(exp)
+        if len(batch) == LOAD_BATCH:
+            repos['Expense'].add_many(batch)
+            batch = []
+    repos['Expense'].add_many(batch)
+
+
+class Timer:
+    """ Collects timings of operations in machine-readable records """
+
+    def __init__(self, backend: str, size: int, results: list[dict[str, Any]]):
+        self.backend = backend
+        self.size = size
+        self.results = results
+
+    def __call__(self, operation: str, func: Callable[[], Any], count: int = 1) -> Any:
+        start = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - start
+        self.results.append({
+            'backend': self.backend, 'size': self.size, 'operation': operation,
+            'count': count, 'seconds': seconds, 'per_op_us': seconds / count * 1e6,
+        })
+        return result
+
+
+def bench_repository(timer: Timer, repos: Repos) -> None:
+    """ Time every AbstractRepository operation on expense repository """
+    repo = repos['Expense']
+    rnd = random.Random(1)
+    pks = [exp.pk for exp in repo.iter_all(batch_size=LOAD_BATCH)]
+    sample = rnd.sample(pks, min(SAMPLE, len(pks)))
+    category = repo.get(sample[0]).category
+    month_ago = (date.today() - timedelta(days=30)).isoformat()
+    recent = {'expense_date': ('between', (month_ago, date.today().isoformat()))}
+
+    timer('get', lambda: [repo.get(pk) for pk in sample], len(sample))
+    timer('get_many', lambda: repo.get_many(sample), len(sample))
+    timer('get_all', repo.get_all, len(pks))
+    timer('get_all_where_eq', lambda: repo.get_all({'category': category}))
+    timer('get_all_where_range', lambda: repo.get_all(recent))
+    timer('get_all_two_fields', lambda: repo.get_all({'category': category, **recent}))
+    timer('get_all_order_limit',
+          lambda: repo.get_all(order_by='-expense_date', limit=100))
+    timer('get_page', lambda: repo.get_page(pks[len(pks) // 2], 1000))
+    timer('iter_all', lambda: sum(1 for _ in repo.iter_all(batch_size=LOAD_BATCH)),
+          len(pks))
+    timer('aggregate_sum', lambda: repo.aggregate('sum', 'amount', recent))
+    timer('aggregate_group_by',
+          lambda: repo.aggregate('sum', 'amount', group_by='category'))
+
+    objs = [repo.get(pk) for pk in sample]
+    for obj in objs:
+        obj.amount += 1
+    half = len(objs) // 2
+    timer('update', lambda: [repo.update(obj) for obj in objs[:half]], half)
+    timer('update_many', lambda: repo.update_many(objs[half:]), len(objs) - half)
+
+    new = list(generate_expenses(len(sample), [category], seed=2))
+    timer('add', lambda: [repo.add(exp) for exp in new[:half]], half)
+    timer('add_many', lambda: repo.add_many(new[half:]), len(new) - half)
+    timer('delete', lambda: [repo.delete(exp.pk) for exp in new[:half]], half)
+    timer('delete_many', lambda: repo.delete_many([exp.pk for exp in new[half:]]),
+          len(new) - half)
+
+
+def bench_category_tree(timer: Timer, repos: Repos) -> None:
+    """ Time hierarchy queries and subtree totals on category repository """
+    repo = repos['Category']
+    cats = repo.get_all()
+    parents = {cat.parent for cat in cats}
+    roots = [cat for cat in cats if cat.parent is None]
+    leaves = [cat for cat in cats if cat.pk not in parents]
+    timer('get_descendants', lambda: [repo.get_descendants(cat.pk) for cat in roots],
+          len(roots))
+    timer('get_ancestors', lambda: [repo.get_ancestors(cat.pk) for cat in leaves],
+          len(leaves))
+    month_ago = (date.today() - timedelta(days=30)).isoformat()
+    recent = {'expense_date': ('between', (month_ago, date.today().isoformat()))}
+    timer('rollup', lambda: repo.rollup(repos['Expense'], 'amount', 'category', recent),
+          len(cats))
+
+
+class StubView:
+    """ View replacement accepting and ignoring all presenter calls """
+
+    class _Window:  # pylint: disable=too-few-public-methods
+        def show(self) -> None:
+            """ Nothing to show """
+
+    def __init__(self) -> None:
+        self.window = self._Window()
+
+    def __getattr__(self, name: str) -> Callable[..., None]:
+        return lambda *args, **kwargs: None
+
+
+def presenter_repo_cls(repos: Repos) -> type:
+    """ Stand-in for repository class handing prepared repositories to presenter """
+
+    class PreparedRepository:  # pylint: disable=too-few-public-methods
+        """ Returns prepared repository instead of creating a new one """
+        @staticmethod
+        def bind_database(db_filename: str, profile: str | None = None) -> None:
+            """ Repositories are bound already """
+
+        def __new__(cls, data_cls: type, table_name: str) -> Any:  # type: ignore[misc]
+            return repos[table_name]
+
+    return PreparedRepository
+
+
+def bench_presenter(timer: Timer, repos: Repos) -> None:
+    """ Time presenter refresh paths against stub view """
+    from bookkeeper.presenter import Bookkeeper  # pylint: disable=import-outside-toplevel
+
+    # each presenter path is one call whatever the ledger size
+    bookkeeper = timer('presenter_init', lambda: Bookkeeper(
+        StubView(), presenter_repo_cls(repos)))
+    timer('set_expense_data', bookkeeper.set_expense_data)
+    timer('update_budget_spent_column', bookkeeper.update_budget_spent_column)
+    timer('set_budget_data', bookkeeper.set_budget_data)
+    category = repos['Category'].get_all(limit=1)[0].name
+    day = datetime.now().strftime('%d-%m-%Y')
+    timer('expense_add_callback', lambda: bookkeeper.expense_add_callback(
+        {'expense_date': day, 'amount': '100', 'category': category, 'comment': ''}))
+
+
+def run(backends: list[str], sizes: list[int],
+        profile: str | None = None) -> dict[str, Any]:
+    """ Run all benchmarks, return machine-readable report """
+    results: list[dict[str, Any]] = []
+    for size in sizes:
+        for backend in backends:
+            repos = BACKENDS[backend](profile)
+            timer = Timer(backend, size, results)
+            timer('load_ledger', lambda: load_ledger(repos, size), size)
+            bench_repository(timer, repos)
+            bench_category_tree(timer, repos)
+            bench_presenter(timer, repos)
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'backends': backends,
+            'sizes': sizes,
+            'profile': profile,
+        },
+        'results': results,
+    }
+
+
+def main() -> None:
+    """ Command line entry point """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--backends', nargs='+', choices=list(BACKENDS),
+                        default=list(BACKENDS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=[10000],
+                        help='numbers of expenses in generated ledgers')
+    parser.add_argument('--profile', choices=list(PROFILES),
+                        help='pragma profile of sqlite backends (default: none)')
+    parser.add_argument('--output', help='JSON file for results (default: stdout)')
+    args = parser.parse_args()
+
+    report = run(args.backends, args.sizes, args.profile)
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2, ensure_ascii=False)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
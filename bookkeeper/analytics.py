@@ -0,0 +1,282 @@
+"""
+Аналитика расходов: суммы по дням, неделям и месяцам, по категориям,
+скользящие средние и использование бюджета за произвольный период.
+
+Нужные столбцы расходов (дата, сумма, категория) читаются из репозитория
+один раз функцией load_columns в массивы array, после чего любые отчеты
+по ним считаются без обращения к репозиторию. Номер периода считается
+один раз для каждого дня отчета. Если установлен numpy, суммы считаются
+векторно (bincount по номерам периодов), иначе - одним циклом по массивам.
+
+Пример:
+    columns = load_columns(exp_repo, '2021-01-01', '2023-12-31')
+    monthly = totals(columns, 'month')
+    trend = moving_average(totals(columns, 'day'), 30)
+"""
+from array import array
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from itertools import compress
+from typing import Any
+
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.columnar_repository import ColumnarExpenseRepository
+from bookkeeper.utils import NONE_2_INT_CHANGER, PAGE_SIZE, date_range, optional_module
+
+np = optional_module('numpy')
+
+PERIODS = ('day', 'week', 'month')
+# период бюджета -> период отчета
+BUDGET_PERIODS = {'День': 'day', 'Неделя': 'week', 'Месяц': 'month'}
+
+
+@dataclass
+class ExpenseColumns:
+    """
+    Столбцы расходов: days - даты (порядковые номера дней, date.toordinal),
+    amounts - суммы, categories - pk категорий (None - NONE_2_INT_CHANGER)
+    """
+    days: 'array[int]' = field(default_factory=lambda: array('i'))
+    amounts: 'array[float]' = field(default_factory=lambda: array('d'))
+    categories: 'array[int]' = field(default_factory=lambda: array('q'))
+
+
+@dataclass
+class Series:
+    """
+    Ряд значений по периодам. labels - начало каждого периода:
+    'ГГГГ-ММ-ДД' для дней и недель (понедельник), 'ГГГГ-ММ' для месяцев
+    """
+    labels: list[str]
+    values: list[float]
+
+    def as_dict(self) -> dict[str, float]:
+        """ Словарь {начало периода: значение} """
+        return dict(zip(self.labels, self.values))
+
+
+def load_columns(exp_repo: AbstractRepository[Expense], start: str | None = None,
+                 end: str | None = None) -> ExpenseColumns:
+    """
+    Прочитать даты, суммы и категории расходов с датами от start до end
+    (ISO-8601, включительно). Из ColumnarExpenseRepository столбцы
+    копируются без создания объектов, из других репозиториев расходы
+    читаются одним проходом iter_all.
+    """
+    where = date_range(start, end) or None
+    if isinstance(exp_repo, ColumnarExpenseRepository):
+        raw = exp_repo.get_columns(['expense_date', 'amount', 'category'], where)
+        return ExpenseColumns(raw['expense_date'], raw['amount'], raw['category'])
+    columns = ExpenseColumns()
+    ordinals: dict[str, int] = {}
+    for exp in exp_repo.iter_all(where, batch_size=PAGE_SIZE):
+        day = ordinals.get(exp.expense_date)
+        if day is None:
+            day = ordinals[exp.expense_date] = \
+                date.fromisoformat(exp.expense_date).toordinal()
+        columns.days.append(day)
+        columns.amounts.append(exp.amount)
+        columns.categories.append(
+            NONE_2_INT_CHANGER if exp.category is None else exp.category)
+    return columns
+
+
+def _month(day: date) -> int:
+    return day.year * 12 + day.month - 1
+
+
+def _period_start(day: date, period: str | None) -> date:
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def period_labels(period: str, start: str, end: str) -> list[str]:
+    """ Начала периодов period (из PERIODS), пересекающихся с днями от start до end """
+    if period not in PERIODS:
+        raise ValueError(f'unsupported period <{period}>')
+    first = _period_start(date.fromisoformat(start), period)
+    last = date.fromisoformat(end)
+    if period == 'month':
+        return [f'{month // 12:04}-{month % 12 + 1:02}'
+                for month in range(_month(first), _month(last) + 1)]
+    step = 7 if period == 'week' else 1
+    return [date.fromordinal(day).isoformat()
+            for day in range(first.toordinal(), last.toordinal() + 1, step)]
+
+
+def _bounds(columns: ExpenseColumns, start: str | None,
+            end: str | None) -> tuple[str, str] | None:
+    """ Границы отчета: заданные или от первого до последнего расхода """
+    if start is not None and end is not None:
+        return start, end
+    if not columns.days:
+        return None
+    if np is not None:
+        days = np.frombuffer(columns.days, np.int32)
+        first, last = int(days.min()), int(days.max())
+    else:
+        first, last = min(columns.days), max(columns.days)
+    return (start or date.fromordinal(first).isoformat(),
+            end or date.fromordinal(last).isoformat())
+
+
+def _period_index(day: int, period: str | None, origin: date) -> int:
+    """ Номер периода, содержащего день day, считая от периода origin """
+    if period is None:
+        return 0
+    if period == 'month':
+        return _month(date.fromordinal(day)) - _month(origin)
+    return (day - origin.toordinal()) // (7 if period == 'week' else 1)
+
+
+def _group_sums(columns: ExpenseColumns, period: str | None, bounds: tuple[str, str],
+                by_category: bool) -> dict[int | None, list[float]]:
+    """
+    Суммы расходов с датами в границах bounds по периодам (period=None -
+    один период), для каждой категории или для всех сразу (ключ None)
+    """
+    first, last = (date.fromisoformat(bound) for bound in bounds)
+    origin = _period_start(first, period)
+    # номер периода для каждого дня отчета
+    table = [_period_index(day, period, origin)
+             for day in range(first.toordinal(), last.toordinal() + 1)]
+    if np is not None:
+        return _numpy_group_sums(columns, first.toordinal(), table, by_category)
+    n_periods = table[-1] + 1 if table else 0
+    sums: dict[int | None, list[float]] = {}
+    if not by_category:
+        sums[None] = [0.] * n_periods
+    for day, amount, category in zip(columns.days, columns.amounts, columns.categories):
+        offset = day - first.toordinal()
+        if not 0 <= offset < len(table):
+            continue
+        key = None if not by_category or category == NONE_2_INT_CHANGER else category
+        if key not in sums:
+            sums[key] = [0.] * n_periods
+        sums[key][table[offset]] += amount
+    return sums
+
+
+def _numpy_group_sums(columns: ExpenseColumns, low: int, table: list[int],
+                      by_category: bool) -> dict[int | None, list[float]]:
+    """ То же, что _group_sums, средствами numpy; low - первый день отчета """
+    n_periods = table[-1] + 1 if table else 0
+    offsets = np.frombuffer(columns.days, np.int32).astype(np.int64) - low
+    mask = (offsets >= 0) & (offsets < len(table))
+    indexes = np.array(table, np.int64)[offsets[mask]]
+    amounts = np.frombuffer(columns.amounts, np.float64)[mask]
+    if not by_category:
+        return {None: np.bincount(indexes, amounts, n_periods).tolist()}
+    categories = np.frombuffer(columns.categories, np.int64)[mask]
+    keys, groups = np.unique(categories, return_inverse=True)
+    flat = np.bincount(groups * n_periods + indexes, amounts, len(keys) * n_periods)
+    return {None if key == NONE_2_INT_CHANGER else key: row.tolist()
+            for key, row in zip(keys.tolist(), flat.reshape(len(keys), n_periods))}
+
+
+def totals(columns: ExpenseColumns, period: str = 'day', start: str | None = None,
+           end: str | None = None) -> Series:
+    """
+    Суммы расходов по периодам period ('day', 'week', 'month') с датами
+    от start до end включительно, по умолчанию - за все загруженные дни.
+    Периоды без расходов входят в ряд с нулевой суммой.
+    """
+    bounds = _bounds(columns, start, end)
+    if bounds is None:
+        return Series([], [])
+    labels = period_labels(period, *bounds)
+    sums = _group_sums(columns, period, bounds, by_category=False)
+    return Series(labels, sums[None])
+
+
+def category_totals(columns: ExpenseColumns, start: str | None = None,
+                    end: str | None = None) -> dict[int | None, float]:
+    """
+    Суммы расходов по категориям с датами от start до end,
+    в порядке убывания суммы
+    """
+    bounds = _bounds(columns, start, end)
+    if bounds is None:
+        return {}
+    sums = _group_sums(columns, None, bounds, by_category=True)
+    return dict(sorted(((key, row[0]) for key, row in sums.items()),
+                       key=lambda item: -item[1]))
+
+
+def category_series(columns: ExpenseColumns, period: str = 'month',
+                    start: str | None = None,
+                    end: str | None = None) -> dict[int | None, Series]:
+    """ Ряды totals для каждой категории, у которой есть расходы в периоде """
+    bounds = _bounds(columns, start, end)
+    if bounds is None:
+        return {}
+    labels = period_labels(period, *bounds)
+    sums = _group_sums(columns, period, bounds, by_category=True)
+    return {key: Series(labels, row) for key, row in sums.items()}
+
+
+def moving_average(series: Series, window: int) -> Series:
+    """
+    Скользящее среднее по window последним значениям ряда.
+    Первые window - 1 периодов, для которых окно неполное, пропускаются.
+    """
+    if window < 1:
+        raise ValueError(f'window must be positive, got {window}')
+    if len(series.values) < window:
+        return Series([], [])
+    if np is not None:
+        sums = np.cumsum(np.asarray(series.values, np.float64))
+        sums[window:] = sums[window:] - sums[:-window]
+        values: list[Any] = (sums[window - 1:] / window).tolist()
+    else:
+        values = []
+        total = sum(series.values[:window - 1])
+        for i in range(window - 1, len(series.values)):
+            total += series.values[i]
+            values.append(total / window)
+            total -= series.values[i - window + 1]
+    return Series(series.labels[window - 1:], values)
+
+
+def select_categories(columns: ExpenseColumns, categories: set[int]) -> ExpenseColumns:
+    """ Столбцы только тех расходов, категории которых входят в categories """
+    if np is not None:
+        mask = np.isin(np.frombuffer(columns.categories, np.int64), list(categories))
+        return ExpenseColumns(
+            array('i', np.frombuffer(columns.days, np.int32)[mask].tobytes()),
+            array('d', np.frombuffer(columns.amounts, np.float64)[mask].tobytes()),
+            array('q', np.frombuffer(columns.categories, np.int64)[mask].tobytes()))
+    selected = [category in categories for category in columns.categories]
+    return ExpenseColumns(array('i', compress(columns.days, selected)),
+                          array('d', compress(columns.amounts, selected)),
+                          array('q', compress(columns.categories, selected)))
+
+
+def budget_utilization(columns: ExpenseColumns, budget: Budget,
+                       start: str | None = None, end: str | None = None,
+                       subtrees: dict[int, set[int]] | None = None) -> Series:
+    """
+    Доля лимита бюджета, потраченная в каждом его периоде (день, неделя
+    или месяц) от start до end: 1.0 - лимит потрачен полностью.
+    При нулевом лимите доля равна inf, если в периоде есть расходы, иначе 0.
+    Бюджет категории учитывает расходы ее поддерева из subtrees
+    (см. models.budget.get_subtrees), по умолчанию - только самой категории.
+    Бюджеты интервала и скользящего окна не имеют повторяющихся периодов.
+    """
+    if budget.period not in BUDGET_PERIODS:
+        raise ValueError(f'unsupported budget period <{budget.period}>')
+    if budget.category is not None:
+        # границы отчета - по всем загруженным расходам, как у бюджетов без категории
+        start, end = _bounds(columns, start, end) or (start, end)
+        columns = select_categories(
+            columns, (subtrees or {}).get(budget.category, {budget.category}))
+    spent = totals(columns, BUDGET_PERIODS[budget.period], start, end)
+    if budget.limit:
+        return Series(spent.labels, [value / budget.limit for value in spent.values])
+    return Series(spent.labels,
+                  [float('inf') if value > 0 else 0. for value in spent.values])
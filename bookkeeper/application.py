@@ -1,13 +1,26 @@
+import argparse
 import sys
 
 from PySide6.QtWidgets import QApplication
 from bookkeeper.presenter import Bookkeeper
 from bookkeeper.view.pyqt6_view import PyQtView
 from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.repository.raw_sqlite_repository import RawSQLiteRepository
+
+# repositories working with the same database file
+BACKENDS = {
+    'pony': SQLiteRepository,
+    'sqlite3': RawSQLiteRepository,
+}
 
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description='Bookkeeper application')
+    parser.add_argument('--backend', choices=list(BACKENDS), default='pony',
+                        help='database access: pony orm or plain sqlite3 module')
+    args, qt_args = parser.parse_known_args()
+
+    app = QApplication(sys.argv[:1] + qt_args)
     view = PyQtView()
-    bookkeeper = Bookkeeper(view, SQLiteRepository)
+    bookkeeper = Bookkeeper(view, BACKENDS[args.backend], background=True)
     app.exec()
@@ -0,0 +1,149 @@
+"""
+Экспорт расходов, категорий и бюджетов в CSV и JSON Lines.
+
+Записи читаются из репозитория страницами и сразу записываются в файл,
+поэтому память не растет с размером базы. Расходы читаются страницами
+по (дата, pk) с отбором по датам в запросе репозитория, названия категорий
+берутся из кеша, который дополняется одним get_many на страницу.
+Файл с расширением .gz (или с параметром compress) сжимается gzip.
+Столбцы расходов совпадают с ожидаемыми importer, поэтому выгруженный
+файл можно загрузить обратно.
+
+Запуск из корня проекта:
+    python -m bookkeeper.exporter expenses expenses.csv.gz --start 2023-01-01
+"""
+import argparse
+import csv
+import gzip
+import json
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable, Iterator, TextIO
+
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.utils import PAGE_SIZE, expense_pages
+
+FORMATS = ('csv', 'jsonl')
+
+EXPENSE_FIELDS = ('date', 'amount', 'category', 'comment', 'added_date', 'pk')
+CATEGORY_FIELDS = ('pk', 'name', 'parent')
+BUDGET_FIELDS = ('pk', 'period', 'limit', 'spent', 'category', 'start_date', 'end_date',
+                 'days')
+
+
+@contextmanager
+def open_output(filename: str, compress: bool | None = None) -> Iterator[TextIO]:
+    """
+    Открыть файл для записи текста. compress=None - сжимать,
+    если имя оканчивается на .gz
+    """
+    if compress is None:
+        compress = filename.endswith('.gz')
+    if compress:
+        with gzip.open(filename, 'wt', encoding='utf-8', newline='') as file:
+            yield file
+    else:
+        with open(filename, 'w', encoding='utf-8', newline='') as file:
+            yield file
+
+
+def write_records(file: TextIO, records: Iterable[dict[str, Any]],
+                  fields: tuple[str, ...], fmt: str = 'csv') -> int:
+    """
+    Записать словари records в file по одному в формате fmt ('csv' с
+    заголовком fields или 'jsonl'), вернуть число записанных словарей
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f'unsupported format <{fmt}>')
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(file, fields)
+        writer.writeheader()
+        for count, record in enumerate(records, 1):
+            writer.writerow(record)
+    else:
+        for count, record in enumerate(records, 1):
+            file.write(json.dumps(record, ensure_ascii=False))
+            file.write('\n')
+    return count
+
+
+def expense_records(exp_repo: AbstractRepository[Expense],
+                    cat_repo: AbstractRepository[Category],
+                    start: str | None = None, end: str | None = None,
+                    page_size: int = PAGE_SIZE) -> Iterator[dict[str, Any]]:
+    """
+    Выдавать словари расходов с датами от start до end (ISO-8601,
+    включительно) в порядке даты и pk, с названием категории вместо ее pk
+    """
+    names: dict[int, str] = {}
+    for page in expense_pages(exp_repo, start, end, page_size):
+        yield from _expense_page(page, names, cat_repo)
+
+
+def _expense_page(page: list[Expense], names: dict[int, str],
+                  cat_repo: AbstractRepository[Category]) -> Iterator[dict[str, Any]]:
+    """ Дополнить кеш names категориями страницы одним запросом, выдать словари """
+    missing = {exp.category for exp in page}.difference(names)
+    if missing:
+        names.update((pk, cat.name) for pk, cat in cat_repo.get_many(missing).items())
+    for exp in page:
+        yield {'date': exp.expense_date, 'amount': exp.amount,
+               'category': names.get(exp.category, ''), 'comment': exp.comment,
+               'added_date': exp.added_date, 'pk': exp.pk}
+
+
+def category_records(cat_repo: AbstractRepository[Category],
+                     page_size: int = PAGE_SIZE) -> Iterator[dict[str, Any]]:
+    """ Выдавать словари категорий в порядке pk """
+    for cat in cat_repo.iter_all(batch_size=page_size):
+        yield {'pk': cat.pk, 'name': cat.name, 'parent': cat.parent}
+
+
+def budget_records(bgt_repo: AbstractRepository[Budget],
+                   page_size: int = PAGE_SIZE) -> Iterator[dict[str, Any]]:
+    """ Выдавать словари бюджетов в порядке pk """
+    for bgt in bgt_repo.iter_all(batch_size=page_size):
+        yield {'pk': bgt.pk, 'period': bgt.period, 'limit': bgt.limit,
+               'spent': bgt.spent, 'category': bgt.category,
+               'start_date': bgt.start_date, 'end_date': bgt.end_date,
+               'days': bgt.days}
+
+
+def main() -> None:
+    """ Точка входа для командной строки """
+    # pylint: disable=import-outside-toplevel
+    from bookkeeper.repository.raw_sqlite_repository import RawSQLiteRepository
+    from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+    backends: dict[str, Any] = {'pony': SQLiteRepository, 'sqlite3': RawSQLiteRepository}
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('table', choices=['expenses', 'categories', 'budgets'])
+    parser.add_argument('file', help='output file, .gz files are compressed')
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--database', default='database.db')
+    parser.add_argument('--backend', choices=list(backends), default='sqlite3')
+    parser.add_argument('--start', help='first expense date, yyyy-mm-dd')
+    parser.add_argument('--end', help='last expense date, yyyy-mm-dd')
+    args = parser.parse_args()
+
+    repo_cls = backends[args.backend]
+    repo_cls.bind_database(args.database)
+    tables: dict[str, tuple[Callable[[], Iterator[dict[str, Any]]], tuple[str, ...]]] = {
+        'expenses': (lambda: expense_records(repo_cls(Expense, 'Expense'),
+                                             repo_cls(Category, 'Category'),
+                                             args.start, args.end), EXPENSE_FIELDS),
+        'categories': (lambda: category_records(repo_cls(Category, 'Category')),
+                       CATEGORY_FIELDS),
+        'budgets': (lambda: budget_records(repo_cls(Budget, 'Budget')), BUDGET_FIELDS),
+    }
+    records, fields = tables[args.table]
+    with open_output(args.file) as file:
+        count = write_records(file, records(), fields, args.format)
+    print(f'{count} {args.table} exported to {args.file}')
+
+
+if __name__ == '__main__':
+    main()
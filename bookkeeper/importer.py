@@ -0,0 +1,277 @@
+"""
+Импорт расходов из выписки банка в формате CSV.
+
+Строки проходят через цепочку генераторов: разбор CSV, проверка и
+преобразование полей, замена названия категории на pk через кеш,
+запись пакетами через add_many, каждый пакет вместе с новыми
+категориями его строк - отдельной транзакцией.
+В памяти одновременно находится не больше одного пакета.
+
+Запуск из корня проекта:
+    python -m bookkeeper.importer statement.csv --delimiter ';' --date-format %d.%m.%Y
+"""
+import argparse
+import csv
+import math
+import sys
+from contextlib import ExitStack
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, TextIO
+
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+
+# поле расхода -> заголовок столбца в файле
+DEFAULT_COLUMNS = {'expense_date': 'date', 'amount': 'amount',
+                   'category': 'category', 'comment': 'comment'}
+
+MAX_ERRORS = 100  # сколько сообщений об ошибках хранить в статистике
+# длины полей в базе данных, см. repository.databases
+MAX_CATEGORY_LENGTH = 30
+MAX_COMMENT_LENGTH = 50
+
+
+@dataclass
+class ImportStats:
+    """
+    Ход импорта: прочитано строк, записано расходов, пропущено строк
+    (ошибки и доходы), первые MAX_ERRORS сообщений об ошибках вида
+    'строка N: причина', время от начала импорта в секундах.
+    """
+    read: int = 0
+    imported: int = 0
+    skipped: int = 0
+    errors: list[str] = field(default_factory=list)
+    started: float = field(default_factory=time.perf_counter)
+    elapsed: float = 0.
+
+    @property
+    def rows_per_second(self) -> float:
+        """ Скорость импорта в прочитанных строках в секунду """
+        return self.read / self.elapsed if self.elapsed else 0.
+
+    def skip(self, line: int, reason: str) -> None:
+        """ Учесть пропущенную строку """
+        self.skipped += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(f'строка {line}: {reason}')
+
+
+class DateParser:  # pylint: disable=too-few-public-methods
+    """
+    Преобразование даты из файла в ISO-8601 с запоминанием результатов:
+    в выписке одна и та же дата повторяется во многих строках.
+    Для форматов '%Y-%m-%d', '%d.%m.%Y' и '%d-%m-%Y' strptime не используется.
+    """
+
+    def __init__(self, date_format: str = '%Y-%m-%d') -> None:
+        self.date_format = date_format
+        self.parsed: dict[str, str] = {}
+
+    def _parse(self, text: str) -> str:
+        if self.date_format == '%Y-%m-%d':
+            return date.fromisoformat(text).isoformat()
+        if self.date_format in ('%d.%m.%Y', '%d-%m-%Y') and len(text) == 10:
+            if text[2] != self.date_format[2] or text[5] != self.date_format[2]:
+                raise ValueError(f'date {text!r} does not match {self.date_format}')
+            return date(int(text[6:]), int(text[3:5]), int(text[:2])).isoformat()
+        return datetime.strptime(text, self.date_format).date().isoformat()
+
+    def __call__(self, text: str) -> str:
+        iso = self.parsed.get(text)
+        if iso is None:
+            iso = self._parse(text)
+            self.parsed[text] = iso
+        return iso
+
+
+Row = tuple[int, str, str, str, str]
+
+
+def parse_csv(file: TextIO, delimiter: str = ',',
+              columns: dict[str, str] | None = None) -> Iterator[Row]:
+    """
+    Читать строки CSV с заголовком, выдавать кортежи текстов (номер строки,
+    дата, сумма, категория, комментарий). columns - соответствие полей
+    расхода заголовкам столбцов, по умолчанию DEFAULT_COLUMNS.
+    Столбец comment необязателен.
+    """
+    columns = {**DEFAULT_COLUMNS, **(columns or {})}
+    reader = csv.reader(file, delimiter=delimiter)
+    header = next(reader, [])
+    for name, title in columns.items():
+        if title not in header and name != 'comment':
+            raise ValueError(f'column {title!r} not found in header {header}')
+    # столбец комментария, если его нет, берется из добавленного пустого
+    positions = [header.index(columns[name]) if columns[name] in header else len(header)
+                 for name in ('expense_date', 'amount', 'category', 'comment')]
+    width = len(header) + 1
+    for row in reader:
+        if not row:
+            continue
+        if len(row) < width:
+            row += [''] * (width - len(row))
+        yield (reader.line_num, row[positions[0]], row[positions[1]],
+               row[positions[2]], row[positions[3]])
+
+
+def validate(rows: Iterable[Row], stats: ImportStats,
+             date_format: str = '%Y-%m-%d', sign: int = 1
+             ) -> Iterator[tuple[int, str, float, str, str]]:
+    """
+    Проверить и преобразовать строки, выдавать кортежи (номер строки,
+    дата в ISO-8601, сумма, название категории, комментарий). Сумма может
+    содержать пробелы и десятичную запятую, она умножается на sign (-1 для
+    выписок, где расходы отрицательные). Строки с ошибками, с неположительной
+    или бесконечной суммой (доходы) и со слишком длинным названием категории
+    пропускаются и учитываются в stats. Длинный комментарий обрезается.
+    """
+    parse_date = DateParser(date_format)
+    for line, date_text, amount_text, category, comment in rows:
+        stats.read += 1
+        try:
+            expense_date = parse_date(date_text.strip())
+            amount = sign * float(amount_text.replace(' ', '').replace(',', '.'))
+        except ValueError as error:
+            stats.skip(line, str(error))
+            continue
+        category = category.strip()
+        if not category:
+            stats.skip(line, 'empty category')
+            continue
+        if len(category) > MAX_CATEGORY_LENGTH:
+            stats.skip(line, f'category longer than {MAX_CATEGORY_LENGTH} characters')
+            continue
+        if not math.isfinite(amount):
+            stats.skip(line, f'amount {amount_text!r} is not finite')
+            continue
+        if amount <= 0:
+            stats.skip(line, 'not an expense')
+            continue
+        yield line, expense_date, amount, category, comment.strip()[:MAX_COMMENT_LENGTH]
+
+
+def resolve_categories(rows: Iterable[tuple[int, str, float, str, str]],
+                       cat_repo: AbstractRepository[Category], stats: ImportStats,
+                       create_missing: bool = True) -> Iterator[Expense]:
+    """
+    Заменить названия категорий на pk и выдавать объекты Expense.
+    Все категории читаются из репозитория один раз, новые названия
+    добавляются как категории верхнего уровня (если create_missing)
+    и запоминаются, иначе строки с ними пропускаются. Категории добавляются
+    по мере чтения строк, то есть в транзакции пакета write_batches.
+    """
+    pks = {cat.name: cat.pk for cat in cat_repo.get_all()}
+    added_date = datetime.now().strftime('%Y-%m-%d %H:%M')
+    for line, expense_date, amount, name, comment in rows:
+        pk = pks.get(name)
+        if pk is None:
+            if not create_missing:
+                stats.skip(line, f'unknown category {name!r}')
+                continue
+            pk = pks[name] = cat_repo.add(Category(name))
+        yield Expense(amount, pk, expense_date, added_date, comment)
+
+
+def write_batches(expenses: Iterable[Expense], exp_repo: AbstractRepository[Expense],
+                  stats: ImportStats, batch_size: int = 10000,
+                  cat_repo: AbstractRepository[Category] | None = None
+                  ) -> Iterator[ImportStats]:
+    """
+    Записывать расходы пакетами по batch_size, каждый пакет одной
+    транзакцией, после каждого пакета выдавать обновленную stats.
+    Пакет набирается внутри транзакции, так что категории, созданные
+    resolve_categories для его строк, при ошибке отменяются вместе с ним
+    (транзакция открывается и в cat_repo, если он задан).
+    """
+    expenses = iter(expenses)
+    while True:
+        with ExitStack() as stack:
+            if cat_repo is not None:
+                stack.enter_context(cat_repo.transaction())
+            stack.enter_context(exp_repo.transaction())
+            batch = list(islice(expenses, batch_size))
+            if not batch:
+                break
+            exp_repo.add_many(batch)
+        stats.imported += len(batch)
+        stats.elapsed = time.perf_counter() - stats.started
+        yield stats
+
+
+def import_csv(file: TextIO,  # pylint: disable=too-many-arguments
+               cat_repo: AbstractRepository[Category],
+               exp_repo: AbstractRepository[Expense], *,
+               batch_size: int = 10000, delimiter: str = ',',
+               columns: dict[str, str] | None = None,
+               date_format: str = '%Y-%m-%d', sign: int = 1,
+               create_missing: bool = True,
+               progress: Callable[[ImportStats], None] | None = None) -> ImportStats:
+    """
+    Импортировать расходы из CSV-файла file, параметры описаны
+    в функциях цепочки. progress вызывается после записи каждого пакета.
+    Вернуть итоговую статистику. Пакеты, записанные до ошибки чтения
+    файла, остаются в репозитории.
+    """
+    stats = ImportStats()
+    rows = parse_csv(file, delimiter, columns)
+    valid = validate(rows, stats, date_format, sign)
+    expenses = resolve_categories(valid, cat_repo, stats, create_missing)
+    for current in write_batches(expenses, exp_repo, stats, batch_size, cat_repo):
+        if progress is not None:
+            progress(current)
+    stats.elapsed = time.perf_counter() - stats.started
+    return stats
+
+
+def _print_progress(stats: ImportStats) -> None:
+    print(f'\r{stats.imported} imported, {stats.skipped} skipped, '
+          f'{stats.rows_per_second:.0f} rows/s', end='', file=sys.stderr)
+
+
+def main() -> None:
+    """ Точка входа для командной строки """
+    # pylint: disable=import-outside-toplevel
+    from bookkeeper.repository.raw_sqlite_repository import RawSQLiteRepository
+    from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+    backends: dict[str, Any] = {'pony': SQLiteRepository, 'sqlite3': RawSQLiteRepository}
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('file', help='CSV file with header')
+    parser.add_argument('--database', default='database.db')
+    parser.add_argument('--backend', choices=list(backends), default='sqlite3')
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--delimiter', default=',')
+    parser.add_argument('--encoding', default='utf-8')
+    parser.add_argument('--date-format', default='%Y-%m-%d')
+    parser.add_argument('--negative', action='store_true',
+                        help='expenses have negative amounts in the file')
+    parser.add_argument('--columns', nargs=4,
+                        metavar=('DATE', 'AMOUNT', 'CATEGORY', 'COMMENT'),
+                        help='column titles (default: date amount category comment)')
+    args = parser.parse_args()
+
+    repo_cls = backends[args.backend]
+    repo_cls.bind_database(args.database, profile='bulk_import')
+    columns = None
+    if args.columns:
+        columns = dict(zip(DEFAULT_COLUMNS, args.columns))
+    with open(args.file, encoding=args.encoding, newline='') as file:
+        stats = import_csv(file, repo_cls(Category, Category.__name__),
+                           repo_cls(Expense, Expense.__name__),
+                           batch_size=args.batch_size, delimiter=args.delimiter,
+                           columns=columns, date_format=args.date_format,
+                           sign=-1 if args.negative else 1, progress=_print_progress)
+    print(file=sys.stderr)
+    for error in stats.errors:
+        print(error, file=sys.stderr)
+    print(f'{stats.imported} expenses imported, {stats.skipped} rows skipped '
+          f'in {stats.elapsed:.1f} s ({stats.rows_per_second:.0f} rows/s)')
+
+
+if __name__ == '__main__':
+    main()
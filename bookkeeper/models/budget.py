@@ -2,7 +2,30 @@
 Budget class
 """
 
+import calendar
 from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Iterable
+
+from ..repository.abstract_repository import AbstractRepository
+from .category import Category
+
+RANGE_PERIOD = 'Интервал'  # fixed dates from start_date to end_date
+WINDOW_PERIOD = 'Окно'  # rolling window of the last <days> days
+PERIODS = ["День", "Неделя", "Месяц", RANGE_PERIOD, WINDOW_PERIOD]
+
+
+def get_period_bounds(period: str, day: date) -> tuple[date, date]:
+    """ First and last day of budget period <period> containing <day> """
+    if period == 'День':
+        return day, day
+    if period == 'Неделя':
+        monday = day - timedelta(days=day.weekday())
+        return monday, monday + timedelta(days=6)
+    if period == 'Месяц':
+        return (day.replace(day=1),
+                day.replace(day=calendar.monthrange(day.year, day.month)[1]))
+    raise ValueError(f'unsupported value of period <{period}>')
 
 
 @dataclass(slots=True)
@@ -11,18 +34,100 @@ class Budget:
     Budget.
     period -- period for budget
     budget -- money limit
+    category -- root of categories subtree the budget counts, None for all expenses
+    start_date, end_date -- ISO dates of RANGE_PERIOD budget, inclusive
+    days -- length of WINDOW_PERIOD budget, ending with the current day
     """
     period: str
     limit: float = 0
     spent: float = 0
     pk: int = 0
+    category: int | None = None
+    start_date: str = ''
+    end_date: str = ''
+    days: int = 0
 
     def __init__(self, period: str, limit: float = 0,
-                 spent: float = 0, pk: int = 0):
+                 spent: float = 0, pk: int = 0, category: int | None = None,
+                 start_date: str = '', end_date: str = '', days: int = 0):
 
-        if period not in ["День", "Неделя", "Месяц"]:
+        if period not in PERIODS:
             raise ValueError(f'unsupported value of period <{period}>')
+        if period == RANGE_PERIOD and not (
+                date.fromisoformat(start_date) <= date.fromisoformat(end_date)):
+            raise ValueError(f'empty budget range <{start_date}> - <{end_date}>')
+        if period == WINDOW_PERIOD and days < 1:
+            raise ValueError(f'budget window must be positive, got {days}')
         self.period = period
         self.limit = limit
         self.spent = spent
         self.pk = pk
+        self.category = category
+        self.start_date = start_date
+        self.end_date = end_date
+        self.days = days
+
+    @property
+    def overspent(self) -> bool:
+        """ Spent more than the limit """
+        return self.spent > self.limit
+
+    def describe(self) -> str:
+        """ Period with its dates or length, as shown to user """
+        if self.period == RANGE_PERIOD:
+            return f'{self.period} {self.start_date} - {self.end_date}'
+        if self.period == WINDOW_PERIOD:
+            return f'{self.period} {self.days} дн.'
+        return self.period
+
+    def get_bounds(self, day: date) -> tuple[str, str]:
+        """ ISO dates of the first and the last day of budget period containing <day> """
+        if self.period == RANGE_PERIOD:
+            return self.start_date, self.end_date
+        if self.period == WINDOW_PERIOD:
+            first, last = day - timedelta(days=self.days - 1), day
+        else:
+            first, last = get_period_bounds(self.period, day)
+        return first.isoformat(), last.isoformat()
+
+
+def get_subtrees(budgets: Iterable[Budget],
+                 cat_repo: AbstractRepository[Category]) -> dict[int, set[int]]:
+    """ pk of categories counted by each category of <budgets>: itself and descendants """
+    subtrees: dict[int, set[int]] = {}
+    for budget in budgets:
+        if budget.category is not None and budget.category not in subtrees:
+            subtrees[budget.category] = {budget.category, *(
+                cat.pk for cat in cat_repo.get_descendants(budget.category))}
+    return subtrees
+
+
+def sum_budgets(budgets: list[Budget],
+                expenses: Iterable[tuple[str, int | None, float]], day: date,
+                subtrees: dict[int, set[int]] | None = None) -> list[float]:
+    """
+    Spent amount of every budget in its period containing <day>, in one pass
+    over (expense_date, category, amount) of <expenses> sorted by date.
+    Budgets are activated as dates reach their first day and dropped
+    after their last one, so each expense is checked only against budgets
+    whose period contains it. Category None of an expense counts for
+    budgets of all expenses only. <subtrees> maps budget categories to
+    counted category pk, see get_subtrees.
+    """
+    subtrees = subtrees or {}
+    bounds = [budget.get_bounds(day) for budget in budgets]
+    pending = sorted(range(len(budgets)), key=lambda i: bounds[i][0], reverse=True)
+    active: list[int] = []
+    sums = [0.] * len(budgets)
+    current = ''
+    for exp_date, category, amount in expenses:
+        if exp_date != current:
+            current = exp_date
+            while pending and bounds[pending[-1]][0] <= exp_date:
+                active.append(pending.pop())
+            active = [i for i in active if exp_date <= bounds[i][1]]
+        for i in active:
+            root = budgets[i].category
+            if root is None or category in subtrees.get(root, (root,)):
+                sums[i] += amount
+    return sums
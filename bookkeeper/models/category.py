@@ -1,9 +1,9 @@
 """
 Модель категории расходов
 """
-from collections import defaultdict
 from dataclasses import dataclass
-from typing import Iterator
+from itertools import islice
+from typing import Iterable, Iterator
 
 from ..repository.abstract_repository import AbstractRepository
 
@@ -55,7 +55,7 @@ class Category:
         if parent is None:
             return
         yield parent
-        yield from parent.get_all_parents(repo)
+        yield from repo.get_ancestors(parent.pk)
 
     def get_subcategories(self,
                           repo: AbstractRepository['Category']
@@ -72,47 +72,60 @@ class Category:
         -------
         Объекты Category, являющиеся подкатегориями разного уровня ниже данной.
         """
-
-        def get_children(graph: dict[int | None, list['Category']],
-                         root: int) -> Iterator['Category']:
-            """ dfs in graph from root """
-            for x in graph[root]:
-                yield x
-                yield from get_children(graph, x.pk)
-
-        subcats = defaultdict(list)
-        for cat in repo.get_all():
-            subcats[cat.parent].append(cat)
-        return get_children(subcats, self.pk)
+        yield from repo.get_descendants(self.pk)
 
     @classmethod
     def create_from_tree(
             cls,
-            tree: list[tuple[str, str | None]],
-            repo: AbstractRepository['Category']) -> list['Category']:
+            tree: Iterable[tuple[str, str | None]],
+            repo: AbstractRepository['Category'],
+            batch_size: int = 1000) -> list['Category']:
         """
-        Создать дерево категорий из списка пар "потомок-родитель".
-        Список должен быть топологически отсортирован, т.е. потомки
-        не должны встречаться раньше своего родителя.
-        Проверка корректности исходных данных не производится.
-        При использовании СУБД с проверкой внешних ключей, будет получена
-        ошибка (для sqlite3 - IntegrityError). При отсутствии проверки
-        со стороны СУБД, результат, возможно, будет корректным, если исходные
-        данные корректны за исключением сортировки. Если нет, то нет.
-        "Мусор на входе, мусор на выходе".
+        Создать дерево категорий из пар "потомок-родитель".
+        Пары должны быть топологически отсортированы, т.е. потомки
+        не должны встречаться раньше своего родителя, иначе будет
+        выброшено KeyError. Пары читаются по мере сохранения, поэтому
+        tree может быть генератором, например read_tree от файла.
+        Все категории сохраняются одной транзакцией repo.transaction():
+        при любой ошибке, в том числе IndentationError из read_tree,
+        изменения отменяются.
+        Пары читаются пакетами по batch_size. Пакет сохраняется по уровням
+        через repo.add_many: сначала категории, родители которых уже
+        сохранены, затем их потомки и т.д., поэтому pk родителей известны
+        без запроса на каждую категорию.
 
         Parameters
         ----------
-        tree - список пар "потомок-родитель"
+        tree - пары "потомок-родитель"
         repo - репозиторий для сохранения объектов
+        batch_size - число пар в пакете
 
         Returns
         -------
         Список созданных объектов Category
         """
         created: dict[str, Category] = {}
-        for child, parent in tree:
-            cat = cls(child, created[parent].pk if parent is not None else None)
-            repo.add(cat)
-            created[child] = cat
+        with repo.transaction():
+            pairs = iter(tree)
+            while batch := list(islice(pairs, batch_size)):
+                cls._add_batch(batch, created, repo)
         return list(created.values())
+
+    @classmethod
+    def _add_batch(cls, batch: list[tuple[str, str | None]],
+                   created: dict[str, 'Category'],
+                   repo: AbstractRepository['Category']) -> None:
+        """ Сохранить пакет пар по уровням, добавив категории в created """
+        nodes: list[tuple[Category, Category | None]] = []
+        for child, parent_name in batch:
+            cat = cls(child)
+            nodes.append((cat, None if parent_name is None else created[parent_name]))
+            created[child] = cat
+        # родитель всегда предшествует потомку, поэтому каждый уровень не пуст
+        while nodes:
+            level = [(cat, parent) for cat, parent in nodes
+                     if parent is None or parent.pk != 0]
+            for cat, parent in level:
+                cat.parent = None if parent is None else parent.pk
+            repo.add_many([cat for cat, _ in level])
+            nodes = [(cat, parent) for cat, parent in nodes if cat.pk == 0]
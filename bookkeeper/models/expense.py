@@ -2,8 +2,8 @@
 Описан класс, представляющий расходную операцию
 """
 
-from dataclasses import dataclass
-from datetime import datetime
+from dataclasses import dataclass, field
+from datetime import date, datetime
 
 
 @dataclass(slots=True)
@@ -12,14 +12,15 @@ class Expense:
     Расходная операция.
     amount - сумма
     category - id категории расходов
-    expense_date - дата расхода
-    added_date - дата добавления в бд
+    expense_date - дата расхода в формате ISO-8601 (ГГГГ-ММ-ДД)
+    added_date - дата и время добавления в бд (ГГГГ-ММ-ДД ЧЧ:ММ)
     comment - комментарий
     pk - id записи в базе данных
     """
     amount: float
     category: int
-    expense_date: str = datetime.now().strftime("%d-%m-%Y")
-    added_date: str = datetime.now().strftime("%d-%m-%Y %H:%M")
+    expense_date: str = field(default_factory=lambda: date.today().isoformat())
+    added_date: str = field(
+        default_factory=lambda: datetime.now().strftime("%Y-%m-%d %H:%M"))
     comment: str = ''
     pk: int = 0
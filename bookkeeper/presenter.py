@@ -1,93 +1,177 @@
 """ Presenter module. Interacts with models, repositories and views."""
-from datetime import date, datetime, timedelta
-import calendar
+from datetime import date
+from functools import partial
+from typing import Any, Callable, Iterable
 
 from bookkeeper.view.pyqt6_view import PyQtView
 from bookkeeper.models.category import Category
 from bookkeeper.models.expense import Expense
-from bookkeeper.models.budget import Budget
+from bookkeeper.models.budget import Budget, get_subtrees, sum_budgets
+from bookkeeper.repository.cached_repository import CachedRepository
+from bookkeeper.utils import date_range, expense_pages, iso2display_date, display2iso_date
+
+EXPENSE_PAGE_SIZE = 200  # expense rows loaded into view at once
+
+ViewChanges = list[Callable[[], None]]
 
 
 class Bookkeeper():
-    def __init__(self, view: PyQtView, repo_cls: type):
+    def __init__(self, view: PyQtView, repo_cls: type, background: bool = False):
         self.view = view
+        # repository calls run in the view's worker thread, not in GUI thread
+        self.background = background
 
-        repo_cls.bind_database('database.db')
-        self.cat_repo = repo_cls(Category, Category.__name__)
+        # GUI writes one row per transaction, WAL makes such commits cheap
+        repo_cls.bind_database('database.db', profile='interactive')
+        # categories and budgets are read on every refresh and rarely written
+        self.cat_repo = CachedRepository(repo_cls(Category, Category.__name__))
         self.exp_repo = repo_cls(Expense, Expense.__name__)
-        self.bgt_repo = repo_cls(Budget, Budget.__name__)
+        self.bgt_repo = CachedRepository(repo_cls(Budget, Budget.__name__))
+        # day for which budget spent column is up to date
+        self.budget_day: date | None = None
+        # (expense_date, pk) of the last expense row passed to view,
+        # ('', 0) when all expenses are passed
+        self.expense_cursor: tuple[str, int] | None = None
 
         self.view.register_budget_update_callback(self.budget_update_callback)
-        self.add_default_budget()
+        self.run(self.add_default_budget)
         self.set_budget_data()
 
         self.view.register_category_add_callback(self.category_add_callback)
         self.view.register_category_del_callback(self.category_del_callback)
-        self.add_default_categories()
+        self.run(self.add_default_categories)
         self.set_category_data()
 
         self.view.register_expense_add_callback(self.expense_add_callback)
         self.view.register_expense_del_callback(self.expense_del_callback)
         self.view.register_expense_update_callback(self.expense_update_callback)
+        self.view.register_expense_fetch_callback(self.fetch_expense_data)
         self.set_expense_data()
 
         self.view.window.show()
 
+    def run(self, task: Callable[[], Any],
+            on_done: Callable[[Any], None] | None = None,
+            key: str | None = None, supersede: bool = False,
+            on_error: Callable[[Exception], None] | None = None) -> None:
+        """
+        Run task working with repositories and pass its result to on_done.
+        In background mode the task runs in the view's worker thread and on_done
+        is called later in GUI thread. Tasks with supersede=True must only read:
+        they are skipped, or their results dropped, when a newer one with the
+        same key is started. Results of other tasks with the key are dropped then too.
+        Exception of a background task is passed to on_error, otherwise it is raised.
+        """
+        if self.background:
+            self.view.run_task(task, on_done, key, supersede, on_error)
+            return
+        result = task()
+        if on_done is not None:
+            on_done(result)
+
+    @staticmethod
+    def apply_view_changes(changes: ViewChanges) -> None:
+        """ Pass changes prepared by a task to view"""
+        for change in changes:
+            change()
+
     def set_budget_data(self) -> None:
         """ Take data from repository and pass it to view"""
-        self.update_budget_spent_column()
+        self.run(self.budget_rows, self.view.set_budget_data,
+                 key='budget', supersede=True)
+
+    def budget_rows(self) -> list[list[str]]:
+        """ Rows of budget table for view, the last element is '1' if overspent"""
+        if self.budget_day != date.today():  # budget periods rolled over
+            self.update_budget_spent_column()
         budget_lst: list[Budget] = self.bgt_repo.get_all()
-        budget_data = [
-            [f'{b.pk}', f'{b.period}', f'{b.spent}', f'{b.limit}', f'{b.limit-b.spent}']
+        names = {ctg.pk: ctg.name for ctg in self.cat_repo.get_all()}
+        return [
+            [f'{b.pk}', self.budget_title(b, names), f'{b.spent}', f'{b.limit}',
+             f'{b.limit-b.spent}', '1' if b.overspent else '']
             for b in budget_lst
         ]
 
-        self.view.set_budget_data(budget_data)
+    @staticmethod
+    def budget_title(budget: Budget, names: dict[int, str]) -> str:
+        """ Budget period with the name of its category, if any"""
+        if budget.category is None:
+            return budget.describe()
+        return f'{budget.describe()} ({names.get(budget.category, "?")})'
+
+    def budget_expenses(self, budgets: list[Budget],
+                        day: date) -> Iterable[tuple[str, int | None, float]]:
+        """
+        (expense_date, category, amount) of all budget periods containing <day>
+        sorted by date. Without category budgets these are day totals of one
+        aggregate query, otherwise expenses read page by page in date order.
+        """
+        bounds = [budget.get_bounds(day) for budget in budgets]
+        low, high = min(first for first, _ in bounds), max(last for _, last in bounds)
+        if all(budget.category is None for budget in budgets):
+            totals = self.exp_repo.aggregate('sum', 'amount', date_range(low, high),
+                                             'expense_date')
+            return ((exp_date, None, totals[exp_date]) for exp_date in sorted(totals))
+        return ((exp.expense_date, exp.category, exp.amount)
+                for page in expense_pages(self.exp_repo, low, high, EXPENSE_PAGE_SIZE)
+                for exp in page)
 
     def update_budget_spent_column(self) -> None:
-        """ Updates budget spent column based on expenses"""
-        all_expenses: list[Expense] = self.exp_repo.get_all()
-
-        day = date.today().day
-        month = date.today().month
-        year = date.today().year
-        today = datetime(year=year, month=month, day=day)
-
-        spent_day, spent_week, spent_month = 0.0, 0.0, 0.0
-
-        for expense in all_expenses:
-            # day
-            if datetime.strptime(expense.expense_date, "%d-%m-%Y") == today:
-                spent_day += expense.amount
-            # month
-            if (datetime(year=year, month=month, day=1) <= datetime.strptime(expense.expense_date, "%d-%m-%Y")
-                    <= datetime(year=year, month=month, day=calendar.monthrange(year, month)[1])):
-                spent_month += expense.amount
-            # week
-            monday = today - timedelta(days=today.weekday())
-            if (monday <= datetime.strptime(expense.expense_date, "%d-%m-%Y") <= monday + timedelta(days=6)):
-                spent_week += expense.amount
-
-        for spent_prd, prd in zip([spent_day, spent_week, spent_month], ['День', 'Неделя', 'Месяц']):
-            period_record: Budget = self.bgt_repo.get_all(where={'period': prd})[0]
-            if period_record.spent != spent_prd:
-                period_record.spent = spent_prd
-                self.bgt_repo.update(period_record)
+        """ Recalculate budget spent column from all expenses of current periods"""
+        today = date.today()
+        budgets: list[Budget] = self.bgt_repo.get_all()
+        if not budgets:
+            self.budget_day = today
+            return
+
+        # all budgets are summed in one pass over expenses of their periods
+        sums = sum_budgets(budgets, self.budget_expenses(budgets, today), today,
+                           get_subtrees(budgets, self.cat_repo))
+        changed = []
+        for budget, spent in zip(budgets, sums):
+            spent = round(spent, 2)
+            if budget.spent != spent:
+                budget.spent = spent
+                changed.append(budget)
+        self.bgt_repo.update_many(changed)
+        self.budget_day = today
+
+    def apply_budget_spent_delta(self, deltas: list[tuple[str, int | None, float]]
+                                 ) -> None:
+        """
+        Update budget spent column by (expense_date, category, amount) changes
+        without reading other expenses. Negative amount means removed expense.
+        """
+        if self.budget_day != date.today():
+            self.update_budget_spent_column()  # expenses are already saved
+            return
+
+        budgets: list[Budget] = self.bgt_repo.get_all()
+        sums = sum_budgets(budgets, sorted(deltas, key=lambda delta: delta[0]),
+                           self.budget_day, get_subtrees(budgets, self.cat_repo))
+        changed = []
+        for budget, delta in zip(budgets, sums):
+            if delta != 0:
+                budget.spent = round(budget.spent + delta, 2)
+                changed.append(budget)
+        self.bgt_repo.update_many(changed)
 
     def budget_update_callback(self, pk_str: str, new_limit_str: str) -> None:
         """ Callback for budget update"""
+        self.run(partial(self.update_budget_limit, pk_str, new_limit_str))
+        self.set_budget_data()
+
+    def update_budget_limit(self, pk_str: str, new_limit_str: str) -> None:
+        """ Save new budget limit"""
         record: Budget = self.bgt_repo.get(int(pk_str))
         record.limit = float(new_limit_str)
         self.bgt_repo.update(record)
 
-        self.set_budget_data()
-
     def add_default_budget(self) -> None:
         """ Add default records in repository if it is empty"""
         if len(self.bgt_repo.get_all()) == 0:
-            for period in 'День Неделя Месяц'.split(' '):
-                budget = Budget(period=period, limit=0, spent=0)
-                self.bgt_repo.add(budget)
+            self.bgt_repo.add_many([Budget(period=period, limit=0, spent=0)
+                                    for period in 'День Неделя Месяц'.split(' ')])
 
     def add_default_categories(self) -> None:
         """ Add default records in repository if it is empty"""
@@ -109,62 +193,159 @@ class Bookkeeper():
         ]
 
         if len(self.cat_repo.get_all()) == 0:
-            for ctg in lst:
-                self.category_add_callback(ctg)
+            self.cat_repo.add_many([Category(name=ctg, parent=None) for ctg in lst])
 
     def set_expense_data(self) -> None:
-        """ Take data from repository and pass it to view"""
-        exp_lst: list[Expense] = self.exp_repo.get_all()
-        exp_data = [
-            [f'{exp.pk}', exp.expense_date, f'{exp.amount}',
-             # check it is not none
-             f'{self.cat_repo.get(exp.category).name}',
-             f'{exp.comment}']
+        """ Take the first page of expenses from repository and pass it to view,
+        next pages are requested by view through fetch_expense_data"""
+        self.run(self.first_expense_page, self.view.set_expense_data,
+                 key='expenses', supersede=True)
+        self.set_budget_data()
+
+    def first_expense_page(self) -> list[list[str]]:
+        """ The first rows of expense table, newest first"""
+        self.expense_cursor = None
+        return self.expense_page(EXPENSE_PAGE_SIZE)
+
+    def fetch_expense_data(self, count: int) -> list[list[str]] | None:
+        """ Callback for view asking for next <count> expense rows.
+        In background mode returns None and passes the rows later."""
+        if not self.background:
+            return self.expense_page(count)
+        self.run(partial(self.expense_page, count), self.view.append_expense_rows,
+                 key='expenses', on_error=self.view.expense_fetch_failed)
+        return None
+
+    def expense_page(self, count: int) -> list[list[str]]:
+        """ Next <count> expense rows after the last passed to view,
+        sorted by date, newest first"""
+        exp_lst: list[Expense] = self.next_expenses(count)
+        if len(exp_lst) < count:  # sorts before any expense
+            self.expense_cursor = ('', 0)
+        else:
+            self.expense_cursor = (exp_lst[-1].expense_date, exp_lst[-1].pk)
+        # all categories of the page are read by one query
+        ctgs: dict[int, Category] = self.cat_repo.get_many(
+            {exp.category for exp in exp_lst})
+        return [
+            self.expense_row(exp, ctgs[exp.category].name if exp.category in ctgs else '')
             for exp in exp_lst]
 
-        exp_data = sorted(exp_data, key=lambda row: datetime.strptime(
-            row[1], "%d-%m-%Y"), reverse=True)
+    @staticmethod
+    def expense_row(exp: Expense, ctg_name: str) -> list[str]:
+        """ Row of expense table for view"""
+        return [f'{exp.pk}', iso2display_date(exp.expense_date), f'{exp.amount}',
+                f'{ctg_name}', f'{exp.comment}']
 
-#        for exp in exp_data:
-#            exp[1] = f'{exp[1].strftime("%d-%m-%Y")}'
+    def next_expenses(self, count: int) -> list[Expense]:
+        """ Keyset pagination over expenses ordered by (expense_date, pk) descending"""
+        order = ['-expense_date', '-pk']
+        if self.expense_cursor is None:
+            return self.exp_repo.get_all(order_by=order, limit=count)
+        last_date, last_pk = self.expense_cursor
+        exp_lst: list[Expense] = self.exp_repo.get_all(
+            where={'expense_date': last_date, 'pk': ('<', last_pk)},
+            order_by=order, limit=count)
+        if len(exp_lst) < count:
+            exp_lst += self.exp_repo.get_all(
+                where={'expense_date': ('<', last_date)},
+                order_by=order, limit=count - len(exp_lst))
+        return exp_lst
 
-        self.view.set_expense_data(exp_data)
-        self.set_budget_data()
+    def show_expense(self, exp: Expense, ctg_name: str) -> ViewChanges:
+        """ Insert expense row into view at its place in the loaded part of the table.
+        Expenses sorting after the last loaded row come later with the next pages."""
+        if (self.expense_cursor is None
+                or (exp.expense_date, exp.pk) < self.expense_cursor):
+            return []
+        # rows sorting before the expense are all loaded, so two indexed
+        # counts give its position without reading the rows themselves
+        position = (
+            self.exp_repo.aggregate(
+                'count', where={'expense_date': ('>', exp.expense_date)})
+            + self.exp_repo.aggregate(
+                'count', where={'expense_date': exp.expense_date, 'pk': ('>', exp.pk)}))
+        return [partial(self.view.insert_expense_row, position,
+                        self.expense_row(exp, ctg_name))]
 
     def expense_add_callback(self, data: dict[str, str]) -> None:
         """ Callback for expense add procedure"""
-        data['category'] = self.cat_repo.get_all(where={'name': data['category']})[0].pk
+        self.run(partial(self.add_expense, data), self.apply_view_changes, key='expenses')
+        self.set_budget_data()
+
+    def add_expense(self, data: dict[str, str]) -> ViewChanges:
+        """ Save new expense, return changes of expense table"""
+        ctg_name = data['category']
+        data['category'] = self.cat_repo.get_all(where={'name': ctg_name})[0].pk
+        data['expense_date'] = display2iso_date(data['expense_date'])
         new_exp = Expense(**data)
         self.exp_repo.add(new_exp)
-        self.set_expense_data()
+        self.apply_budget_spent_delta([(new_exp.expense_date, new_exp.category,
+                                        float(new_exp.amount))])
+        return self.show_expense(new_exp, ctg_name)
 
     def expense_update_callback(self, pk: str, data: dict[str, str]) -> None:
         """ Callback for expense update procedure"""
-        data['category'] = self.cat_repo.get_all(where={'name': data['category']})[0].pk
+        self.run(partial(self.update_expense, pk, data), self.apply_view_changes,
+                 key='expenses')
+        self.set_budget_data()
+
+    def update_expense(self, pk: str, data: dict[str, str]) -> ViewChanges:
+        """ Save changed expense, return changes of expense table"""
+        ctg_name = data['category']
+        data['category'] = self.cat_repo.get_all(where={'name': ctg_name})[0].pk
+        data['expense_date'] = display2iso_date(data['expense_date'])
+        old_exp: Expense | None = self.exp_repo.get(int(pk))
+        if old_exp is None:  # deleted meanwhile, e.g. in another window
+            return [partial(self.view.remove_expense_rows, [pk])]
         upd_exp = Expense(pk=int(pk), **data)
         self.exp_repo.update(upd_exp)
-        self.set_expense_data()
+        self.apply_budget_spent_delta(
+            [(old_exp.expense_date, old_exp.category, -float(old_exp.amount)),
+             (upd_exp.expense_date, upd_exp.category, float(upd_exp.amount))])
+        if old_exp.expense_date == upd_exp.expense_date:
+            return [partial(self.view.update_expense_row,
+                            self.expense_row(upd_exp, ctg_name))]
+        # the row moves to another place of the table
+        return ([partial(self.view.remove_expense_rows, [pk])]
+                + self.show_expense(upd_exp, ctg_name))
 
     def expense_del_callback(self, del_pk: list[str]) -> None:
         """ Callback for expense delete procedure"""
-        for pk in del_pk:
-            self.exp_repo.delete(int(pk))
-        self.set_expense_data()
+        self.run(partial(self.delete_expenses, del_pk), self.apply_view_changes,
+                 key='expenses')
+        self.set_budget_data()
+
+    def delete_expenses(self, del_pk: list[str]) -> ViewChanges:
+        """ Delete expenses, return changes of expense table"""
+        # get_many and delete_many split long pk lists into batches,
+        # expenses already deleted elsewhere are skipped
+        with self.exp_repo.transaction():
+            old_exps: dict[int, Expense] = self.exp_repo.get_many(
+                int(pk) for pk in del_pk)
+            self.exp_repo.delete_many(old_exps)
+        self.apply_budget_spent_delta([(exp.expense_date, exp.category,
+                                        -float(exp.amount)) for exp in old_exps.values()])
+        return [partial(self.view.remove_expense_rows, del_pk)]
 
     def set_category_data(self) -> None:
         """ Take data from repository and pass it to view"""
+        self.run(self.category_rows, self.view.set_category_data,
+                 key='categories', supersede=True)
+
+    def category_rows(self) -> list[list[str]]:
+        """ Rows of category list for view"""
         ctgs_lst: list[Category] = self.cat_repo.get_all()
-        ctg_data = [[f'{ctg.pk}', f'{ctg.name}'] for ctg in ctgs_lst]
-        self.view.set_category_data(ctg_data)
+        return [[f'{ctg.pk}', f'{ctg.name}'] for ctg in ctgs_lst]
 
     def category_add_callback(self, ctg_name: str) -> None:
         """ Callback for category add procedure"""
         ctg = Category(name=ctg_name, parent=None)
-        self.cat_repo.add(ctg)
+        self.run(partial(self.cat_repo.add, ctg))
 
         self.set_category_data()
 
     def category_del_callback(self, pk_str: str) -> None:
         """ Callback for category add procedure"""
-        self.cat_repo.delete(int(pk_str))
+        self.run(partial(self.cat_repo.delete, int(pk_str)))
         self.set_category_data()
@@ -8,7 +8,8 @@
 """
 
 from abc import ABC, abstractmethod
-from typing import Generic, TypeVar, Protocol, Any
+from contextlib import contextmanager
+from typing import Generic, TypeVar, Protocol, Any, Iterable, Iterator
 
 
 class Model(Protocol):  # pylint: disable=too-few-public-methods
@@ -20,6 +21,133 @@ class Model(Protocol):  # pylint: disable=too-few-public-methods
 
 T = TypeVar('T', bound=Model)
 
+# операторы, которые поддерживает любой репозиторий
+OPERATORS = ('==', '!=', '<', '<=', '>', '>=', 'in', 'between')
+# операторы по дереву категорий, их проверяют только репозитории sqlite
+# по таблице замыкания (см. closure_table), для остальных условие нужно
+# заранее заменить функцией expand_subtree
+TREE_OPERATORS = ('subtree',)
+
+
+def parse_condition(condition: Any) -> tuple[str, Any]:
+    """
+    Разобрать условие из словаря where.
+    Условие - это либо значение (проверка на равенство), либо кортеж
+    (оператор, значение), где оператор - один из OPERATORS или TREE_OPERATORS.
+    Для 'in' значение - коллекция допустимых значений,
+    для 'between' - пара (от, до), границы включаются,
+    для 'subtree' - pk категории: значение поля должно быть pk этой категории
+    или ее подкатегории любого уровня (только репозитории sqlite, для
+    остальных см. expand_subtree).
+
+    Returns
+    -------
+    Пара (оператор, значение)
+    """
+    if (isinstance(condition, tuple) and len(condition) == 2
+            and condition[0] in OPERATORS + TREE_OPERATORS):
+        return condition[0], condition[1]
+    return '==', condition
+
+
+def expand_subtree(where: dict[str, Any] | None,
+                   tree_repo: 'AbstractRepository[Any]') -> dict[str, Any] | None:
+    """
+    Заменить в where условия 'subtree' на 'in' по pk узла и всех его
+    потомков из репозитория дерева tree_repo (get_descendants), чтобы
+    условие можно было проверить в любом репозитории
+    """
+    if not where:
+        return where
+    expanded = {}
+    for attr, condition in where.items():
+        operator, value = parse_condition(condition)
+        if operator == 'subtree':
+            descendants = tree_repo.get_descendants(value)
+            condition = ('in', [value, *(node.pk for node in descendants)])
+        expanded[attr] = condition
+    return expanded
+
+
+def check_condition(value: Any, operator: str, operand: Any) -> bool:
+    """ Проверить, что значение value удовлетворяет условию (operator, operand) """
+    if operator == '==':
+        return bool(value == operand)
+    if operator == '!=':
+        return bool(value != operand)
+    if operator == '<':
+        return bool(value < operand)
+    if operator == '<=':
+        return bool(value <= operand)
+    if operator == '>':
+        return bool(value > operand)
+    if operator == '>=':
+        return bool(value >= operand)
+    if operator == 'in':
+        return value in operand
+    if operator == 'between':
+        low, high = operand
+        return bool(low <= value <= high)
+    if operator in TREE_OPERATORS:
+        raise ValueError(f'operator <{operator}> needs sqlite repository, '
+                         'use expand_subtree')
+    raise ValueError(f'unsupported operator <{operator}>')
+
+
+AGGREGATES = ('sum', 'count', 'min', 'max')
+
+
+def new_objects(objs: Iterable[T]) -> list[T]:
+    """
+    Список объектов для add_many. Если у какого-либо объекта уже заполнен pk,
+    выбрасывается ValueError до добавления первого из них
+    """
+    objs = list(objs)
+    for obj in objs:
+        if getattr(obj, 'pk', None) != 0:
+            raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
+    return objs
+
+
+def aggregate_objects(objs: Iterable[Any], func: str, field: str = 'pk',
+                      group_by: str | None = None) -> Any:
+    """
+    Вычислить агрегат за один проход по объектам,
+    параметры и результат описаны в AbstractRepository.aggregate
+    """
+    if func not in AGGREGATES:
+        raise ValueError(f'unsupported aggregate function <{func}>')
+    results: dict[Any, Any] = {}
+    for obj in objs:
+        key = None if group_by is None else getattr(obj, group_by)
+        if func == 'count':
+            results[key] = results.get(key, 0) + 1
+            continue
+        value = getattr(obj, field)
+        if key not in results:
+            results[key] = value
+        elif func == 'sum':
+            results[key] += value
+        elif func == 'min':
+            results[key] = min(results[key], value)
+        else:
+            results[key] = max(results[key], value)
+    if group_by is not None:
+        return results
+    return results.get(None, 0 if func in ('sum', 'count') else None)
+
+
+def get_parent(obj: Any) -> Any:
+    """
+    Значение поля parent объекта иерархии (pk родителя или None).
+    Для объектов без этого поля выбрасывается TypeError
+    """
+    try:
+        return getattr(obj, 'parent')
+    except AttributeError:
+        raise TypeError(f'{type(obj).__name__} objects have no `parent` field, '
+                        'they do not form a hierarchy') from None
+
 
 class AbstractRepository(ABC, Generic[T]):
     """
@@ -30,6 +158,15 @@ class AbstractRepository(ABC, Generic[T]):
     get_all
     update
     delete
+    Пакетные методы add_many, update_many, delete_many по умолчанию
+    вызывают одиночные методы в цикле, реализации могут выполнять
+    их одной транзакцией.
+    Методы чтения get_many, get_page, iter_all и aggregate по умолчанию
+    выражены через абстрактные методы, transaction по умолчанию ничего
+    не отменяет.
+    Методы get_ancestors, get_descendants и rollup имеют смысл только
+    для объектов, образующих иерархию через поле parent (Category),
+    для остальных они выбрасывают TypeError.
     """
 
     @abstractmethod
@@ -43,18 +180,175 @@ class AbstractRepository(ABC, Generic[T]):
     def get(self, pk: int) -> T | None:
         """ Получить объект по id """
 
+    def get_many(self, pks: Iterable[int]) -> dict[int, T]:
+        """
+        Получить объекты по списку id в виде словаря {id: объект},
+        отсутствующие id в словарь не попадают
+        """
+        objs = (self.get(pk) for pk in set(pks))
+        return {obj.pk: obj for obj in objs if obj is not None}
+
     @abstractmethod
-    def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
+    def get_all(self, where: dict[str, Any] | None = None,
+                order_by: str | list[str] | None = None,
+                limit: int | None = None) -> list[T]:
         """
         Получить все записи по некоторому условию
         where - условие в виде словаря {'название_поля': значение}
+        или {'название_поля': (оператор, значение)}, см. parse_condition,
+        все условия объединяются через "и";
         если условие не задано (по умолчанию), вернуть все записи
+        order_by - название поля для сортировки, '-' перед названием
+        означает сортировку по убыванию; для сортировки по нескольким
+        полям - список названий
+        limit - максимальное количество возвращаемых записей
         """
 
     @abstractmethod
     def update(self, obj: T) -> None:
-        """ Обновить данные об объекте. Объект должен содержать поле pk. """
+        """
+        Обновить данные об объекте. Объект должен содержать поле pk.
+        Если объекта с таким pk нет в репозитории, выбрасывается KeyError.
+        """
 
     @abstractmethod
     def delete(self, pk: int) -> None:
         """ Удалить запись """
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        """
+        Добавить несколько объектов, вернуть список их id,
+        также записать id в атрибут pk каждого объекта.
+        """
+        return [self.add(obj) for obj in objs]
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        """ Обновить данные о нескольких объектах, для отсутствующих см. update """
+        for obj in objs:
+            self.update(obj)
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        """ Удалить несколько записей """
+        for pk in pks:
+            self.delete(pk)
+
+    def aggregate(self, func: str, field: str = 'pk',
+                  where: dict[str, Any] | None = None,
+                  group_by: str | None = None) -> Any:
+        """
+        Вычислить агрегатную функцию по полю для записей, удовлетворяющих
+        условию where (см. get_all), не создавая объекты там, где это возможно.
+        func - одна из AGGREGATES: 'sum', 'count' (число записей, поле
+        не используется), 'min', 'max'
+        group_by - название поля для группировки
+        Без группировки вернуть значение (для пустой выборки 0 для sum и count
+        и None для min и max), с группировкой - словарь {значение поля: агрегат}.
+        Реализация по умолчанию использует get_all.
+        """
+        return aggregate_objects(self.get_all(where), func, field, group_by)
+
+    def get_page(self, after_pk: int = 0, limit: int = 100,
+                 where: dict[str, Any] | None = None) -> list[T]:
+        """
+        Получить страницу записей, удовлетворяющих условию where:
+        не более limit записей с pk > after_pk в порядке возрастания pk.
+        Следующая страница запрашивается с after_pk, равным pk последней записи.
+        Реализация по умолчанию использует get_all и читает все записи.
+        """
+        return [obj for obj in self.get_all(where, order_by='pk')
+                if obj.pk > after_pk][:limit]
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Контекстный менеджер: изменения в блоке with выполняются одной
+        транзакцией и отменяются, если блок завершился исключением.
+        Вложенные блоки входят во внешнюю транзакцию.
+        Реализация по умолчанию ничего не отменяет.
+        """
+        yield
+
+    def get_ancestors(self, pk: int) -> list[T]:
+        """
+        Для объектов, образующих иерархию через поле parent (pk родителя
+        или None), получить всех предков объекта с id pk: от родителя
+        до объекта верхнего уровня.
+        Реализация по умолчанию делает по одному запросу get на уровень.
+        """
+        ancestors: list[T] = []
+        obj = self.get(pk)
+        while obj is not None and get_parent(obj) is not None:
+            obj = self.get(get_parent(obj))
+            if obj is not None:
+                ancestors.append(obj)
+        return ancestors
+
+    def get_descendants(self, pk: int) -> list[T]:
+        """
+        Для объектов, образующих иерархию через поле parent, получить всех
+        потомков объекта с id pk любого уровня, уровень за уровнем.
+        Реализация по умолчанию делает по одному запросу get_all на уровень,
+        с индексом по полю parent запросы не перебирают все записи.
+        """
+        root = self.get(pk)
+        if root is None:
+            return []
+        get_parent(root)  # проверка, что объекты образуют иерархию
+        descendants: list[T] = []
+        level = [pk]
+        while level:
+            children = self.get_all({'parent': ('in', level)})
+            descendants.extend(children)
+            level = [obj.pk for obj in children]
+        return descendants
+
+    def rollup(self, records: 'AbstractRepository[Any]', field: str, ref_field: str,
+               where: dict[str, Any] | None = None) -> dict[int, Any]:
+        """
+        Для иерархии объектов этого репозитория (поле parent) посчитать
+        суммы поля field записей из records по поддеревьям: для каждого
+        объекта - сумму по записям, у которых ref_field равно pk этого
+        объекта или любого его потомка, среди записей, удовлетворяющих
+        условию where (см. get_all). Например, потраченное в каждой
+        категории вместе с подкатегориями:
+        cat_repo.rollup(exp_repo, 'amount', 'category', {'expense_date': ...})
+        Вернуть словарь {pk: сумма} для всех объектов, включая пустые (0).
+        Реализация по умолчанию делает один запрос aggregate к records
+        с группировкой по ref_field и один проход по дереву от листьев к корням.
+        """
+        totals = records.aggregate('sum', field, where, group_by=ref_field)
+        nodes = self.get_all()
+        children: dict[int, list[int]] = {node.pk: [] for node in nodes}
+        roots = []
+        for node in nodes:
+            parent = get_parent(node)
+            if parent in children:
+                children[parent].append(node.pk)
+            else:  # верхний уровень или родитель удален
+                roots.append(node.pk)
+        # обход в глубину, узел попадает в order после всех своих предков,
+        # поэтому обратный порядок складывает потомков раньше родителей
+        order = []
+        stack = roots
+        while stack:
+            pk = stack.pop()
+            order.append(pk)
+            stack.extend(children[pk])
+        result: dict[int, Any] = {}
+        for pk in reversed(order):
+            result[pk] = totals.get(pk, 0) + sum(result[child] for child in children[pk])
+        return result
+
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 batch_size: int = 1000) -> Iterator[T]:
+        """
+        Перебрать записи, удовлетворяющие условию where, в порядке
+        возрастания pk, читая их страницами по batch_size записей.
+        """
+        after_pk = 0
+        while True:
+            page = self.get_page(after_pk, batch_size, where)
+            yield from page
+            if len(page) < batch_size:
+                return
+            after_pk = page[-1].pk
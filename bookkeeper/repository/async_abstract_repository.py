@@ -0,0 +1,75 @@
+"""
+Модуль содержит описание асинхронного абстрактного репозитория
+
+Асинхронный репозиторий хранит объекты так же, как AbstractRepository,
+но его методы - корутины, и ожидание хранилища не блокирует цикл событий
+asyncio. Условия where, order_by и limit задаются так же, как
+в AbstractRepository.get_all.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Generic
+
+from bookkeeper.repository.abstract_repository import T
+
+
+class AsyncAbstractRepository(ABC, Generic[T]):
+    """
+    Асинхронный абстрактный репозиторий.
+    Абстрактные методы:
+    add
+    get
+    get_all
+    update
+    delete
+    """
+
+    @abstractmethod
+    async def add(self, obj: T) -> int:
+        """
+        Добавить объект в репозиторий, вернуть id объекта,
+        также записать id в атрибут pk.
+        """
+
+    @abstractmethod
+    async def get(self, pk: int) -> T | None:
+        """ Получить объект по id """
+
+    @abstractmethod
+    async def get_all(self, where: dict[str, Any] | None = None,
+                      order_by: str | list[str] | None = None,
+                      limit: int | None = None) -> list[T]:
+        """ Получить все записи по некоторому условию, см. AbstractRepository.get_all """
+
+    @abstractmethod
+    async def update(self, obj: T) -> None:
+        """ Обновить данные об объекте. Объект должен содержать поле pk. """
+
+    @abstractmethod
+    async def delete(self, pk: int) -> None:
+        """ Удалить запись """
+
+    async def get_page(self, after_pk: int = 0, limit: int = 100,
+                       where: dict[str, Any] | None = None) -> list[T]:
+        """
+        Получить страницу записей, см. AbstractRepository.get_page.
+        Реализация по умолчанию использует get_all и читает все записи.
+        """
+        return [obj for obj in await self.get_all(where, order_by='pk')
+                if obj.pk > after_pk][:limit]
+
+    async def iter_all(self, where: dict[str, Any] | None = None,
+                       batch_size: int = 1000) -> AsyncIterator[T]:
+        """
+        Асинхронно перебрать записи, удовлетворяющие условию where,
+        в порядке возрастания pk, читая их страницами по batch_size записей:
+        async for obj in repo.iter_all(): ...
+        """
+        after_pk = 0
+        while True:
+            page = await self.get_page(after_pk, batch_size, where)
+            for obj in page:
+                yield obj
+            if len(page) < batch_size:
+                return
+            after_pk = page[-1].pk
@@ -0,0 +1,51 @@
+"""
+Модуль описывает асинхронный репозиторий, работающий в оперативной памяти
+"""
+
+import asyncio
+from typing import Any, AsyncIterator, Iterable
+
+from bookkeeper.repository.abstract_repository import T
+from bookkeeper.repository.async_abstract_repository import AsyncAbstractRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+
+
+class AsyncMemoryRepository(AsyncAbstractRepository[T]):
+    """
+    Асинхронный репозиторий в оперативной памяти. Данные хранятся
+    в MemoryRepository (с индексами по indexed_fields). Каждая операция
+    выполняется без ожидания, поэтому корутины одного цикла событий
+    не мешают друг другу и блокировки не нужны.
+    """
+
+    def __init__(self, indexed_fields: Iterable[str] = ()) -> None:
+        self.repo = MemoryRepository[T](indexed_fields)
+
+    async def add(self, obj: T) -> int:
+        return self.repo.add(obj)
+
+    async def get(self, pk: int) -> T | None:
+        return self.repo.get(pk)
+
+    async def get_all(self, where: dict[str, Any] | None = None,
+                      order_by: str | list[str] | None = None,
+                      limit: int | None = None) -> list[T]:
+        return self.repo.get_all(where, order_by, limit)
+
+    async def get_page(self, after_pk: int = 0, limit: int = 100,
+                       where: dict[str, Any] | None = None) -> list[T]:
+        return self.repo.get_page(after_pk, limit, where)
+
+    async def iter_all(self, where: dict[str, Any] | None = None,
+                       batch_size: int = 1000) -> AsyncIterator[T]:
+        # перебирается снимок, между пачками управление отдается циклу событий
+        for i, obj in enumerate(self.repo.iter_all(where, batch_size), 1):
+            yield obj
+            if i % batch_size == 0:
+                await asyncio.sleep(0)
+
+    async def update(self, obj: T) -> None:
+        self.repo.update(obj)
+
+    async def delete(self, pk: int) -> None:
+        self.repo.delete(pk)
@@ -0,0 +1,63 @@
+"""
+Module for asynchronous repository working with sqlite3 database
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable
+
+from bookkeeper.repository.abstract_repository import T
+from bookkeeper.repository.async_abstract_repository import AsyncAbstractRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+class AsyncSQLiteRepository(AsyncAbstractRepository[T]):
+    """
+    Asynchronous SQLite3 repository. Queries are run by SQLiteRepository
+    in a pool of <max_connections> threads. Pony opens one connection
+    per thread, so the pool bounds the number of connections too.
+    Coroutines read in parallel, sqlite serializes write transactions.
+    Database is bound by bind_database as for SQLiteRepository.
+    """
+    bind_database = staticmethod(SQLiteRepository.bind_database)
+
+    def __init__(self, data_cls: type, table_name: str,
+                 max_connections: int = 4) -> None:
+        self.repo = SQLiteRepository[T](data_cls, table_name)
+        self.executor = ThreadPoolExecutor(max_workers=max_connections,
+                                           thread_name_prefix='sqlite')
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """ Run repository method in the pool without blocking event loop """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args))
+
+    def close(self) -> None:
+        """ Wait for running queries and stop the pool """
+        self.executor.shutdown()
+
+    async def add(self, obj: T) -> int:
+        pk: int = await self._run(self.repo.add, obj)
+        return pk
+
+    async def get(self, pk: int) -> T | None:
+        obj: T | None = await self._run(self.repo.get, pk)
+        return obj
+
+    async def get_all(self, where: dict[str, Any] | None = None,
+                      order_by: str | list[str] | None = None,
+                      limit: int | None = None) -> list[T]:
+        objs: list[T] = await self._run(self.repo.get_all, where, order_by, limit)
+        return objs
+
+    async def get_page(self, after_pk: int = 0, limit: int = 100,
+                       where: dict[str, Any] | None = None) -> list[T]:
+        objs: list[T] = await self._run(self.repo.get_page, after_pk, limit, where)
+        return objs
+
+    async def update(self, obj: T) -> None:
+        await self._run(self.repo.update, obj)
+
+    async def delete(self, pk: int) -> None:
+        await self._run(self.repo.delete, pk)
@@ -0,0 +1,192 @@
+"""
+Модуль описывает кеширующий репозиторий - обертку над другим репозиторием
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Iterable, Iterator
+
+from bookkeeper.repository.abstract_repository import (
+    AbstractRepository, T, parse_condition, check_condition
+)
+
+
+def _matches(obj: Any, where: dict[str, Any] | None) -> bool:
+    """
+    Проверить, удовлетворяет ли объект условию where. Если значения
+    несравнимы (например, None и число) или условие нельзя проверить
+    без базы данных (subtree, см. TREE_OPERATORS), считается, что удовлетворяет,
+    тогда кеш сбрасывается с запасом.
+    """
+    if where is None:
+        return True
+    try:
+        return all(check_condition(getattr(obj, attr), *parse_condition(cond))
+                   for attr, cond in where.items())
+    except (TypeError, ValueError):
+        return True
+
+
+class CachedRepository(AbstractRepository[T]):
+    """
+    Репозиторий, кеширующий результаты чтения из другого репозитория repo.
+    Хранит карту идентичности {pk: объект} для get и get_many и результаты
+    get_all по ключу (where, order_by, limit), оба кеша ограничены по размеру
+    и вытесняют давно не использованные записи (LRU).
+    Изменения через add, update, delete и пакетные методы передаются в repo
+    и сбрасывают только затронутые записи кеша: объект по его pk и те
+    результаты get_all, в которые объект входил или мог войти.
+    Изменения, сделанные в repo в обход обертки, кеш не видит.
+    get возвращает сами закешированные объекты, поэтому если update или
+    update_many завершились ошибкой, записи измененных объектов тоже
+    сбрасываются: иначе кеш хранил бы измененный, но не сохраненный объект.
+    Счетчики hits и misses считают попадания и промахи обоих кешей.
+    """
+
+    def __init__(self, repo: AbstractRepository[T],
+                 max_objects: int = 1000, max_queries: int = 100) -> None:
+        self.repo = repo
+        self.max_objects = max_objects
+        self.max_queries = max_queries
+        self.hits = 0
+        self.misses = 0
+        self._objects: OrderedDict[int, T | None] = OrderedDict()
+        self._queries: OrderedDict[str, tuple[dict[str, Any] | None, list[T]]] = \
+            OrderedDict()
+
+    def _remember(self, pk: int, obj: T | None) -> None:
+        self._objects[pk] = obj
+        self._objects.move_to_end(pk)
+        if len(self._objects) > self.max_objects:
+            self._objects.popitem(last=False)
+
+    def _invalidate(self, pks: Iterable[int], objs: Iterable[T] = ()) -> None:
+        """
+        Сбросить кеш для объектов с id из pks,
+        objs - их новые значения (для добавленных и измененных объектов)
+        """
+        pks = set(pks)
+        objs = list(objs)
+        for pk in pks:
+            self._objects.pop(pk, None)
+        for key, (where, result) in list(self._queries.items()):
+            if (any(cached.pk in pks for cached in result)
+                    or any(_matches(obj, where) for obj in objs)):
+                del self._queries[key]
+
+    def clear(self) -> None:
+        """ Очистить кеш """
+        self._objects.clear()
+        self._queries.clear()
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        try:
+            with self.repo.transaction():
+                yield
+        except BaseException:
+            # объекты, прочитанные внутри отмененной транзакции, устарели
+            self.clear()
+            raise
+
+    def add(self, obj: T) -> int:
+        pk = self.repo.add(obj)
+        self._invalidate([pk], [obj])
+        return pk
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        objs = list(objs)
+        pks = self.repo.add_many(objs)
+        self._invalidate(pks, objs)
+        return pks
+
+    def get(self, pk: int) -> T | None:
+        if pk in self._objects:
+            self.hits += 1
+            self._objects.move_to_end(pk)
+            return self._objects[pk]
+        self.misses += 1
+        obj = self.repo.get(pk)
+        self._remember(pk, obj)
+        return obj
+
+    def get_many(self, pks: Iterable[int]) -> dict[int, T]:
+        pks = set(pks)
+        missing = pks.difference(self._objects)
+        self.hits += len(pks) - len(missing)
+        self.misses += len(missing)
+        found = self.repo.get_many(missing) if missing else {}
+        for pk in missing:
+            self._remember(pk, found.get(pk))
+        result = {}
+        for pk in pks:
+            obj = found.get(pk) if pk in missing else self._objects[pk]
+            if obj is not None:
+                result[pk] = obj
+        return result
+
+    def get_all(self, where: dict[str, Any] | None = None,
+                order_by: str | list[str] | None = None,
+                limit: int | None = None) -> list[T]:
+        key = repr((None if where is None else sorted(where.items()), order_by, limit))
+        if key in self._queries:
+            self.hits += 1
+            self._queries.move_to_end(key)
+            return list(self._queries[key][1])
+        self.misses += 1
+        result = self.repo.get_all(where, order_by, limit)
+        self._queries[key] = (where, result)
+        if len(self._queries) > self.max_queries:
+            self._queries.popitem(last=False)
+        for obj in result:
+            self._remember(obj.pk, obj)
+        return list(result)
+
+    def get_page(self, after_pk: int = 0, limit: int = 100,
+                 where: dict[str, Any] | None = None) -> list[T]:
+        return self.repo.get_page(after_pk, limit, where)
+
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 batch_size: int = 1000) -> Iterator[T]:
+        return self.repo.iter_all(where, batch_size)
+
+    def aggregate(self, func: str, field: str = 'pk',
+                  where: dict[str, Any] | None = None,
+                  group_by: str | None = None) -> Any:
+        return self.repo.aggregate(func, field, where, group_by)
+
+    def get_ancestors(self, pk: int) -> list[T]:
+        return self.repo.get_ancestors(pk)
+
+    def get_descendants(self, pk: int) -> list[T]:
+        return self.repo.get_descendants(pk)
+
+    def rollup(self, records: AbstractRepository[Any], field: str, ref_field: str,
+               where: dict[str, Any] | None = None) -> dict[int, Any]:
+        return self.repo.rollup(records, field, ref_field, where)
+
+    def update(self, obj: T) -> None:
+        try:
+            self.repo.update(obj)
+        except BaseException:
+            self._invalidate([obj.pk])
+            raise
+        self._invalidate([obj.pk], [obj])
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        objs = list(objs)
+        try:
+            self.repo.update_many(objs)
+        except BaseException:
+            self._invalidate([obj.pk for obj in objs])
+            raise
+        self._invalidate([obj.pk for obj in objs], objs)
+
+    def delete(self, pk: int) -> None:
+        self.repo.delete(pk)
+        self._invalidate([pk])
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        pks = list(pks)
+        self.repo.delete_many(pks)
+        self._invalidate(pks)
@@ -0,0 +1,88 @@
+"""
+Module with closure table of the category hierarchy.
+Table CategoryTree keeps a row (ancestor, descendant, depth) for every
+category and each of its ancestors, including the category itself with
+depth 0. Rows are maintained by sqlite triggers on Category, so both pony
+and sqlite3 repositories, and any other writer, keep it up to date.
+Ancestors and descendants of any depth are then read by one indexed query.
+"""
+import sqlite3
+
+from bookkeeper.utils import NONE_2_INT_CHANGER
+
+# table with hierarchy through "parent" field -> its closure table
+TREE_TABLES = {'Category': 'CategoryTree'}
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS "{tree}" (
+    "ancestor" INTEGER NOT NULL,
+    "descendant" INTEGER NOT NULL,
+    "depth" INTEGER NOT NULL,
+    PRIMARY KEY ("ancestor", "descendant")
+);
+
+CREATE INDEX IF NOT EXISTS "idx_{tree_lower}__descendant_depth"
+    ON "{tree}" ("descendant", "depth");
+
+CREATE TRIGGER IF NOT EXISTS "{tree_lower}_insert" AFTER INSERT ON "{table}"
+BEGIN
+    INSERT INTO "{tree}" ("ancestor", "descendant", "depth")
+    SELECT "ancestor", NEW."pk", "depth" + 1 FROM "{tree}"
+    WHERE "descendant" = NEW."parent"
+    UNION ALL SELECT NEW."pk", NEW."pk", 0;
+END;
+
+-- subtree of deleted node is detached from all its ancestors: children
+-- of deleted category become top level, their parent is reset to None
+CREATE TRIGGER IF NOT EXISTS "{tree_lower}_delete" AFTER DELETE ON "{table}"
+BEGIN
+    DELETE FROM "{tree}"
+    WHERE "descendant" IN (SELECT "descendant" FROM "{tree}" WHERE "ancestor" = OLD."pk")
+      AND "ancestor" IN (SELECT "ancestor" FROM "{tree}" WHERE "descendant" = OLD."pk");
+    UPDATE "{table}" SET "parent" = {none} WHERE "parent" = OLD."pk";
+END;
+
+-- moved subtree is detached from old ancestors and joined to new ones
+CREATE TRIGGER IF NOT EXISTS "{tree_lower}_update" AFTER UPDATE OF "parent" ON "{table}"
+WHEN OLD."parent" IS NOT NEW."parent"
+BEGIN
+    DELETE FROM "{tree}"
+    WHERE "descendant" IN (SELECT "descendant" FROM "{tree}" WHERE "ancestor" = NEW."pk")
+      AND "ancestor" IN (SELECT "ancestor" FROM "{tree}"
+                         WHERE "descendant" = NEW."pk" AND "ancestor" != NEW."pk");
+    INSERT INTO "{tree}" ("ancestor", "descendant", "depth")
+    SELECT up."ancestor", down."descendant", up."depth" + down."depth" + 1
+    FROM "{tree}" AS up, "{tree}" AS down
+    WHERE up."descendant" = NEW."parent" AND down."ancestor" = NEW."pk";
+END;
+'''
+
+_FILL = '''
+WITH RECURSIVE "paths" ("ancestor", "descendant", "depth") AS (
+    SELECT "pk", "pk", 0 FROM "{table}"
+    UNION ALL
+    SELECT node."parent", "paths"."descendant", "paths"."depth" + 1
+    FROM "paths" JOIN "{table}" AS node ON node."pk" = "paths"."ancestor"
+    WHERE node."parent" IN (SELECT "pk" FROM "{table}")
+)
+INSERT OR IGNORE INTO "{tree}" ("ancestor", "descendant", "depth")
+SELECT "ancestor", "descendant", "depth" FROM "paths"
+'''
+
+
+def create_closure_table(connection: sqlite3.Connection, table: str,
+                         fill: bool = False) -> None:
+    """
+    Create closure table of <table>, its index and triggers, if they do not
+    exist. Table <table> must exist. With <fill> rows for already stored
+    nodes are added, otherwise the table is expected to be empty.
+    Statements are run in the current transaction of connection.
+    """
+    tree = TREE_TABLES[table]
+    names = {'table': table, 'tree': tree, 'tree_lower': tree.lower(),
+             'none': NONE_2_INT_CHANGER}
+    # executescript would commit, so statements are run one by one
+    for statement in _SCHEMA.format(**names).split(';\n\n'):
+        connection.execute(statement)
+    if fill:
+        connection.execute(_FILL.format(**names))
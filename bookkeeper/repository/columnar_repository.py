@@ -0,0 +1,415 @@
+"""
+Модуль описывает колоночный репозиторий расходов в оперативной памяти
+
+Вместо объекта Expense на каждую запись хранится по массиву array на поле:
+pk, сумма, категория, дата расхода (порядковый номер дня, date.toordinal).
+Дата добавления и комментарий хранятся номерами строк в таблицах строк,
+где каждая различная строка лежит один раз. Объекты Expense создаются
+только при чтении. Условия where, сортировка и агрегаты вычисляются
+по массивам без создания объектов, а если установлен numpy - векторно.
+"""
+
+import operator
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from collections import Counter
+from datetime import date
+from itertools import compress, count, repeat
+from typing import Any, Callable, Iterable, Iterator, Sequence, cast
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import (
+    AbstractRepository, AGGREGATES, new_objects, parse_condition
+)
+from bookkeeper.utils import NONE_2_INT_CHANGER, optional_module
+
+np = optional_module('numpy')
+
+# поле -> код типа элементов массива, в порядке _encode
+TYPECODES = {'pk': 'q', 'amount': 'd', 'category': 'q', 'expense_date': 'i',
+             'added_date': 'i', 'comment': 'i'}
+# поля, хранящиеся числами, порядок которых совпадает с порядком значений
+NUMERIC_FIELDS = ('pk', 'amount', 'category', 'expense_date')
+
+_COMPARE: dict[str, Callable[[Any, Any], Any]] = {
+    '==': operator.eq, '!=': operator.ne, '<': operator.lt,
+    '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+}
+
+Rows = Sequence[int]  # номера строк массивов: range, list или numpy.ndarray
+
+
+class _StringTable:
+    """ Таблица строк: каждая различная строка хранится один раз под своим номером """
+
+    def __init__(self) -> None:
+        self.strings: list[str] = []
+        self.ids: dict[str, int] = {}
+
+    def encode(self, text: str) -> int:
+        """ Получить номер строки, добавив ее в таблицу, если ее там нет """
+        number = self.ids.get(text)
+        if number is None:
+            number = self.ids[text] = len(self.strings)
+            self.strings.append(sys.intern(text))
+        return number
+
+    def memory_usage(self) -> int:
+        """ Размер таблицы в байтах вместе со строками """
+        return (sys.getsizeof(self.strings) + sys.getsizeof(self.ids)
+                + sum(sys.getsizeof(text) for text in self.strings))
+
+
+def _decode_category(value: int) -> Any:
+    return None if value == NONE_2_INT_CHANGER else value
+
+
+class ColumnarExpenseRepository(AbstractRepository[Expense]):
+    """
+    Колоночный репозиторий расходов в оперативной памяти.
+
+    Занимает в несколько раз меньше памяти, чем MemoryRepository[Expense],
+    get и update находят запись двоичным поиском по pk. Объекты, которые
+    возвращают методы чтения, создаются заново и не связаны с репозиторием:
+    после их изменения нужно вызвать update. Дата расхода должна быть
+    в формате ISO-8601, иначе add и update выбрасывают ValueError.
+    Условие 'subtree' нужно заменить функцией expand_subtree.
+    """
+
+    def __init__(self) -> None:
+        self._columns: dict[str, 'array[Any]'] = {
+            field: array(typecode) for field, typecode in TYPECODES.items()}
+        self._strings = {'added_date': _StringTable(), 'comment': _StringTable()}
+        self._dates: dict[int, str] = {}  # порядковый номер дня -> ISO-8601
+        self._counter = count(1)
+
+    def _iso_date(self, ordinal: int) -> str:
+        iso = self._dates.get(ordinal)
+        if iso is None:
+            iso = self._dates[ordinal] = date.fromordinal(ordinal).isoformat()
+        return iso
+
+    def _encode(self, obj: Expense) -> tuple[Any, ...]:
+        """ Значения полей объекта для записи в массивы, в порядке TYPECODES """
+        return (obj.pk, float(obj.amount),
+                NONE_2_INT_CHANGER if obj.category is None else int(obj.category),
+                date.fromisoformat(obj.expense_date).toordinal(),
+                self._strings['added_date'].encode(obj.added_date),
+                self._strings['comment'].encode(obj.comment))
+
+    def _build(self, row: int) -> Expense:
+        """ Создать объект по строке row массивов """
+        columns = self._columns
+        return Expense(
+            columns['amount'][row], _decode_category(columns['category'][row]),
+            self._iso_date(columns['expense_date'][row]),
+            self._strings['added_date'].strings[columns['added_date'][row]],
+            self._strings['comment'].strings[columns['comment'][row]],
+            columns['pk'][row])
+
+    def _row(self, pk: int) -> int | None:
+        """ Номер строки записи с данным pk (pk в массиве возрастают) """
+        pks = self._columns['pk']
+        row = bisect_left(pks, pk)
+        if row < len(pks) and pks[row] == pk:
+            return row
+        return None
+
+    def _decoder(self, field: str) -> Callable[[Any], Any] | None:
+        """ Функция, переводящая хранимое значение поля в значение атрибута """
+        if field == 'category':
+            return _decode_category
+        if field == 'expense_date':
+            return self._iso_date
+        if field in self._strings:
+            return self._strings[field].strings.__getitem__
+        return None
+
+    def _getter(self, field: str) -> Callable[[int], Any]:
+        """ Функция, возвращающая значение атрибута по номеру строки """
+        if field not in self._columns:
+            raise ValueError(f'unknown field <{field}>')
+        column = self._columns[field]
+        decode = self._decoder(field)
+        if decode is None:
+            return column.__getitem__
+        return lambda row: decode(column[row])
+
+    def memory_usage(self) -> int:
+        """ Память в байтах, занимаемая массивами и таблицами строк """
+        return (sum(sys.getsizeof(column) for column in self._columns.values())
+                + sum(table.memory_usage() for table in self._strings.values()))
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        # снимок массивов; строки, добавленные в таблицы, остаются в них
+        columns = {field: column[:] for field, column in self._columns.items()}
+        try:
+            yield
+        except BaseException:
+            self._columns = columns
+            raise
+
+    def add(self, obj: Expense) -> int:
+        return self.add_many([obj])[0]
+
+    def add_many(self, objs: Iterable[Expense]) -> list[int]:
+        objs = new_objects(objs)
+        # все значения проверяются до записи, чтобы массивы не разошлись
+        rows = [self._encode(obj)[1:] for obj in objs]
+        pks = [next(self._counter) for _ in objs]
+        self._columns['pk'].extend(pks)
+        for i, column in enumerate(list(self._columns.values())[1:]):
+            column.extend(row[i] for row in rows)
+        for obj, pk in zip(objs, pks):
+            obj.pk = pk
+        return pks
+
+    def get(self, pk: int) -> Expense | None:
+        row = self._row(pk)
+        return None if row is None else self._build(row)
+
+    def get_many(self, pks: Iterable[int]) -> dict[int, Expense]:
+        result = {}
+        for pk in pks:
+            row = self._row(pk)
+            if row is not None:
+                result[pk] = self._build(row)
+        return result
+
+    def _match(self, rows: Rows, field: str, condition: Any) -> Rows:
+        """ Оставить из rows строки, где значение поля field удовлетворяет условию """
+        op, operand = parse_condition(condition)
+        if op not in _COMPARE and op not in ('in', 'between'):
+            raise ValueError(f'unsupported operator <{op}>')
+        column = self._columns.get(field)
+        encoded = _encode_operand(field, op, operand)
+        if column is not None and encoded is not None and np is not None:
+            values = np.frombuffer(column, column.typecode)[rows]
+            return cast(Rows, np.asarray(rows)[_numpy_flags(values, op, encoded)])
+        if column is not None and encoded is not None:
+            values = map(column.__getitem__, rows)
+            operand = encoded
+        else:
+            values = map(self._getter(field), rows)
+        if op in _COMPARE:
+            flags: Iterable[Any] = map(_COMPARE[op], values, repeat(operand))
+        elif op == 'in':
+            flags = map(set(operand).__contains__, values)
+        else:
+            low, high = operand
+            flags = (low <= value <= high for value in values)
+        selected = list(compress(rows, flags))
+        return selected if np is None else np.array(selected, dtype=np.int64)
+
+    def _select(self, where: dict[str, Any] | None = None, start: int = 0) -> Rows:
+        """ Строки с номерами от start, удовлетворяющие where, в порядке pk """
+        rows: Rows = range(start, len(self._columns['pk']))
+        if np is not None:
+            rows = np.arange(start, len(self._columns['pk']))
+        for field, condition in (where or {}).items():
+            rows = self._match(rows, field, condition)
+        return rows
+
+    def _order(self, rows: Rows, order_by: str | list[str]) -> Rows:
+        """ Отсортировать строки по полям order_by (см. get_all) """
+        if isinstance(order_by, str):
+            order_by = [order_by]
+        fields = [field.lstrip('-') for field in order_by]
+        if np is not None and all(field in NUMERIC_FIELDS for field in fields):
+            keys = []
+            for field, name in zip(fields, order_by):
+                column = self._columns[field]
+                values = np.frombuffer(column, column.typecode)[rows]
+                keys.append(-values if name.startswith('-') else values)
+            # lexsort устойчива и сортирует по последнему ключу в первую очередь
+            return cast(Rows, np.asarray(rows)[np.lexsort(keys[::-1])])
+        rows = list(_as_list(rows))
+        # сортировка устойчивая, поэтому сортируем начиная с последнего поля
+        for field, name in zip(reversed(fields), reversed(order_by)):
+            key = (self._columns[field].__getitem__ if field in NUMERIC_FIELDS
+                   else self._getter(field))
+            rows.sort(key=key, reverse=name.startswith('-'))
+        return rows
+
+    def get_all(self, where: dict[str, Any] | None = None,
+                order_by: str | list[str] | None = None,
+                limit: int | None = None) -> list[Expense]:
+        rows = self._select(where)
+        if order_by:
+            rows = self._order(rows, order_by)
+        if limit is not None:
+            rows = rows[:limit]
+        return [self._build(row) for row in _as_list(rows)]
+
+    def get_columns(self, fields: Iterable[str] = NUMERIC_FIELDS,
+                    where: dict[str, Any] | None = None) -> dict[str, 'array[Any]']:
+        """
+        Получить хранимые значения полей fields (из NUMERIC_FIELDS) записей,
+        удовлетворяющих where, в виде новых массивов array в порядке pk,
+        не создавая объекты. Дата расхода - порядковый номер дня
+        (date.toordinal), категория None - NONE_2_INT_CHANGER.
+        Массивы можно передать в numpy.frombuffer без копирования.
+        """
+        rows = self._select(where)
+        result = {}
+        for field in fields:
+            if field not in NUMERIC_FIELDS:
+                raise ValueError(f'field <{field}> is not stored as number')
+            result[field] = self._take(field, rows)
+        return result
+
+    def _take(self, field: str, rows: Rows) -> 'array[Any]':
+        column = self._columns[field]
+        if isinstance(rows, range):
+            return column[rows.start:rows.stop]
+        if np is not None:
+            taken = array(column.typecode)
+            taken.frombytes(np.frombuffer(column, column.typecode)[rows].tobytes())
+            return taken
+        return array(column.typecode, map(column.__getitem__, rows))
+
+    def aggregate(self, func: str, field: str = 'pk',
+                  where: dict[str, Any] | None = None,
+                  group_by: str | None = None) -> Any:
+        if func not in AGGREGATES:
+            raise ValueError(f'unsupported aggregate function <{func}>')
+        getter = self._getter(field)
+        group_getter = None if group_by is None else self._getter(group_by)
+        rows = self._select(where)
+        if np is not None and field in NUMERIC_FIELDS and (
+                group_by is None or func in ('sum', 'count')):
+            return self._numpy_aggregate(func, field, rows, group_by)
+        if func == 'count':
+            if group_getter is None:
+                return len(rows)
+            return dict(Counter(map(group_getter, rows)))
+        if group_getter is None:
+            return _reduce(func, map(getter, rows))
+        groups: dict[Any, list[Any]] = {}
+        for row in rows:
+            groups.setdefault(group_getter(row), []).append(getter(row))
+        return {key: _reduce(func, values) for key, values in groups.items()}
+
+    def _numpy_aggregate(self, func: str, field: str, rows: Rows,
+                         group_by: str | None) -> Any:
+        """ Агрегат по числовому полю средствами numpy, см. aggregate """
+        column = self._columns[field]
+        values = np.frombuffer(column, column.typecode)[rows]
+        decode = self._decoder(field) or (lambda value: value)
+        if group_by is None:
+            if func == 'count':
+                return len(values)
+            if func == 'sum':
+                return values.sum().item()
+            return decode(getattr(values, func)().item()) if len(values) else None
+        keys, groups = np.unique(self._take(group_by, rows), return_inverse=True)
+        if func == 'count':
+            totals = np.bincount(groups, minlength=len(keys))
+        else:
+            totals = np.bincount(groups, values, minlength=len(keys))
+            if column.typecode != 'd':
+                totals = totals.round().astype(np.int64)
+        decode_key = self._decoder(group_by) or (lambda value: value)
+        return {decode_key(key): total
+                for key, total in zip(keys.tolist(), totals.tolist())}
+
+    def get_page(self, after_pk: int = 0, limit: int = 100,
+                 where: dict[str, Any] | None = None) -> list[Expense]:
+        start = bisect_right(self._columns['pk'], after_pk)
+        return [self._build(row) for row in _as_list(self._select(where, start)[:limit])]
+
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 batch_size: int = 1000) -> Iterator[Expense]:
+        # запоминаются только pk, поэтому репозиторий можно менять во время перебора
+        pks = self._take('pk', self._select(where))
+        for start in range(0, len(pks), batch_size):
+            yield from self.get_many(pks[start:start + batch_size]).values()
+
+    def _rows_of(self, objs: list[Expense]) -> list[int]:
+        if any(obj.pk == 0 for obj in objs):
+            raise ValueError('attempt to update object with unknown primary key')
+        rows = [self._row(obj.pk) for obj in objs]
+        for obj, row in zip(objs, rows):
+            if row is None:
+                raise KeyError(obj.pk)
+        return rows  # type: ignore[return-value]
+
+    def update(self, obj: Expense) -> None:
+        self.update_many([obj])
+
+    def update_many(self, objs: Iterable[Expense]) -> None:
+        objs = list(objs)
+        rows = self._rows_of(objs)
+        values = [self._encode(obj) for obj in objs]
+        for row, row_values in zip(rows, values):
+            for column, value in zip(self._columns.values(), row_values):
+                column[row] = value
+
+    def delete(self, pk: int) -> None:
+        row = self._row(pk)
+        if row is None:
+            raise KeyError(pk)
+        for column in self._columns.values():
+            del column[row]
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        rows = []
+        for pk in pks:
+            row = self._row(pk)
+            if row is None:
+                raise KeyError(pk)
+            rows.append(row)
+        keep = [True] * len(self._columns['pk'])
+        for row in rows:
+            keep[row] = False
+        # массивы пересобираются за один проход вместо сдвига на каждое удаление
+        self._columns = {field: array(column.typecode, compress(column, keep))
+                         for field, column in self._columns.items()}
+
+
+def _encode_operand(field: str, op: str, operand: Any) -> Any:
+    """
+    Перевести операнд условия по числовому полю в хранимые значения,
+    вернуть None, если условие проверяется по значениям атрибутов
+    """
+    if field not in NUMERIC_FIELDS:
+        return None
+    values = operand if op in ('in', 'between') else [operand]
+    try:
+        if field == 'expense_date':
+            encoded = [date.fromisoformat(value).toordinal() for value in values]
+        elif field == 'category':
+            encoded = [NONE_2_INT_CHANGER if value is None else value for value in values]
+        else:
+            encoded = list(values)
+    except (TypeError, ValueError):  # не дата: сравниваются строки
+        return None
+    return encoded if op in ('in', 'between') else encoded[0]
+
+
+def _as_list(rows: Rows) -> Rows:
+    """ Номера строк в виде int python, а не numpy.int64 """
+    if np is not None and isinstance(rows, np.ndarray):
+        return cast(Rows, rows.tolist())
+    return rows
+
+
+def _numpy_flags(values: Any, op: str, operand: Any) -> Any:
+    if op in _COMPARE:
+        return _COMPARE[op](values, operand)
+    if op == 'in':
+        return np.isin(values, list(operand))
+    low, high = operand
+    return (values >= low) & (values <= high)
+
+
+def _reduce(func: str, values: Iterable[Any]) -> Any:
+    """ sum, min или max значений, для пустой последовательности - 0 или None """
+    if func == 'sum':
+        return sum(values)
+    if func == 'min':
+        return min(values, default=None)
+    return max(values, default=None)
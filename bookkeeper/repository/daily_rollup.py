@@ -0,0 +1,185 @@
+"""
+Module with daily rollup of expenses.
+Table expense_daily keeps a row (expense_date, category, amount, count) with
+the sum and the number of expenses of every day and category. Rows are
+maintained by sqlite triggers on Expense, so both pony and sqlite3
+repositories, and any other writer, keep it up to date. Aggregates of
+amounts by dates and categories then read a few summary rows per day
+instead of every expense. Columns are named as in Expense, so the same
+conditions apply to both tables.
+
+The table can be checked against Expense and rebuilt from scratch:
+    python -m bookkeeper.repository.daily_rollup verify --database database.db
+    python -m bookkeeper.repository.daily_rollup rebuild --database database.db
+Relative database names are resolved against bookkeeper/repository directory,
+as in bind_database of repositories, so database.db is the application database.
+"""
+import argparse
+import sqlite3
+import sys
+from os import path
+from typing import Any
+
+from bookkeeper.repository.sqlite_profile import database_path
+
+# table -> its daily rollup table
+ROLLUP_TABLES = {'Expense': 'expense_daily'}
+# columns of rollup key and summed column, the same in both tables
+KEY_COLUMNS = ('expense_date', 'category')
+VALUE_COLUMN = 'amount'
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS "{rollup}" (
+    "expense_date" TEXT NOT NULL,
+    "category" INTEGER NOT NULL,
+    "amount" REAL NOT NULL,
+    "count" INTEGER NOT NULL,
+    PRIMARY KEY ("expense_date", "category")
+);
+
+CREATE TRIGGER IF NOT EXISTS "{rollup}_insert" AFTER INSERT ON "{table}"
+BEGIN
+    INSERT INTO "{rollup}" ("expense_date", "category", "amount", "count")
+    VALUES (NEW."expense_date", NEW."category", NEW."amount", 1)
+    ON CONFLICT ("expense_date", "category") DO UPDATE
+    SET "amount" = "amount" + excluded."amount", "count" = "count" + 1;
+END;
+
+-- row of a day and category is removed with its last expense
+CREATE TRIGGER IF NOT EXISTS "{rollup}_delete" AFTER DELETE ON "{table}"
+BEGIN
+    UPDATE "{rollup}" SET "amount" = "amount" - OLD."amount", "count" = "count" - 1
+    WHERE "expense_date" = OLD."expense_date" AND "category" = OLD."category";
+    DELETE FROM "{rollup}"
+    WHERE "expense_date" = OLD."expense_date" AND "category" = OLD."category"
+      AND "count" = 0;
+END;
+
+-- changed expense is moved from its old row to the new one
+CREATE TRIGGER IF NOT EXISTS "{rollup}_update"
+AFTER UPDATE OF "expense_date", "category", "amount" ON "{table}"
+WHEN OLD."expense_date" IS NOT NEW."expense_date"
+  OR OLD."category" IS NOT NEW."category" OR OLD."amount" IS NOT NEW."amount"
+BEGIN
+    UPDATE "{rollup}" SET "amount" = "amount" - OLD."amount", "count" = "count" - 1
+    WHERE "expense_date" = OLD."expense_date" AND "category" = OLD."category";
+    DELETE FROM "{rollup}"
+    WHERE "expense_date" = OLD."expense_date" AND "category" = OLD."category"
+      AND "count" = 0;
+    INSERT INTO "{rollup}" ("expense_date", "category", "amount", "count")
+    VALUES (NEW."expense_date", NEW."category", NEW."amount", 1)
+    ON CONFLICT ("expense_date", "category") DO UPDATE
+    SET "amount" = "amount" + excluded."amount", "count" = "count" + 1;
+END;
+'''
+
+_TOTALS = '''
+SELECT "expense_date", "category", sum("amount"), count(*) FROM "{table}"
+GROUP BY "expense_date", "category"
+'''
+
+# rows of rollup table differing from totals of the table, sums are
+# compared with tolerance, as triggers add and subtract amounts one by one
+_VERIFY = '''
+SELECT "expense_date", "category", sum("stored_amount"), sum("stored_count"),
+       sum("amount"), sum("count")
+FROM (
+    SELECT "expense_date", "category", "amount" AS "stored_amount",
+           "count" AS "stored_count", 0 AS "amount", 0 AS "count" FROM "{rollup}"
+    UNION ALL
+    SELECT "expense_date", "category", 0, 0, sum("amount"), count(*) FROM "{table}"
+    GROUP BY "expense_date", "category"
+)
+GROUP BY "expense_date", "category"
+HAVING abs(sum("stored_amount") - sum("amount")) > 1e-6
+    OR sum("stored_count") != sum("count")
+ORDER BY "expense_date", "category"
+'''
+
+
+def create_rollup_table(connection: sqlite3.Connection, table: str,
+                        fill: bool = False) -> None:
+    """
+    Create rollup table of <table> and its triggers, if they do not exist.
+    Table <table> must exist. With <fill> the rollup table is rebuilt from
+    already stored rows, otherwise <table> is expected to be empty.
+    Statements are run in the current transaction of connection.
+    """
+    names = {'table': table, 'rollup': ROLLUP_TABLES[table]}
+    # executescript would commit, so statements are run one by one
+    for statement in _SCHEMA.format(**names).split(';\n\n'):
+        connection.execute(statement)
+    if fill:
+        rebuild_rollup(connection, table)
+
+
+def rebuild_rollup(connection: sqlite3.Connection, table: str = 'Expense') -> int:
+    """
+    Refill rollup table of <table> from scratch in the current transaction
+    of connection. Returns number of rollup rows.
+    """
+    rollup = ROLLUP_TABLES[table]
+    connection.execute(f'DELETE FROM "{rollup}"')
+    return connection.execute(
+        f'INSERT INTO "{rollup}" ("expense_date", "category", "amount", "count")'
+        + _TOTALS.format(table=table)).rowcount
+
+
+def verify_rollup(connection: sqlite3.Connection,
+                  table: str = 'Expense') -> list[tuple[Any, ...]]:
+    """
+    Compare rollup table of <table> with totals of its rows. Returns rows
+    (expense_date, category, stored amount, stored count, amount, count)
+    for every day and category where they differ, empty list if none.
+    """
+    return connection.execute(
+        _VERIFY.format(table=table, rollup=ROLLUP_TABLES[table])).fetchall()
+
+
+def covers(func: str, field: str, where: dict[str, Any] | None,
+           group_by: str | None) -> bool:
+    """
+    Check if aggregate of rows (see AbstractRepository.aggregate) can be
+    read from rollup table: sum of amounts or count of rows, or min and max
+    of key columns, with conditions and grouping by key columns only.
+    Count of rows is the sum of "count" column of rollup table then.
+    """
+    if group_by not in (None, *KEY_COLUMNS):
+        return False
+    if any(name not in KEY_COLUMNS for name in where or {}):
+        return False
+    if func in ('min', 'max'):
+        return field in KEY_COLUMNS
+    return func == 'count' or (func == 'sum' and field == VALUE_COLUMN)
+
+
+def main() -> None:
+    """ Command line entry point """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n', maxsplit=2)[1])
+    parser.add_argument('command', choices=['verify', 'rebuild'])
+    parser.add_argument('--database', default='database.db',
+                        help='relative to bookkeeper/repository directory')
+    args = parser.parse_args()
+    db_filename = database_path(args.database)
+    if not path.isfile(db_filename):
+        sys.exit(f'database file {db_filename} not found')
+
+    connection = sqlite3.connect(db_filename)
+    try:
+        with connection:
+            create_rollup_table(connection, 'Expense')  # if the file was never migrated
+            if args.command == 'rebuild':
+                print(f'{rebuild_rollup(connection)} rows written to expense_daily')
+                return
+            mismatches = verify_rollup(connection)
+    finally:
+        connection.close()
+    for row in mismatches:
+        print('{} category {}: stored {:.2f} in {} expenses, actual {:.2f} in {}'
+              .format(*row))
+    print(f'{len(mismatches)} mismatching rows in expense_daily')
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -29,10 +29,10 @@ class Expense(db.Entity):
     """ ORM for database table Expense"""
     pk = pny.PrimaryKey(int, auto=True)
     amount = pny.Required(float)
-    category = pny.Required(int)
+    category = pny.Required(int, index=True)
     comment = pny.Optional(str, 50)
     added_date = pny.Required(str, 30)
-    expense_date = pny.Optional(str, 30)
+    expense_date = pny.Optional(str, 30, index=True)  # ISO-8601, sortable
 
     def get_data(self) -> dict[str, Any]:
         """ Get data from entity """
@@ -61,12 +61,41 @@ class Category(db.Entity):
         }
 
 
+class CategoryTree(db.Entity):
+    """
+    ORM for closure table of categories, rows are written by triggers
+    created in closure_table.create_closure_table
+    """
+    ancestor = pny.Required(int)
+    descendant = pny.Required(int)
+    depth = pny.Required(int)
+    pny.PrimaryKey(ancestor, descendant)
+    pny.composite_index(descendant, depth)
+
+
+class ExpenseDaily(db.Entity):
+    """
+    ORM for daily rollup of expenses, rows are written by triggers
+    created in daily_rollup.create_rollup_table
+    """
+    _table_ = 'expense_daily'
+    expense_date = pny.Required(str, 30)
+    category = pny.Required(int)
+    amount = pny.Required(float)
+    count = pny.Required(int)
+    pny.PrimaryKey(expense_date, category)
+
+
 class Budget(db.Entity):
     """ ORM for database table Budget"""
     pk = pny.PrimaryKey(int, auto=True)
     period = pny.Required(str, 20)
     limit = pny.Required(float)
     spent = pny.Required(float)
+    category = pny.Optional(int)
+    start_date = pny.Optional(str, 30)
+    end_date = pny.Optional(str, 30)
+    days = pny.Optional(int)
 
     def get_data(self) -> dict[str, Any]:
         """Get data from entity """
@@ -74,5 +103,9 @@ class Budget(db.Entity):
             'pk': self.pk,
             'period': self.period,
             'limit': self.limit,
-            'spent': self.spent
+            'spent': self.spent,
+            'category': None if self.category == NONE_2_INT_CHANGER else self.category,
+            'start_date': self.start_date,
+            'end_date': self.end_date,
+            'days': self.days
         }
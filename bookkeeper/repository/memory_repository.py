@@ -2,20 +2,108 @@
 Модуль описывает репозиторий, работающий в оперативной памяти
 """
 
+import copy
+import heapq
+import sys
+from contextlib import contextmanager
 from itertools import count
-from typing import Any
+from typing import Any, Iterable, Iterator
 
-from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from bookkeeper.repository.abstract_repository import (
+    AbstractRepository, T, parse_condition, check_condition, aggregate_objects,
+    new_objects
+)
+
+
+class _HashIndex:
+    """
+    Хеш-индекс по одному полю: значение -> множество pk.
+    Хранит также значение поля для каждого pk, чтобы удалять запись
+    из индекса, даже если объект уже изменен на месте.
+    """
+
+    def __init__(self) -> None:
+        self.pks_by_value: dict[Any, set[int]] = {}
+        self.value_by_pk: dict[int, Any] = {}
+
+    def add(self, pk: int, value: Any) -> None:
+        """ Добавить запись в индекс """
+        self.pks_by_value.setdefault(value, set()).add(pk)
+        self.value_by_pk[pk] = value
+
+    def remove(self, pk: int) -> None:
+        """ Удалить запись из индекса """
+        value = self.value_by_pk.pop(pk)
+        pks = self.pks_by_value[value]
+        pks.discard(pk)
+        if not pks:
+            del self.pks_by_value[value]
+
+    def lookup(self, values: Iterable[Any]) -> set[int]:
+        """ Получить pk записей, у которых значение поля равно одному из values """
+        return set().union(*(self.pks_by_value.get(v, ()) for v in values))
+
+    def memory_usage(self) -> int:
+        """ Размер индекса в байтах без учета самих значений полей """
+        return (sys.getsizeof(self.pks_by_value) + sys.getsizeof(self.value_by_pk)
+                + sum(sys.getsizeof(pks) for pks in self.pks_by_value.values()))
 
 
 class MemoryRepository(AbstractRepository[T]):
     """
     Репозиторий, работающий в оперативной памяти. Хранит данные в словаре.
+
+    Для полей из indexed_fields поддерживаются хеш-индексы, с которыми
+    get_all с условиями '==' и 'in' по этим полям не перебирает все записи.
+    Значения индексированных полей должны быть хешируемыми.
+    Индексы обновляются в add, update и delete, поэтому после изменения
+    объекта на месте нужно вызвать update.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, indexed_fields: Iterable[str] = ()) -> None:
         self._container: dict[int, T] = {}
         self._counter = count(1)
+        self._indexes = {field: _HashIndex() for field in indexed_fields}
+
+    def _index_add(self, pk: int, obj: T) -> None:
+        for field, index in self._indexes.items():
+            index.add(pk, getattr(obj, field))
+
+    def _index_remove(self, pk: int) -> None:
+        for index in self._indexes.values():
+            index.remove(pk)
+
+    def _index_lookup(self, conditions: list[tuple[str, str, Any]]) -> set[int] | None:
+        """
+        Найти pk, подходящие под условия по индексированным полям.
+        Вернуть None, если ни одно условие нельзя проверить по индексу.
+        """
+        result: set[int] | None = None
+        for attr, operator, value in conditions:
+            index = self._indexes.get(attr)
+            if index is None or operator not in ('==', 'in'):
+                continue
+            pks = index.lookup([value] if operator == '==' else value)
+            result = pks if result is None else result & pks
+        return result
+
+    def index_memory_usage(self) -> dict[str, int]:
+        """ Память в байтах, занимаемая индексом каждого поля """
+        return {field: index.memory_usage() for field, index in self._indexes.items()}
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        # снимок словаря: отменяются добавление, замена и удаление объектов,
+        # но не изменения объектов на месте; выданные pk не переиспользуются
+        container = dict(self._container)
+        try:
+            yield
+        except BaseException:
+            self._container = container
+            self._indexes = {field: _HashIndex() for field in self._indexes}
+            for pk, obj in container.items():
+                self._index_add(pk, obj)
+            raise
 
     def add(self, obj: T) -> int:
         if getattr(obj, 'pk', None) != 0:
@@ -23,21 +111,96 @@ class MemoryRepository(AbstractRepository[T]):
         pk = next(self._counter)
         self._container[pk] = obj
         obj.pk = pk
+        self._index_add(pk, obj)
         return pk
 
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        objs = new_objects(objs)
+        return [self.add(obj) for obj in objs]
+
     def get(self, pk: int) -> T | None:
         return self._container.get(pk)
 
-    def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
+    def get_many(self, pks: Iterable[int]) -> dict[int, T]:
+        return {pk: self._container[pk] for pk in pks if pk in self._container}
+
+    def _filter(self, where: dict[str, Any] | None) -> Iterator[T]:
+        """ Iterate over objects satisfying <where> in order of addition """
         if where is None:
-            return list(self._container.values())
-        return [obj for obj in self._container.values()
-                if all(getattr(obj, attr) == value for attr, value in where.items())]
+            yield from self._container.values()
+            return
+        conditions = [(attr, *parse_condition(cond)) for attr, cond in where.items()]
+        pks = self._index_lookup(conditions)
+        candidates: Iterable[T] = (
+            self._container.values() if pks is None
+            # pk растут с добавлением, поэтому порядок совпадает со словарем
+            else (self._container[pk] for pk in sorted(pks))
+        )
+        for obj in candidates:
+            if all(check_condition(getattr(obj, attr), op, value)
+                   for attr, op, value in conditions):
+                yield obj
+
+    def get_all(self, where: dict[str, Any] | None = None,
+                order_by: str | list[str] | None = None,
+                limit: int | None = None) -> list[T]:
+        objs = list(self._filter(where))
+        if isinstance(order_by, str):
+            order_by = [order_by]
+        # сортировка устойчивая, поэтому сортируем начиная с последнего поля
+        for field in reversed(order_by or []):
+            attr = field.lstrip('-')
+            objs.sort(key=lambda obj: getattr(obj, attr),
+                      reverse=field.startswith('-'))
+        if limit is not None:
+            objs = objs[:limit]
+        return objs
+
+    def aggregate(self, func: str, field: str = 'pk',
+                  where: dict[str, Any] | None = None,
+                  group_by: str | None = None) -> Any:
+        return aggregate_objects(self._filter(where), func, field, group_by)
+
+    def get_page(self, after_pk: int = 0, limit: int = 100,
+                 where: dict[str, Any] | None = None) -> list[T]:
+        return heapq.nsmallest(limit, (obj for obj in self._filter(where)
+                                       if obj.pk > after_pk),
+                               key=lambda obj: obj.pk)
 
     def update(self, obj: T) -> None:
         if obj.pk == 0:
             raise ValueError('attempt to update object with unknown primary key')
+        if obj.pk not in self._container:
+            raise KeyError(obj.pk)
+        self._index_remove(obj.pk)
         self._container[obj.pk] = obj
+        self._index_add(obj.pk, obj)
 
     def delete(self, pk: int) -> None:
-        self._container.pop(pk)
+        obj = self._container.pop(pk)
+        self._index_remove(pk)
+        if hasattr(obj, 'parent'):
+            # как триггер closure_table: дети удаленного объекта становятся
+            # верхним уровнем; копии, чтобы transaction мог отменить замену
+            for child in self.get_all({'parent': pk}):
+                child = copy.copy(child)
+                setattr(child, 'parent', None)
+                self.update(child)
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        objs = list(objs)
+        if any(obj.pk == 0 for obj in objs):
+            raise ValueError('attempt to update object with unknown primary key')
+        for obj in objs:
+            if obj.pk not in self._container:
+                raise KeyError(obj.pk)
+        for obj in objs:
+            self.update(obj)
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        pks = list(pks)
+        for pk in pks:
+            if pk not in self._container:
+                raise KeyError(pk)
+        for pk in pks:
+            self.delete(pk)
@@ -0,0 +1,105 @@
+"""
+Module with one-shot migrations of existing sqlite3 database files.
+Schema version is kept in sqlite "user_version" pragma.
+"""
+import sqlite3
+from os import path
+
+from bookkeeper.repository.closure_table import TREE_TABLES, create_closure_table
+from bookkeeper.repository.daily_rollup import create_rollup_table
+from bookkeeper.utils import NONE_2_INT_CHANGER
+
+SCHEMA_VERSION = 5
+
+
+def _tables(connection: sqlite3.Connection) -> set[str]:
+    return {row[0] for row in connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def _iso_expense_dates(connection: sqlite3.Connection) -> None:
+    """ Version 1: 'dd-mm-yyyy' dates -> sortable ISO-8601 'yyyy-mm-dd' """
+    if 'Expense' not in _tables(connection):
+        return
+    old_format = "'[0-3][0-9]-[01][0-9]-[0-9][0-9][0-9][0-9]*'"
+    connection.execute(
+        'UPDATE "Expense" SET "expense_date" = '
+        'substr("expense_date", 7, 4) || \'-\' || substr("expense_date", 4, 2) '
+        '|| \'-\' || substr("expense_date", 1, 2) '
+        f'WHERE "expense_date" GLOB {old_format}')
+    connection.execute(
+        'UPDATE "Expense" SET "added_date" = '
+        'substr("added_date", 7, 4) || \'-\' || substr("added_date", 4, 2) '
+        '|| \'-\' || substr("added_date", 1, 2) || substr("added_date", 11) '
+        f'WHERE "added_date" GLOB {old_format}')
+
+
+def _category_tree(connection: sqlite3.Connection) -> None:
+    """ Version 2: closure table of categories, index of expenses by category """
+    tables = _tables(connection)
+    if 'Category' in tables:
+        create_closure_table(connection, 'Category', fill=True)
+    if 'Expense' in tables:
+        connection.execute('CREATE INDEX IF NOT EXISTS "idx_expense__category" '
+                           'ON "Expense" ("category")')
+
+
+def _expense_daily(connection: sqlite3.Connection) -> None:
+    """ Version 3: daily rollup of expenses """
+    if 'Expense' in _tables(connection):
+        create_rollup_table(connection, 'Expense', fill=True)
+
+
+def _budget_scopes(connection: sqlite3.Connection) -> None:
+    """ Version 4: category, date range and window columns of budgets """
+    if 'Budget' not in _tables(connection):
+        return
+    columns = {row[1] for row in connection.execute('PRAGMA table_info("Budget")')}
+    for definition in (f'"category" INTEGER DEFAULT {NONE_2_INT_CHANGER}',
+                       '"start_date" TEXT NOT NULL DEFAULT \'\'',
+                       '"end_date" TEXT NOT NULL DEFAULT \'\'',
+                       '"days" INTEGER NOT NULL DEFAULT 0'):
+        if definition.split('"')[1] not in columns:
+            connection.execute(f'ALTER TABLE "Budget" ADD COLUMN {definition}')
+
+
+def _detach_orphans(connection: sqlite3.Connection) -> None:
+    """ Version 5: children of deleted categories are top level, parent is None """
+    if 'Category' not in _tables(connection):
+        return
+    # the old delete trigger did not reset parent, the new one replaces it
+    trigger = f'{TREE_TABLES["Category"].lower()}_delete'
+    connection.execute(f'DROP TRIGGER IF EXISTS "{trigger}"')
+    create_closure_table(connection, 'Category')
+    connection.execute(
+        f'UPDATE "Category" SET "parent" = {NONE_2_INT_CHANGER} '
+        f'WHERE "parent" != {NONE_2_INT_CHANGER} '
+        'AND "parent" NOT IN (SELECT "pk" FROM "Category")')
+
+
+MIGRATIONS = [_iso_expense_dates, _category_tree, _expense_daily, _budget_scopes,
+              _detach_orphans]
+
+
+def stamp_version(connection: sqlite3.Connection) -> None:
+    """
+    Mark database of connection as having the current schema. Called after
+    the schema is created, so that a new database file is not migrated later.
+    """
+    connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+
+def migrate(db_filename: str) -> None:
+    """ Apply all migrations newer than the version of database file <db_filename> """
+    if not path.isfile(db_filename):
+        return  # new database is created with the current schema and stamped
+
+    connection = sqlite3.connect(db_filename)
+    try:
+        with connection:  # one transaction for all migrations
+            version = connection.execute('PRAGMA user_version').fetchone()[0]
+            for migration in MIGRATIONS[version:]:
+                migration(connection)
+            stamp_version(connection)
+    finally:
+        connection.close()
@@ -0,0 +1,411 @@
+"""
+Module for repository working with sqlite3 database through the standard
+sqlite3 module, without ORM. Tables have the same schema as the pony
+tables in databases.py, so both repositories can open the same file.
+"""
+
+import sqlite3
+import threading
+import types
+from contextlib import contextmanager
+from dataclasses import fields
+from inspect import get_annotations
+from typing import Any, Iterable, Iterator, Union, get_args, get_origin
+
+from bookkeeper.repository.abstract_repository import (
+    AbstractRepository, T, new_objects, parse_condition
+)
+from bookkeeper.repository.closure_table import TREE_TABLES, create_closure_table
+from bookkeeper.repository.daily_rollup import (
+    ROLLUP_TABLES, covers, create_rollup_table
+)
+from bookkeeper.repository.migrations import migrate, stamp_version
+from bookkeeper.repository.sqlite_profile import (
+    apply_pragmas, database_path, read_pragmas, resolve_profile
+)
+from bookkeeper.utils import NONE_2_INT_CHANGER, py2sqlite_type_converter
+
+# max number of pks in one "in" condition, keeps below sqlite variables limit
+BATCH_SIZE = 500
+
+# indexed columns, the same as in pony schema
+INDEXES = {'Expense': ('expense_date', 'category')}
+
+_SQL_TYPES = {int: 'INTEGER', float: 'REAL', str: 'TEXT'}
+
+_OPERATORS = {'==': '=', '!=': '!=', '<': '<', '<=': '<=', '>': '>', '>=': '>='}
+
+_AGGREGATES = {'sum': 'coalesce(sum({}), 0)', 'count': 'count(*)',
+               'min': 'min({})', 'max': 'max({})'}
+
+
+def _is_optional(annotation: Any) -> bool:
+    """ Check if annotation allows None, like int | None """
+    return (get_origin(annotation) in (Union, types.UnionType)
+            and type(None) in get_args(annotation))
+
+
+def _base_type(annotation: Any) -> Any:
+    """ int for int | None """
+    if _is_optional(annotation):
+        return next(arg for arg in get_args(annotation) if arg is not type(None))
+    return annotation
+
+
+class RawSQLiteRepository(AbstractRepository[T]):
+    """
+    SQLite3 repository on the standard sqlite3 module.
+    All repositories share one long-lived connection opened by bind_database.
+    SQL text of every statement is built once in constructor, so sqlite3
+    takes compiled statements from its cache. Rows are turned into
+    objects of data_cls by row factory. Bulk writes use executemany.
+    Connection may be used from several threads, calls are serialized by lock.
+    Writes of one call are committed together, calls inside a transaction
+    block hold the lock and are committed at the end of the outermost block.
+    """
+    connection: sqlite3.Connection | None = None
+    lock = threading.RLock()
+    # nesting level of transaction blocks in the thread holding lock
+    depth = 0
+
+    def __init__(self, data_cls: type, table_name: str,
+                 indexed_fields: Iterable[str] | None = None) -> None:
+        if self.connection is None:
+            raise RuntimeError('database is not bound, call bind_database first')
+        self.data_cls = data_cls
+        self.table_name = table_name
+        annotations = get_annotations(data_cls, eval_str=True)
+        # select order matches constructor arguments order of dataclass
+        self.columns = [f.name for f in fields(data_cls)]
+        self.data_columns = [name for name in self.columns if name != 'pk']
+        self.optional = [i for i, name in enumerate(self.columns)
+                         if _is_optional(annotations[name])]
+        if indexed_fields is None:
+            indexed_fields = INDEXES.get(table_name, ())
+
+        table = f'"{table_name}"'
+        column_list = ', '.join(f'"{name}"' for name in self.columns)
+        self.sql_select = f'SELECT {column_list} FROM {table}'
+        self.sql_insert = (
+            f'INSERT INTO {table} ('
+            + ', '.join(f'"{name}"' for name in self.data_columns)
+            + ') VALUES (' + ', '.join('?' for _ in self.data_columns) + ')')
+        self.sql_update = (
+            f'UPDATE {table} SET '
+            + ', '.join(f'"{name}" = ?' for name in self.data_columns)
+            + ' WHERE "pk" = ?')
+        self.sql_get = f'{self.sql_select} WHERE "pk" = ?'
+        self.sql_delete = f'DELETE FROM {table} WHERE "pk" = ?'
+        if table_name in TREE_TABLES:
+            node_columns = ', '.join(f'node."{name}"' for name in self.columns)
+            tree_select = (f'SELECT {node_columns} FROM {table} AS node '
+                           f'JOIN "{TREE_TABLES[table_name]}" AS tree ')
+            self.sql_ancestors = (tree_select + 'ON node."pk" = tree."ancestor" '
+                                  'WHERE tree."descendant" = ? AND tree."depth" > 0 '
+                                  'ORDER BY tree."depth"')
+            self.sql_descendants = (tree_select + 'ON node."pk" = tree."descendant" '
+                                    'WHERE tree."ancestor" = ? AND tree."depth" > 0 '
+                                    'ORDER BY tree."depth"')
+        self._create_table(annotations, indexed_fields)
+
+    @classmethod
+    def bind_database(cls, db_filename: str = 'database.db',
+                      profile: str | dict[str, Any] | None = None) -> dict[str, Any]:
+        """
+        Open connection to database in file <db_filename>. Relative file names
+        are resolved against this module directory. Existing database file
+        is migrated to the current schema first, new one is stamped with
+        the current schema version. The previous connection,
+        if any, is closed. Pragmas of <profile> (name from
+        sqlite_profile.PROFILES or dict) are set on the connection.
+        Returns effective pragmas.
+        """
+        db_filename = database_path(db_filename)
+        migrate(db_filename)
+        pragmas = resolve_profile(profile)
+
+        with cls.lock:
+            if cls.connection is not None:
+                cls.connection.close()
+            cls.connection = sqlite3.connect(db_filename, check_same_thread=False,
+                                             cached_statements=256)
+            apply_pragmas(cls.connection, pragmas)
+            # tables of a new file are created by repositories with the current schema
+            stamp_version(cls.connection)
+        return cls.get_pragmas()
+
+    @classmethod
+    def set_profile(cls, profile: str | dict[str, Any] | None) -> dict[str, Any]:
+        """ Switch connection to <profile>, returns effective pragmas """
+        pragmas = resolve_profile(profile)
+        with cls.lock:
+            if cls.connection is None:
+                raise RuntimeError('database is not bound, call bind_database first')
+            apply_pragmas(cls.connection, pragmas)
+        return cls.get_pragmas()
+
+    @classmethod
+    def get_pragmas(cls) -> dict[str, Any]:
+        """ Effective pragmas of the connection """
+        with cls.lock:
+            if cls.connection is None:
+                raise RuntimeError('database is not bound, call bind_database first')
+            return read_pragmas(cls.connection)
+
+    def _create_table(self, annotations: dict[str, Any],
+                      indexed_fields: Iterable[str]) -> None:
+        """ Create table and indexes if they do not exist """
+        definitions = []
+        for name in self.columns:
+            if name == 'pk':
+                definitions.append('"pk" INTEGER PRIMARY KEY AUTOINCREMENT')
+                continue
+            sql_type = _SQL_TYPES.get(_base_type(annotations[name]), 'TEXT')
+            not_null = '' if _is_optional(annotations[name]) else ' NOT NULL'
+            definitions.append(f'"{name}" {sql_type}{not_null}')
+        with self.transaction():
+            self._conn().execute(
+                f'CREATE TABLE IF NOT EXISTS "{self.table_name}" ('
+                + ', '.join(definitions) + ')')
+            for name in indexed_fields:
+                self._conn().execute(
+                    f'CREATE INDEX IF NOT EXISTS "idx_{self.table_name.lower()}__{name}" '
+                    f'ON "{self.table_name}" ("{name}")')
+            if self.table_name in TREE_TABLES:
+                create_closure_table(self._conn(), self.table_name)
+            if self.table_name in ROLLUP_TABLES:
+                create_rollup_table(self._conn(), self.table_name)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        with self.lock:
+            connection = self._conn()
+            RawSQLiteRepository.depth += 1
+            try:
+                yield
+            except BaseException:
+                if RawSQLiteRepository.depth == 1:
+                    connection.rollback()
+                raise
+            else:
+                if RawSQLiteRepository.depth == 1:
+                    connection.commit()
+            finally:
+                RawSQLiteRepository.depth -= 1
+
+    def _conn(self) -> sqlite3.Connection:
+        if self.connection is None:
+            raise RuntimeError('database is not bound, call bind_database first')
+        return self.connection
+
+    def _make_object(self, _: sqlite3.Cursor, row: tuple[Any, ...]) -> T:
+        """ Row factory building data_cls object from selected row """
+        if self.optional:
+            row_lst = list(row)
+            for i in self.optional:
+                if row_lst[i] == NONE_2_INT_CHANGER:
+                    row_lst[i] = None
+            row = tuple(row_lst)
+        obj: T = self.data_cls(*row)
+        return obj
+
+    def _query(self, sql: str, params: Iterable[Any] = ()) -> list[Any]:
+        """ Run select and build objects from rows """
+        with self.lock:
+            cursor = self._conn().cursor()
+            cursor.row_factory = self._make_object
+            return cursor.execute(sql, tuple(params)).fetchall()
+
+    def _values(self, obj: T) -> list[Any]:
+        """ Values of object fields converted to sqlite types """
+        return [py2sqlite_type_converter(getattr(obj, name))
+                for name in self.data_columns]
+
+    def _where(self, where: dict[str, Any] | None) -> tuple[str, list[Any]]:
+        """ Translate <where> dict into sql condition and its parameters """
+        clauses = []
+        params: list[Any] = []
+        for attr, condition in (where or {}).items():
+            if attr not in self.columns:
+                raise ValueError(f'unknown field <{attr}>')
+            operator, value = parse_condition(condition)
+            if operator in _OPERATORS:
+                clauses.append(f'"{attr}" {_OPERATORS[operator]} ?')
+                params.append(py2sqlite_type_converter(value))
+            elif operator == 'in':
+                values = [py2sqlite_type_converter(v) for v in value]
+                clauses.append(f'"{attr}" IN (' + ', '.join('?' for _ in values) + ')')
+                params.extend(values)
+            elif operator == 'between':
+                clauses.append(f'"{attr}" BETWEEN ? AND ?')
+                params.extend(py2sqlite_type_converter(v) for v in value)
+            elif operator == 'subtree':
+                clauses.append(f'"{attr}" IN (SELECT "descendant" FROM '
+                               f'"{TREE_TABLES["Category"]}" WHERE "ancestor" = ?)')
+                params.append(value)
+            else:
+                raise ValueError(f'unsupported operator <{operator}>')
+        if not clauses:
+            return '', params
+        return ' WHERE ' + ' AND '.join(clauses), params
+
+    def _order_by(self, order_by: str | list[str] | None) -> str:
+        if isinstance(order_by, str):
+            order_by = [order_by]
+        if not order_by:
+            return ''
+        terms = []
+        for field in order_by:
+            name = field.lstrip('-')
+            if name not in self.columns:
+                raise ValueError(f'unknown field <{name}>')
+            terms.append(f'"{name}" DESC' if field.startswith('-') else f'"{name}"')
+        return ' ORDER BY ' + ', '.join(terms)
+
+    def add(self, obj: T) -> int:
+        if getattr(obj, 'pk', None) != 0:
+            raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
+
+        with self.transaction():
+            cursor = self._conn().execute(self.sql_insert, self._values(obj))
+        obj.pk = cursor.lastrowid or 0
+        return obj.pk
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        objs = new_objects(objs)
+        with self.transaction():
+            # executemany does not report ids, the statement is prepared once anyway
+            pks = [self._conn().execute(self.sql_insert, self._values(obj)).lastrowid or 0
+                   for obj in objs]
+        for obj, pk in zip(objs, pks):
+            obj.pk = pk
+        return pks
+
+    def get(self, pk: int) -> T | None:
+        objs = self._query(self.sql_get, (pk,))
+        return objs[0] if objs else None
+
+    def get_many(self, pks: Iterable[int]) -> dict[int, T]:
+        pks = list(set(pks))
+        result = {}
+        for i in range(0, len(pks), BATCH_SIZE):
+            batch = pks[i:i + BATCH_SIZE]
+            where, params = self._where({'pk': ('in', batch)})
+            for obj in self._query(self.sql_select + where, params):
+                result[obj.pk] = obj
+        return result
+
+    def get_all(self, where: dict[str, Any] | None = None,
+                order_by: str | list[str] | None = None,
+                limit: int | None = None) -> list[T]:
+        sql, params = self._where(where)
+        sql = self.sql_select + sql + self._order_by(order_by)
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return self._query(sql, params)
+
+    def get_page(self, after_pk: int = 0, limit: int = 100,
+                 where: dict[str, Any] | None = None) -> list[T]:
+        # keyset pagination: sqlite seeks by primary key instead of skipping rows
+        sql, params = self._where(where)
+        sql += (' AND' if sql else ' WHERE') + ' "pk" > ?'
+        params.append(after_pk)
+        return self._query(self.sql_select + sql + ' ORDER BY "pk" LIMIT ?',
+                           params + [limit])
+
+    def get_ancestors(self, pk: int) -> list[T]:
+        if self.table_name not in TREE_TABLES:
+            return super().get_ancestors(pk)
+        return self._query(self.sql_ancestors, (pk,))
+
+    def get_descendants(self, pk: int) -> list[T]:
+        if self.table_name not in TREE_TABLES:
+            return super().get_descendants(pk)
+        return self._query(self.sql_descendants, (pk,))
+
+    def rollup(self, records: AbstractRepository[Any], field: str, ref_field: str,
+               where: dict[str, Any] | None = None) -> dict[int, Any]:
+        if (self.table_name not in TREE_TABLES
+                or not isinstance(records, RawSQLiteRepository)):
+            return super().rollup(records, field, ref_field, where)
+        for name in (field, ref_field):
+            if name not in records.columns:
+                raise ValueError(f'unknown field <{name}>')
+        sql, params = records._where(where)  # pylint: disable=protected-access
+        source = records.table_name
+        if source in ROLLUP_TABLES and covers('sum', field, where, ref_field):
+            source = ROLLUP_TABLES[source]
+        # records are summed per node first, then sums go up to all ancestors
+        # through closure table, every node is its own ancestor of depth 0
+        with self.lock:
+            return dict(self._conn().execute(
+                f'SELECT tree."ancestor", coalesce(sum(totals."total"), 0) '
+                f'FROM "{TREE_TABLES[self.table_name]}" AS tree LEFT JOIN ('
+                f'SELECT "{ref_field}" AS "node", sum("{field}") AS "total" '
+                f'FROM "{source}"{sql} GROUP BY "{ref_field}") AS totals '
+                f'ON totals."node" = tree."descendant" GROUP BY tree."ancestor"',
+                params).fetchall())
+
+    def update(self, obj: T) -> None:
+        if obj.pk == 0:
+            raise ValueError('attempt to update object with unknown primary key')
+
+        with self.transaction():
+            cursor = self._conn().execute(self.sql_update, self._values(obj) + [obj.pk])
+        if cursor.rowcount == 0:
+            raise KeyError(f'no object with pk={obj.pk}')
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        objs = list(objs)
+        if any(obj.pk == 0 for obj in objs):
+            raise ValueError('attempt to update object with unknown primary key')
+
+        with self.transaction():
+            cursor = self._conn().executemany(
+                self.sql_update, (self._values(obj) + [obj.pk] for obj in objs))
+            if cursor.rowcount != len(objs):  # the transaction is rolled back
+                found = self.get_many(obj.pk for obj in objs)
+                missing = next(obj.pk for obj in objs if obj.pk not in found)
+                raise KeyError(f'no object with pk={missing}')
+
+    def delete(self, pk: int) -> None:
+        with self.transaction():
+            self._conn().execute(self.sql_delete, (pk,))
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        pks = list(pks)
+        with self.transaction():
+            for i in range(0, len(pks), BATCH_SIZE):
+                where, params = self._where({'pk': ('in', pks[i:i + BATCH_SIZE])})
+                self._conn().execute(f'DELETE FROM "{self.table_name}"' + where, params)
+
+    def aggregate(self, func: str, field: str = 'pk',
+                  where: dict[str, Any] | None = None,
+                  group_by: str | None = None) -> Any:
+        if func not in _AGGREGATES:
+            raise ValueError(f'unsupported aggregate function <{func}>')
+        if field not in self.columns:
+            raise ValueError(f'unknown field <{field}>')
+        if group_by is not None and group_by not in self.columns:
+            raise ValueError(f'unknown field <{group_by}>')
+        expression = _AGGREGATES[func].format(f'"{field}"')
+        sql, params = self._where(where)
+        table = self.table_name
+        if table in ROLLUP_TABLES and covers(func, field, where, group_by):
+            # summary rows of days instead of rows, see daily_rollup
+            table = ROLLUP_TABLES[table]
+            if func == 'count':
+                expression = _AGGREGATES['sum'].format('"count"')
+
+        with self.lock:
+            if group_by is None:
+                return self._conn().execute(
+                    f'SELECT {expression} FROM "{table}"' + sql, params).fetchone()[0]
+            rows = self._conn().execute(
+                f'SELECT "{group_by}", {expression} FROM "{table}"'
+                + sql + f' GROUP BY "{group_by}"', params).fetchall()
+        if self.columns.index(group_by) in self.optional:
+            return {None if key == NONE_2_INT_CHANGER else key: value
+                    for key, value in rows}
+        return dict(rows)
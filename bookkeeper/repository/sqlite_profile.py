@@ -0,0 +1,94 @@
+"""
+Module with performance profiles of sqlite3 connections.
+Profile is a dict {pragma name: value} applied to every new connection.
+"""
+import sqlite3
+from os import path
+from typing import Any
+
+# pragmas which may be set by profile, in the order they are applied
+PRAGMAS = ('journal_mode', 'synchronous', 'cache_size', 'mmap_size',
+           'temp_store', 'busy_timeout')
+
+PROFILES: dict[str, dict[str, Any]] = {
+    # sqlite defaults: fsync on every commit. WAL mode is persistent in
+    # database file and leaving it needs exclusive access, so it is kept
+    'default': {
+        'synchronous': 'FULL',
+        'cache_size': -2000,
+        'mmap_size': 0,
+        'temp_store': 'DEFAULT',
+        'busy_timeout': 5000,  # timeout of sqlite3.connect
+    },
+    # many small transactions from GUI: WAL needs no fsync of the database
+    # file on commit and lets readers work while a write is in progress
+    'interactive': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -16000,  # negative is size in KiB
+        'mmap_size': 64 * 2**20,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,  # ms
+    },
+    # large imports in few transactions, durability of the last
+    # transactions is traded for speed in case of power loss
+    'bulk_import': {
+        'journal_mode': 'WAL',
+        'synchronous': 'OFF',
+        'cache_size': -200000,
+        'mmap_size': 256 * 2**20,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 30000,
+    },
+}
+
+_SYNCHRONOUS = {0: 'OFF', 1: 'NORMAL', 2: 'FULL', 3: 'EXTRA'}
+_TEMP_STORE = {0: 'DEFAULT', 1: 'FILE', 2: 'MEMORY'}
+
+
+def database_path(db_filename: str) -> str:
+    """
+    Get path of database file <db_filename> opened by repositories.
+    Relative file names are resolved against this module directory,
+    ':memory:' and absolute paths are kept.
+    """
+    if db_filename == ':memory:' or path.isabs(db_filename):
+        return db_filename
+    return path.join(path.dirname(path.abspath(__file__)), db_filename)
+
+
+def resolve_profile(profile: str | dict[str, Any] | None) -> dict[str, Any]:
+    """
+    Get pragmas of profile given by name from PROFILES or by dict of pragmas.
+    None means no pragmas: connection keeps what sqlite or database file has.
+    """
+    if profile is None:
+        return {}
+    if isinstance(profile, str):
+        if profile not in PROFILES:
+            raise ValueError(f'unknown sqlite profile <{profile}>')
+        return dict(PROFILES[profile])
+    for name, value in profile.items():
+        if name not in PRAGMAS:
+            raise ValueError(f'unsupported pragma <{name}>')
+        # values are put into sql text, so only numbers and words are allowed
+        if not isinstance(value, int) and not str(value).isalpha():
+            raise ValueError(f'bad value {value!r} of pragma <{name}>')
+    return dict(profile)
+
+
+def apply_pragmas(connection: sqlite3.Connection, pragmas: dict[str, Any]) -> None:
+    """ Set pragmas on connection """
+    for name in PRAGMAS:
+        if name in pragmas:
+            connection.execute(f'PRAGMA {name} = {pragmas[name]}').fetchall()
+
+
+def read_pragmas(connection: sqlite3.Connection) -> dict[str, Any]:
+    """ Get effective values of all PRAGMAS of connection """
+    values = {name: connection.execute(f'PRAGMA {name}').fetchone()[0]
+              for name in PRAGMAS}
+    values['journal_mode'] = values['journal_mode'].upper()
+    values['synchronous'] = _SYNCHRONOUS.get(values['synchronous'], values['synchronous'])
+    values['temp_store'] = _TEMP_STORE.get(values['temp_store'], values['temp_store'])
+    return values
@@ -2,15 +2,67 @@
 Module for repository working with sqlite3 database
 """
 
-from typing import Any
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable, Iterator
 from inspect import get_annotations
 
 from pony import orm
 
-from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from bookkeeper.repository.abstract_repository import (
+    AbstractRepository, T, new_objects, parse_condition
+)
 import bookkeeper.repository.databases as my_dbs
+from bookkeeper.repository.closure_table import TREE_TABLES, create_closure_table
+from bookkeeper.repository.daily_rollup import (
+    ROLLUP_TABLES, covers, create_rollup_table
+)
+from bookkeeper.repository.migrations import migrate, stamp_version
+from bookkeeper.repository.sqlite_profile import (
+    apply_pragmas, database_path, read_pragmas, resolve_profile
+)
 from bookkeeper.utils import py2sqlite_type_converter
 
+# max number of pks in one "in" condition, keeps below sqlite variables limit
+BATCH_SIZE = 500
+
+_AGGREGATES = {'sum': orm.sum, 'min': orm.min, 'max': orm.max}
+
+# pragmas of the current profile, set on every new pony connection
+_pragmas: dict[str, Any] = {}
+
+
+@my_dbs.db.on_connect(provider='sqlite')
+def _apply_profile(_: orm.Database, connection: Any) -> None:
+    apply_pragmas(connection, _pragmas)
+
+
+def _condition(attr: str, operator: str, value: Any) -> Callable[[Any], bool]:
+    """ Build pony lambda for one condition of <where> dict """
+    # pony translates every lambda below into sql, so each operator needs its own
+    if operator == '==':
+        return lambda p: getattr(p, attr) == value
+    if operator == '!=':
+        return lambda p: getattr(p, attr) != value
+    if operator == '<':
+        return lambda p: getattr(p, attr) < value
+    if operator == '<=':
+        return lambda p: getattr(p, attr) <= value
+    if operator == '>':
+        return lambda p: getattr(p, attr) > value
+    if operator == '>=':
+        return lambda p: getattr(p, attr) >= value
+    if operator == 'in':
+        values = [py2sqlite_type_converter(v) for v in value]
+        return lambda p: getattr(p, attr) in values
+    if operator == 'between':
+        low, high = (py2sqlite_type_converter(v) for v in value)
+        return lambda p: orm.between(getattr(p, attr), low, high)
+    if operator == 'subtree':
+        tree: Any = my_dbs.CategoryTree
+        return lambda p: getattr(p, attr) in orm.select(
+            t.descendant for t in tree if t.ancestor == value)
+    raise ValueError(f'unsupported operator <{operator}>')
+
 
 class SQLiteRepository(AbstractRepository[T]):
     """
@@ -23,31 +75,101 @@ class SQLiteRepository(AbstractRepository[T]):
         self.data_cls = data_cls
         self.data_cls_fields = get_annotations(self.data_cls, eval_str=True)
         self.data_cls_fields.pop('pk')
+        # closure table entity for tables with hierarchy, see closure_table
+        self.tree_cls = (getattr(my_dbs, TREE_TABLES[table_name])
+                         if table_name in TREE_TABLES else None)
+        # daily rollup entity for expenses, see daily_rollup
+        self.daily_cls = my_dbs.ExpenseDaily if table_name in ROLLUP_TABLES else None
 
     @staticmethod
-    def bind_database(db_filename: str = 'database.db') -> None:
-        """ Bind database to db in file <db_filename> """
+    def bind_database(db_filename: str = 'database.db',
+                      profile: str | dict[str, Any] | None = None) -> dict[str, Any]:
+        """
+        Bind database to db in file <db_filename>. Relative file names are
+        resolved against this module directory. Existing database file
+        is migrated to the current schema before binding, new one is
+        stamped with the current schema version. Pragmas of <profile>
+        (name from sqlite_profile.PROFILES or dict) are set on every
+        connection. Returns effective pragmas.
+        """
+        db_filename = database_path(db_filename)
+        migrate(db_filename)
+        _pragmas.clear()
+        _pragmas.update(resolve_profile(profile))
+
         my_dbs.db.bind(provider='sqlite',
                        filename=db_filename,
                        create_db=True)
 
         my_dbs.db.generate_mapping(create_tables=True)
+        with orm.db_session:
+            # pony creates closure and rollup tables, but not triggers filling them
+            for table_name in TREE_TABLES:
+                create_closure_table(my_dbs.db.get_connection(), table_name)
+            for table_name in ROLLUP_TABLES:
+                create_rollup_table(my_dbs.db.get_connection(), table_name)
+            stamp_version(my_dbs.db.get_connection())
+        return SQLiteRepository.get_pragmas()
+
+    @staticmethod
+    def set_profile(profile: str | dict[str, Any] | None) -> dict[str, Any]:
+        """
+        Switch bound database to <profile>. Connection of the calling thread
+        is reopened with new pragmas, connections of other threads keep their
+        pragmas until reopened. Must be called outside of db_session.
+        Returns effective pragmas.
+        """
+        pragmas = resolve_profile(profile)
+        _pragmas.clear()
+        _pragmas.update(pragmas)
+        # pony starts transaction on the connection it gives out, and some
+        # pragmas cannot be changed inside it, so on_connect sets them instead
+        my_dbs.db.disconnect()
+        return SQLiteRepository.get_pragmas()
+
+    @staticmethod
+    def get_pragmas() -> dict[str, Any]:
+        """ Effective pragmas of connection of the calling thread """
+        with orm.db_session:
+            return read_pragmas(my_dbs.db.get_connection())
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        # db_session of every method joins the outer one, which commits
+        # on exit or rolls back on exception
+        with orm.db_session:
+            yield
+
+    def _get_row(self, obj: T) -> dict[str, Any]:
+        """ Get values of object fields converted to sqlite types """
+        return {
+            f: py2sqlite_type_converter(getattr(obj, f))
+            for f in self.data_cls_fields.keys()
+        }
 
     @orm.db_session
     def add(self, obj: T) -> int:
         if getattr(obj, 'pk', None) != 0:
             raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
 
-        kwargs = {
-            f: py2sqlite_type_converter(getattr(obj, f))
-            for f in self.data_cls_fields.keys()
-        }
-        db_obj = self.table_cls(**kwargs)
-        orm.commit()
+        db_obj = self.table_cls(**self._get_row(obj))
+        orm.flush()  # pk is assigned, db_session commits on exit
 
         obj.pk = db_obj.pk
         return obj.pk
 
+    @orm.db_session
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        objs = new_objects(objs)
+
+        # all rows are inserted in one transaction
+        db_objs = [self.table_cls(**self._get_row(obj)) for obj in objs]
+        orm.flush()
+
+        for obj, db_obj in zip(objs, db_objs):
+            obj.pk = db_obj.pk
+        return [obj.pk for obj in objs]
+
     @orm.db_session
     def get(self, pk: int) -> T | None:
         try:
@@ -57,43 +179,119 @@ class SQLiteRepository(AbstractRepository[T]):
         except orm.ObjectNotFound:
             return None
 
+    @orm.db_session
+    def get_many(self, pks: Iterable[int]) -> dict[int, T]:
+        pks = list(set(pks))
+        result = {}
+        for i in range(0, len(pks), BATCH_SIZE):
+            batch = pks[i:i + BATCH_SIZE]
+            for db_obj in self.table_cls.select(lambda p: p.pk in batch):
+                result[db_obj.pk] = self.data_cls(**db_obj.get_data())
+        return result
+
     @orm.db_session
     def update(self, obj: T) -> None:
         if obj.pk == 0:
             raise ValueError('attempt to update object with unknown primary key')
 
-        db_obj = self.table_cls[obj.pk]
-
-        for field in self.data_cls_fields.keys():
-            setattr(db_obj, field, py2sqlite_type_converter(getattr(obj, field)))
+        try:
+            db_obj = self.table_cls[obj.pk]
+        except orm.ObjectNotFound:
+            raise KeyError(f'no object with pk={obj.pk}') from None
+        db_obj.set(**self._get_row(obj))
 
     @orm.db_session
-    def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
+    def update_many(self, objs: Iterable[T]) -> None:
+        objs = list(objs)
+        if any(obj.pk == 0 for obj in objs):
+            raise ValueError('attempt to update object with unknown primary key')
+
+        # load all rows at once, then pony takes them from its identity map
+        pks = [obj.pk for obj in objs]
+        for i in range(0, len(pks), BATCH_SIZE):
+            batch = pks[i:i + BATCH_SIZE]
+            self.table_cls.select(lambda p: p.pk in batch)[:]
+
+        for obj in objs:
+            try:
+                db_obj = self.table_cls[obj.pk]
+            except orm.ObjectNotFound:  # db_session rolls back the whole batch
+                raise KeyError(f'no object with pk={obj.pk}') from None
+            db_obj.set(**self._get_row(obj))
+
+    def _select(self, where: dict[str, Any] | None = None, query: Any = None) -> Any:
+        """
+        Build query with all conditions from <where> compiled into sql.
+        By default query selects whole rows, other query over the table
+        may be passed in <query>.
+        """
+        if query is None:
+            query = orm.select(p for p in self.table_cls)
+        for attr, condition in (where or {}).items():
+            operator, value = parse_condition(condition)
+            if operator not in ('in', 'between'):
+                value = py2sqlite_type_converter(value)
+            query = query.where(_condition(attr, operator, value))
+        return query
 
-        if where is None:  # return all objects from the table
-            db_objs_lst = orm.select(p for p in self.table_cls)[:]
+    @orm.db_session
+    def get_all(self, where: dict[str, Any] | None = None,
+                order_by: str | list[str] | None = None,
+                limit: int | None = None) -> list[T]:
+        query = self._select(where)
+        if isinstance(order_by, str):
+            order_by = [order_by]
+        if order_by:
+            columns = [getattr(self.table_cls, field.lstrip('-')) for field in order_by]
+            query = query.order_by(*(orm.desc(column) if field.startswith('-') else column
+                                     for field, column in zip(order_by, columns)))
+        db_objs_lst = query[:] if limit is None else query.limit(limit)
 
-            objs_lst = []
-            for db_obj in db_objs_lst:
-                objs_lst.append(self.data_cls(**db_obj.get_data()))
+        return [self.data_cls(**db_obj.get_data()) for db_obj in db_objs_lst]
 
-            return objs_lst
+    @orm.db_session
+    def get_page(self, after_pk: int = 0, limit: int = 100,
+                 where: dict[str, Any] | None = None) -> list[T]:
+        # keyset pagination: sqlite seeks by primary key instead of skipping rows
+        query = self._select(where).where(lambda p: p.pk > after_pk)
+        return [self.data_cls(**db_obj.get_data())
+                for db_obj in query.order_by(self.table_cls.pk).limit(limit)]
 
-        # return objects accroding to condition
-        attr1, value1 = list(where.items())[0]  # first condition
-        # can not put all conditions inside a query, so use at least one condition
-        db_objs_lst = orm.select(p for p in self.table_cls
-                                 if getattr(p, attr1) == value1)[:]
-        # apply all conditions
-        db_objs_lst = [p for p in db_objs_lst
-                       if all(getattr(p, attr) == value
-                              for (attr, value) in where.items())]
+    @orm.db_session
+    def get_ancestors(self, pk: int) -> list[T]:
+        if self.tree_cls is None:
+            return super().get_ancestors(pk)
+        tree_cls = self.tree_cls
+        query = orm.select((p, t.depth) for p in self.table_cls for t in tree_cls
+                           if t.descendant == pk and p.pk == t.ancestor and t.depth > 0)
+        return [self.data_cls(**db_obj.get_data()) for db_obj, _ in query.order_by(2)]
 
-        objs_lst = []
-        for db_obj in db_objs_lst:
-            objs_lst.append(self.data_cls(**db_obj.get_data()))
+    @orm.db_session
+    def get_descendants(self, pk: int) -> list[T]:
+        if self.tree_cls is None:
+            return super().get_descendants(pk)
+        tree_cls = self.tree_cls
+        query = orm.select((p, t.depth) for p in self.table_cls for t in tree_cls
+                           if t.ancestor == pk and p.pk == t.descendant and t.depth > 0)
+        return [self.data_cls(**db_obj.get_data()) for db_obj, _ in query.order_by(2)]
 
-        return objs_lst
+    @orm.db_session
+    def rollup(self, records: AbstractRepository[Any], field: str, ref_field: str,
+               where: dict[str, Any] | None = None) -> dict[int, Any]:
+        if self.tree_cls is None or not isinstance(records, SQLiteRepository):
+            return super().rollup(records, field, ref_field, where)
+        tree_cls = self.tree_cls
+        source = records.table_cls
+        if records.daily_cls is not None and covers('sum', field, where, ref_field):
+            source = records.daily_cls
+        # every node is its own ancestor of depth 0 in closure table, so
+        # records are summed into their node and all its ancestors at once
+        query = orm.select((t.ancestor, orm.sum(getattr(p, field)))
+                           for p in source for t in tree_cls
+                           if getattr(p, ref_field) == t.descendant)
+        query = records._select(where, query)  # pylint: disable=protected-access
+        totals = dict(query[:])
+        return {pk: totals.get(pk, 0) for pk in orm.select(p.pk for p in self.table_cls)}
 
     @orm.db_session
     def delete(self, pk: int) -> None:
@@ -101,3 +299,39 @@ class SQLiteRepository(AbstractRepository[T]):
             self.table_cls[pk].delete()
         except orm.ObjectNotFound:
             pass
+
+    @orm.db_session
+    def delete_many(self, pks: Iterable[int]) -> None:
+        pks = list(pks)
+        for i in range(0, len(pks), BATCH_SIZE):
+            batch = pks[i:i + BATCH_SIZE]
+            self.table_cls.select(lambda p: p.pk in batch).delete(bulk=True)
+
+    @orm.db_session
+    def aggregate(self, func: str, field: str = 'pk',
+                  where: dict[str, Any] | None = None,
+                  group_by: str | None = None) -> Any:
+        if func != 'count' and func not in _AGGREGATES:
+            raise ValueError(f'unsupported aggregate function <{func}>')
+        table_cls = self.table_cls
+        if self.daily_cls is not None and covers(func, field, where, group_by):
+            # summary rows of days instead of rows, see daily_rollup
+            table_cls = self.daily_cls
+            if func == 'count':
+                func, field = 'sum', 'count'
+
+        if group_by is None:
+            if func == 'count':
+                return self._select(where).count()
+            agg = _AGGREGATES[func]
+            return self._select(where, orm.select(
+                agg(getattr(p, field)) for p in table_cls)).get()
+
+        if func == 'count':
+            query = orm.select((getattr(p, group_by), orm.count(p))
+                               for p in table_cls)
+        else:
+            agg = _AGGREGATES[func]
+            query = orm.select((getattr(p, group_by), agg(getattr(p, field)))
+                               for p in table_cls)
+        return dict(self._select(where, query)[:])
@@ -2,8 +2,13 @@
 Вспомогательные функции
 """
 
+import importlib
+from datetime import date, datetime, timedelta
 from typing import Iterable, Iterator, Any
 
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+
 
 def _get_indent(line: str) -> int:
     return len(line) - len(line.lstrip())
@@ -16,11 +21,12 @@ def _lines_with_indent(lines: Iterable[str]) -> Iterator[tuple[int, str]]:
         yield _get_indent(line), line.strip()
 
 
-def read_tree(lines: Iterable[str]) -> list[tuple[str, str | None]]:
+def read_tree(lines: Iterable[str]) -> Iterator[tuple[str, str | None]]:
     """
-    Прочитать структуру дерева из текста на основе отступов. Вернуть список
-    пар "потомок-родитель" в порядке топологической сортировки. Родитель
-    элемента верхнего уровня - None.
+    Прочитать структуру дерева из текста на основе отступов. Выдавать пары
+    "потомок-родитель" в порядке топологической сортировки по мере чтения
+    строк, в памяти хранится только цепочка родителей текущей строки.
+    Родитель элемента верхнего уровня - None.
 
     Пример. Следующий текст:
     parent
@@ -32,20 +38,20 @@ def read_tree(lines: Iterable[str]) -> list[tuple[str, str | None]]:
     [('parent', None), ('child1', 'parent'),
      ('child2', 'child1'), ('child3', 'parent')]
 
-    Пустые строки игнорируются.
+    Пустые строки игнорируются. При несогласованном отступе выбрасывается
+    IndentationError, пары до ошибочной строки к этому моменту уже выданы.
 
     Parameters
     ----------
     lines - Итерируемый объект, содержащий строки текста (файл или список строк)
 
-    Returns
+    Yields
     -------
-    Список пар "потомок-родитель"
+    Пары "потомок-родитель"
     """
     parents: list[tuple[str | None, int]] = []
     last_indent = -1
     last_name = None
-    result: list[tuple[str, str | None]] = []
     for i, (indent, name) in enumerate(_lines_with_indent(lines)):
         if indent > last_indent:
             parents.append((last_name, last_indent))
@@ -57,10 +63,9 @@ def read_tree(lines: Iterable[str]) -> list[tuple[str, str | None]]:
                     f'unindent does not match any outer indentation '
                     f'level in line {i}:\n'
                 )
-        result.append((name, parents[-1][0]))
+        yield name, parents[-1][0]
         last_name = name
         last_indent = indent
-    return result
 
 
 NONE_2_INT_CHANGER = -1000
@@ -74,3 +79,66 @@ def py2sqlite_type_converter(smth: Any) -> Any:
         return smth
 
     return str(smth)
+
+
+DISPLAY_DATE_FORMAT = '%d-%m-%Y'
+
+
+def iso2display_date(iso_date: str) -> str:
+    """ Convert stored ISO-8601 date 'yyyy-mm-dd' to 'dd-mm-yyyy' used in view """
+    return date.fromisoformat(iso_date).strftime(DISPLAY_DATE_FORMAT)
+
+
+def display2iso_date(display_date: str) -> str:
+    """ Convert 'dd-mm-yyyy' date from view to ISO-8601 'yyyy-mm-dd' for storage """
+    return datetime.strptime(display_date, DISPLAY_DATE_FORMAT).date().isoformat()
+
+
+def optional_module(name: str) -> Any:
+    """
+    Импортировать необязательную зависимость (например, numpy),
+    вернуть None, если она не установлена
+    """
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+PAGE_SIZE = 1000  # записей, читаемых из репозитория за один запрос
+
+
+def date_range(start: str | None = None, end: str | None = None) -> dict[str, Any]:
+    """ Условие where для расходов с датами от start до end включительно """
+    if start is not None and end is not None:
+        return {'expense_date': ('between', (start, end))}
+    if start is not None:
+        return {'expense_date': ('>=', start)}
+    if end is not None:
+        return {'expense_date': ('<=', end)}
+    return {}
+
+
+def expense_pages(exp_repo: AbstractRepository[Expense], start: str | None = None,
+                  end: str | None = None,
+                  page_size: int = PAGE_SIZE) -> Iterator[list[Expense]]:
+    """
+    Страницы расходов в порядке (expense_date, pk). Следующая страница
+    начинается после последнего выданного расхода: сначала остаток его
+    даты, затем следующие даты. Оба запроса - поиск по индексу дат
+    без сортировки, в отличие от страниц по pk с отбором по датам.
+    """
+    order = ['expense_date', 'pk']
+    page = exp_repo.get_all(date_range(start, end) or None, order, page_size)
+    while page:
+        yield page
+        if len(page) < page_size:
+            return
+        last = page[-1]
+        page = exp_repo.get_all({'expense_date': last.expense_date,
+                                 'pk': ('>', last.pk)}, order, page_size)
+        if len(page) < page_size:
+            next_day = (date.fromisoformat(last.expense_date[:10])
+                        + timedelta(days=1)).isoformat()
+            page += exp_repo.get_all(date_range(next_day, end), order,
+                                     page_size - len(page))
@@ -2,7 +2,9 @@
 import itertools
 from typing import Callable
 
-from PySide6 import QtWidgets, QtCore
+from PySide6 import QtWidgets, QtGui, QtCore
+
+OVERSPENT_COLOR = QtGui.QColor(255, 200, 200)  # background of overspent budget rows
 
 
 class BudgetWidget(QtWidgets.QWidget):
@@ -51,17 +53,19 @@ class BudgetWidget(QtWidgets.QWidget):
 
     def set_data(self, user_data: list[list[str]]) -> None:
         """
-        TODO: data format!!!
         Set user data to be displayed.
+        Row is [pk, period, spent, limit, rest, overspent].
         The first element in each row is considered as a primary
         and is not displayed.
         Primary key is used in callbacks.
+        Rows with non-empty overspent flag are highlighted.
         """
         self.user_data = user_data
         self.table.setRowCount(len(self.user_data))
 
         n_cols = self.table.columnCount()
         n_rows = self.table.rowCount()
+        overspent = [len(data) > 5 and data[5] != '' for data in self.user_data]
 
         for row, col in itertools.product(range(n_rows), range(n_cols)):
             item = QtWidgets.QTableWidgetItem(self.user_data[row][col+1])
@@ -74,6 +78,9 @@ class BudgetWidget(QtWidgets.QWidget):
                 item.setFlags(
                     QtCore.Qt.ItemFlag.ItemIsSelectable |
                     QtCore.Qt.ItemFlag.ItemIsEnabled)
+            if overspent[row]:
+                item.setBackground(OVERSPENT_COLOR)
+                item.setToolTip('Лимит превышен')
             self.table.setItem(row, col, item)
 
         # self.table.resizeRowsToContents()
@@ -1,4 +1,3 @@
-import itertools
 from functools import partial
 
 from PySide6 import QtWidgets, QtGui, QtCore
@@ -116,9 +115,125 @@ class InputExpenseWindow(QtWidgets.QDialog):
             dlg.exec()
 
 
+class ExpenseTableModel(QtCore.QAbstractTableModel):
+    """
+    Model of expense table. Rows are lists of strings, the first element
+    is a primary key and is not displayed. Cells are produced in data() only
+    for rows the view asks for. If fetch callback is registered, the model
+    asks it for next rows when the view is scrolled to the end. The callback
+    may return None and pass the rows later to append_rows.
+    """
+    headers = ['Дата покупки', 'Сумма, руб.', 'Категория', 'Комментарий']
+    fetch_batch = 200
+
+    def __init__(self, parent: QtCore.QObject | None = None):
+        super().__init__(parent)
+        self.user_data: list[list[str]] = []
+        self.fetch_callback: Callable[[int], list[list[str]] | None] | None = None
+        self.all_fetched = True
+        self.fetching = False  # rows are requested and not received yet
+
+    def set_data(self, user_data: list[list[str]]) -> None:
+        """ Replace all rows """
+        self.beginResetModel()
+        self.user_data = user_data
+        self.all_fetched = self.fetch_callback is None
+        self.fetching = False
+        self.endResetModel()
+
+    def register_fetch_callback(
+            self, callback: Callable[[int], list[list[str]] | None]) -> None:
+        """ Register callback returning up to <n> next rows """
+        self.fetch_callback = callback
+        self.all_fetched = False
+
+    def find_row(self, pk: str) -> int | None:
+        """ Position of row with primary key pk, None if it is not loaded """
+        for position, row in enumerate(self.user_data):
+            if row[0] == pk:
+                return position
+        return None
+
+    def insert_row(self, position: int, row: list[str]) -> None:
+        """ Insert one row before position, other rows are kept """
+        position = min(max(position, 0), len(self.user_data))
+        self.beginInsertRows(QtCore.QModelIndex(), position, position)
+        self.user_data.insert(position, row)
+        self.endInsertRows()
+
+    def update_row(self, row: list[str]) -> None:
+        """ Replace loaded row having the same primary key, repaint only it """
+        position = self.find_row(row[0])
+        if position is None:
+            return
+        self.user_data[position] = row
+        self.dataChanged.emit(self.index(position, 0),
+                              self.index(position, len(self.headers) - 1))
+
+    def remove_rows(self, pks: list[str]) -> None:
+        """ Remove loaded rows with given primary keys """
+        pks_set = set(pks)
+        positions = [i for i, row in enumerate(self.user_data) if row[0] in pks_set]
+        for position in reversed(positions):
+            self.beginRemoveRows(QtCore.QModelIndex(), position, position)
+            del self.user_data[position]
+            self.endRemoveRows()
+
+    def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.user_data)
+
+    def columnCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index: QtCore.QModelIndex,
+             role: int = QtCore.Qt.ItemDataRole.DisplayRole) -> str | None:
+        if role == QtCore.Qt.ItemDataRole.DisplayRole and index.isValid():
+            return self.user_data[index.row()][index.column() + 1]
+        return None
+
+    def headerData(self, section: int, orientation: QtCore.Qt.Orientation,
+                   role: int = QtCore.Qt.ItemDataRole.DisplayRole) -> str | None:
+        if (role == QtCore.Qt.ItemDataRole.DisplayRole
+                and orientation == QtCore.Qt.Orientation.Horizontal):
+            return self.headers[section]
+        return None
+
+    def flags(self, index: QtCore.QModelIndex) -> QtCore.Qt.ItemFlag:
+        return QtCore.Qt.ItemFlag.ItemIsSelectable | QtCore.Qt.ItemFlag.ItemIsEnabled
+
+    def canFetchMore(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> bool:
+        return not parent.isValid() and not self.all_fetched and not self.fetching
+
+    def fetchMore(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> None:
+        if self.fetch_callback is None or parent.isValid():
+            return
+        self.fetching = True
+        try:
+            rows = self.fetch_callback(self.fetch_batch)
+        except BaseException:
+            self.fetching = False
+            raise
+        if rows is not None:
+            self.append_rows(rows)
+
+    def fetch_failed(self) -> None:
+        """ Requested rows will not come, allow to request them again """
+        self.fetching = False
+
+    def append_rows(self, rows: list[list[str]]) -> None:
+        """ Add fetched rows to the end, fewer rows than requested mean end of data """
+        self.fetching = False
+        if len(rows) < self.fetch_batch:
+            self.all_fetched = True
+        if rows:
+            first = len(self.user_data)
+            self.beginInsertRows(QtCore.QModelIndex(), first, first + len(rows) - 1)
+            self.user_data.extend(rows)
+            self.endInsertRows()
+
+
 class MainTableWidget(QtWidgets.QWidget):
     """ Main widget for displaying expense table"""
-    user_data = list[list[str]]
     update_callback: Callable[[str, dict[str, str]], None]
     remove_callback: Callable[[list[str]], None]
     add_callback: Callable[[dict[str, str]], None]
@@ -127,7 +242,9 @@ class MainTableWidget(QtWidgets.QWidget):
     def __init__(self, parent: QtWidgets.QWidget | None = None):
         super().__init__(parent=parent)
 
-        self.table = QtWidgets.QTableWidget()
+        self.model = ExpenseTableModel(self)
+        self.table = QtWidgets.QTableView()
+        self.table.setModel(self.model)
         self.set_up_table()
         self.input_win = None
 
@@ -160,9 +277,17 @@ class MainTableWidget(QtWidgets.QWidget):
 
         self.setLayout(h_layout)
 
+    @property
+    def user_data(self) -> list[list[str]]:
+        """ Rows loaded into the table """
+        return self.model.user_data
+
+    def _selected_rows(self) -> list[int]:
+        """ Rows with at least one selected cell """
+        return sorted({i.row() for i in self.table.selectionModel().selectedIndexes()})
+
     def _on_clicked_upd_button(self) -> None:
-        idx = self.table.selectedItems()
-        rows = list(set([i.row() for i in idx]))
+        rows = self._selected_rows()
 
         msg_dict = {
             'window_title': 'Редактировать запись',
@@ -219,8 +344,8 @@ class MainTableWidget(QtWidgets.QWidget):
         self.input_win.show()
 
     def _on_clicked_del_button(self) -> None:
-        idx = self.table.selectedItems()
-        if len(idx) == 0:
+        rows = self._selected_rows()
+        if len(rows) == 0:
             dlg = QtWidgets.QMessageBox(
                 parent=self,
                 icon=QtWidgets.QMessageBox.Information,
@@ -241,7 +366,6 @@ class MainTableWidget(QtWidgets.QWidget):
             answer = dlg.exec()
 
             if answer == QtWidgets.QMessageBox.Yes:
-                rows = set([i.row() for i in idx])
                 pks = [self.user_data[i][0] for i in rows]
                 self.remove_callback(pks)
 
@@ -257,6 +381,20 @@ class MainTableWidget(QtWidgets.QWidget):
     def set_categories(self, cat_data: list[str]) -> None:
         self.cat_data = cat_data
 
+    def register_fetch_callback(
+            self, callback: Callable[[int], list[list[str]] | None]) -> None:
+        """ Register callback giving next rows when table is scrolled to the end.
+        If it returns None, the rows are expected in append_rows."""
+        self.model.register_fetch_callback(callback)
+
+    def append_rows(self, rows: list[list[str]]) -> None:
+        """ Add rows requested by fetch callback to the end of the table """
+        self.model.append_rows(rows)
+
+    def fetch_failed(self) -> None:
+        """ Rows requested by fetch callback will not come """
+        self.model.fetch_failed()
+
     def set_data(self, user_data: list[list[str]]) -> None:
         """
         Set user data to be displayed.
@@ -264,26 +402,22 @@ class MainTableWidget(QtWidgets.QWidget):
         and is not displayed.
         Primary key is used in callbacks.
         """
-        self.user_data = user_data
-        self.table.setRowCount(len(self.user_data))
+        self.model.set_data(user_data)
 
-        n_cols = self.table.columnCount()
-        n_rows = self.table.rowCount()
+    def insert_row(self, position: int, row: list[str]) -> None:
+        """ Insert one row before position without reloading the table """
+        self.model.insert_row(position, row)
 
-        for row, col in itertools.product(range(n_rows), range(n_cols)):
-            item = QtWidgets.QTableWidgetItem(self.user_data[row][col+1])
-            item.setFlags(
-                QtCore.Qt.ItemFlag.ItemIsSelectable |
-                QtCore.Qt.ItemFlag.ItemIsEnabled)
+    def update_row(self, row: list[str]) -> None:
+        """ Replace the row with the same primary key (the first element) """
+        self.model.update_row(row)
 
-            self.table.setItem(row, col, item)
+    def remove_rows(self, pks: list[str]) -> None:
+        """ Remove rows with given primary keys """
+        self.model.remove_rows(pks)
 
     def set_up_table(self) -> None:
-        my_headers = ['Дата покупки', 'Сумма, руб.', 'Категория', 'Комментарий']
-        self.table.setColumnCount(len(my_headers))
-        self.table.setHorizontalHeaderLabels(my_headers)
-
         header = self.table.horizontalHeader()
         header.setSectionResizeMode(QtWidgets.QHeaderView.ResizeMode.ResizeToContents)
         header.setSectionResizeMode(
-            len(my_headers)-1, QtWidgets.QHeaderView.ResizeMode.Stretch)
+            len(self.model.headers)-1, QtWidgets.QHeaderView.ResizeMode.Stretch)
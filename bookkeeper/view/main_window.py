@@ -17,6 +17,21 @@ class MainWindow(QtWidgets.QMainWindow):
         self.widget.setLayout(self.my_layout)
         self.setCentralWidget(self.widget)
 
+        # busy indicator shown while data is loaded in background
+        self.loading_bar = QtWidgets.QProgressBar()
+        self.loading_bar.setRange(0, 0)
+        self.loading_bar.setMaximumWidth(150)
+        self.loading_bar.hide()
+        self.statusBar().addPermanentWidget(self.loading_bar)
+
+    def set_loading(self, loading: bool) -> None:
+        """ Show or hide loading indicator"""
+        self.loading_bar.setVisible(loading)
+        if loading:
+            self.statusBar().showMessage('Загрузка...')
+        else:
+            self.statusBar().clearMessage()
+
     def set_widgets(self,
                     exp_wgt: QtWidgets.QWidget,
                     cat_wgt: QtWidgets.QWidget,
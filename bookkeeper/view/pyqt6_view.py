@@ -1,10 +1,13 @@
 """ GUI based on PyQt Library"""
-from typing import Callable
+from typing import Any, Callable
+
+from PySide6 import QtWidgets
 
 from bookkeeper.view.expense_table_view import MainTableWidget
 from bookkeeper.view.categories_view import MainCategoryWidget
 from bookkeeper.view.main_window import MainWindow
 from bookkeeper.view.budget_table_view import BudgetWidget
+from bookkeeper.view.task_runner import TaskRunner
 
 
 class PyQtView():
@@ -19,9 +22,29 @@ class PyQtView():
 
         self.window.set_widgets(self.expense_view, self.category_view, self.budget_view)
 
+        self.task_runner = TaskRunner(self.window)
+        self.task_runner.busy_changed.connect(self.window.set_loading)
+        self.task_runner.failed.connect(self.show_error)
+
+    def run_task(self, task: Callable[[], Any],
+                 on_done: Callable[[Any], None] | None = None,
+                 key: str | None = None, supersede: bool = False,
+                 on_error: Callable[[Exception], None] | None = None) -> None:
+        """ Run task in background thread and pass its result to on_done
+        in GUI thread. Loading indicator is shown while tasks are running.
+        A task with supersede=True cancels earlier tasks with the same key:
+        their results are not passed to on_done. If the task fails, the error
+        is shown to user and passed to on_error."""
+        self.task_runner.run(task, on_done, key, supersede, on_error)
+
+    def show_error(self, error: Exception) -> None:
+        """ Show error of a background task to user"""
+        QtWidgets.QMessageBox.critical(self.window, 'Ошибка', str(error))
+
     def set_budget_data(self, user_data: list[list[str]]) -> None:
         """Set user data to be displayed. The first element in each row is considered
-        as a primary and is not displayed. Primary key is used in callbacks."""
+        as a primary and is not displayed. Primary key is used in callbacks.
+        Rows with non-empty last element (overspent flag) are highlighted."""
         self.budget_view.set_data(user_data)
 
     def register_budget_update_callback(self, callback: Callable[[str, str], None]) -> None:
@@ -33,6 +56,36 @@ class PyQtView():
         as a primary and is not displayed. Primary key is used in callbacks."""
         self.expense_view.set_data(user_data)
 
+    def insert_expense_row(self, position: int, row: list[str]) -> None:
+        """ Insert one expense row (format as in set_expense_data) before
+        position, rows already displayed are kept"""
+        self.expense_view.insert_row(position, row)
+
+    def update_expense_row(self, row: list[str]) -> None:
+        """ Replace displayed expense row with the same primary key.
+        Nothing happens if the row is not loaded into table."""
+        self.expense_view.update_row(row)
+
+    def remove_expense_rows(self, pks: list[str]) -> None:
+        """ Remove displayed expense rows with given primary keys"""
+        self.expense_view.remove_rows(pks)
+
+    def append_expense_rows(self, rows: list[list[str]]) -> None:
+        """ Add expense rows requested by fetch callback to the end of the table"""
+        self.expense_view.append_rows(rows)
+
+    def expense_fetch_failed(self, error: Exception) -> None:
+        """ Expense rows requested by fetch callback will not come,
+        they are requested again when table is scrolled to the end"""
+        self.expense_view.fetch_failed()
+
+    def register_expense_fetch_callback(
+            self, callback: Callable[[int], list[list[str]] | None]) -> None:
+        """ Register callback returning next <n> expense rows when table is scrolled
+        to the end. Rows have the same format as in set_expense_data. If the callback
+        returns None, the rows are expected later in append_expense_rows."""
+        self.expense_view.register_fetch_callback(callback)
+
     def set_category_data(self, data: list[list[str]]) -> None:
         """ Data format: [['pk1', 'cat1'], ['pk2', 'cat2']]. The first element
         is considered as a primary key and used in callbacks"""
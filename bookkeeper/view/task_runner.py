@@ -0,0 +1,96 @@
+""" Running presenter tasks off the GUI thread"""
+from typing import Any, Callable
+
+from PySide6 import QtCore
+
+
+class _Task(QtCore.QRunnable):
+    """ Task executed by thread pool, the result is posted back by runner signal"""
+
+    def __init__(self, runner: 'TaskRunner', task_id: int, task: Callable[[], Any]):
+        super().__init__()
+        self.runner = runner
+        self.task_id = task_id
+        self.task = task
+
+    def run(self) -> None:
+        result, error = None, None
+        if not self.runner.is_skipped(self.task_id):
+            try:
+                result = self.task()
+            except Exception as err:  # pylint: disable=broad-except
+                error = err
+        self.runner.finished.emit(self.task_id, result, error)
+
+
+class TaskRunner(QtCore.QObject):
+    """
+    Runs tasks one by one in a background thread and calls their callbacks
+    in the GUI thread in the order the tasks were submitted.
+    Tasks submitted with the same key form a group, a task submitted with
+    supersede=True makes earlier tasks of its group stale: their results
+    are dropped, and earlier superseding tasks are skipped if they
+    have not started yet.
+    Signal busy_changed reports if there are unfinished tasks, signal failed
+    passes exceptions raised by tasks. Then on_error callback of the task
+    gets the exception instead of on_done, if the task is not stale.
+    """
+    finished = QtCore.Signal(int, object, object)
+    busy_changed = QtCore.Signal(bool)
+    failed = QtCore.Signal(object)
+
+    def __init__(self, parent: QtCore.QObject | None = None):
+        super().__init__(parent)
+        self.pool = QtCore.QThreadPool(self)
+        # one thread keeps repository calls in submission order
+        self.pool.setMaxThreadCount(1)
+        self.generations: dict[str, int] = {}
+        # task id -> (key, generation, supersede, callback, error callback)
+        self.pending: dict[int, tuple[str | None, int, bool,
+                                      Callable[[Any], None] | None,
+                                      Callable[[Exception], None] | None]] = {}
+        self.last_id = 0
+        self.finished.connect(self._on_finished)
+
+    def run(self, task: Callable[[], Any],
+            on_done: Callable[[Any], None] | None = None,
+            key: str | None = None, supersede: bool = False,
+            on_error: Callable[[Exception], None] | None = None) -> None:
+        """ Run task in background thread, pass its result to on_done
+        or its exception to on_error in GUI thread"""
+        generation = 0
+        if key is not None:
+            generation = self.generations.get(key, 0) + supersede
+            self.generations[key] = generation
+        self.last_id += 1
+        self.pending[self.last_id] = (key, generation, supersede, on_done, on_error)
+        if len(self.pending) == 1:
+            self.busy_changed.emit(True)
+        self.pool.start(_Task(self, self.last_id, task))
+
+    def is_stale(self, task_id: int) -> bool:
+        """ Check if a newer superseding task of the same group was submitted"""
+        key, generation = self.pending[task_id][:2]
+        return key is not None and self.generations.get(key, 0) != generation
+
+    def is_skipped(self, task_id: int) -> bool:
+        """ Stale superseding tasks are not run at all"""
+        return self.pending[task_id][2] and self.is_stale(task_id)
+
+    def wait(self) -> None:
+        """ Block until all submitted tasks are finished"""
+        self.pool.waitForDone()
+
+    def _on_finished(self, task_id: int, result: Any, error: Exception | None) -> None:
+        stale = self.is_stale(task_id)
+        _, _, _, on_done, on_error = self.pending.pop(task_id)
+        if not self.pending:
+            self.busy_changed.emit(False)
+        if error is not None:
+            # raising in a slot would end up in Qt event loop, not in the caller
+            if on_error is not None and not stale:
+                on_error(error)
+            self.failed.emit(error)
+            return
+        if on_done is not None and not stale:
+            on_done(result)
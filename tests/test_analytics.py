@@ -0,0 +1,92 @@
+import pytest
+
+from bookkeeper import analytics
+from bookkeeper.analytics import (budget_utilization, category_series, category_totals,
+                                  load_columns, moving_average, period_labels, totals)
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.columnar_repository import ColumnarExpenseRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+
+
+@pytest.fixture(params=['array', 'numpy'])
+def use_numpy(request, monkeypatch):
+    if request.param == 'array':
+        monkeypatch.setattr(analytics, 'np', None)
+    elif analytics.np is None:
+        pytest.skip('numpy is not installed')
+
+
+EXPENSES = [(10., 1, '2023-02-27'), (20., 2, '2023-03-01'), (30., 1, '2023-03-01'),
+            (40., None, '2023-03-06'), (50., 2, '2023-04-02')]
+
+
+@pytest.fixture(params=[MemoryRepository, ColumnarExpenseRepository])
+def columns(request, use_numpy):
+    repo = request.param()
+    repo.add_many([Expense(amount, category, day) for amount, category, day in EXPENSES])
+    return load_columns(repo)
+
+
+def test_period_labels():
+    assert period_labels('day', '2023-02-27', '2023-03-01') == \
+        ['2023-02-27', '2023-02-28', '2023-03-01']
+    assert period_labels('week', '2023-03-01', '2023-03-13') == \
+        ['2023-02-27', '2023-03-06', '2023-03-13']
+    assert period_labels('month', '2022-12-31', '2023-02-01') == \
+        ['2022-12', '2023-01', '2023-02']
+    with pytest.raises(ValueError):
+        period_labels('year', '2023-01-01', '2023-01-01')
+
+
+def test_totals(columns):
+    days = totals(columns, 'day', '2023-02-28', '2023-03-02')
+    assert days.as_dict() == {'2023-02-28': 0., '2023-03-01': 50., '2023-03-02': 0.}
+    assert totals(columns, 'week').as_dict() == {
+        '2023-02-27': 60., '2023-03-06': 40., '2023-03-13': 0., '2023-03-20': 0.,
+        '2023-03-27': 50.}
+    assert totals(columns, 'month').as_dict() == \
+        {'2023-02': 10., '2023-03': 90., '2023-04': 50.}
+    assert totals(columns, 'month', end='2023-03-01').values == [10., 50.]
+
+
+def test_categories(columns):
+    assert category_totals(columns) == {2: 70., None: 40., 1: 40.}
+    assert next(iter(category_totals(columns))) == 2  # the largest total first
+    assert category_totals(columns, '2023-03-02', '2023-03-31') == {None: 40.}
+    series = category_series(columns, 'month')
+    assert {key: s.values for key, s in series.items()} == \
+        {1: [10., 30., 0.], 2: [0., 20., 50.], None: [0., 40., 0.]}
+    assert series[1].labels == ['2023-02', '2023-03', '2023-04']
+
+
+def test_moving_average_and_budget(columns):
+    days = totals(columns, 'day', '2023-02-27', '2023-03-02')
+    average = moving_average(days, 2)
+    assert average.labels == ['2023-02-28', '2023-03-01', '2023-03-02']
+    assert average.values == pytest.approx([5., 25., 25.])
+    assert moving_average(days, 10).values == []
+    with pytest.raises(ValueError):
+        moving_average(days, 0)
+    usage = budget_utilization(columns, Budget('Месяц', limit=100.), '2023-03-01')
+    assert usage.as_dict() == {'2023-03': 0.9, '2023-04': 0.5}
+    usage = budget_utilization(columns, Budget('Неделя'), '2023-03-06', '2023-03-19')
+    assert usage.values == [float('inf'), 0.]
+    with pytest.raises(ValueError):
+        budget_utilization(columns, Budget('Окно', days=7))
+
+
+def test_category_budget(columns):
+    budget = Budget('Месяц', limit=100., category=1)
+    assert budget_utilization(columns, budget).as_dict() == \
+        {'2023-02': 0.1, '2023-03': 0.3, '2023-04': 0.}
+    usage = budget_utilization(columns, budget, '2023-03-01', '2023-04-30',
+                               subtrees={1: {1, 2}})
+    assert usage.values == [0.5, 0.5]
+
+
+def test_empty(use_numpy):
+    columns = load_columns(MemoryRepository[Expense]())
+    assert totals(columns).values == []
+    assert category_totals(columns) == {}
+    assert totals(columns, 'week', '2023-03-01', '2023-03-07').values == [0., 0.]
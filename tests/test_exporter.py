@@ -0,0 +1,69 @@
+import gzip
+import io
+import json
+
+import pytest
+
+from bookkeeper.exporter import (EXPENSE_FIELDS, CATEGORY_FIELDS, category_records,
+                                 expense_records, open_output, write_records)
+from bookkeeper.importer import import_csv
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.memory_repository import MemoryRepository
+
+
+@pytest.fixture
+def cat_repo():
+    repo = MemoryRepository[Category]()
+    repo.add(Category('Продукты'))
+    repo.add(Category('Транспорт'))
+    return repo
+
+
+@pytest.fixture
+def exp_repo():
+    repo = MemoryRepository[Expense]()
+    for day, amount in [('2023-03-02', 1.), ('2023-03-01', 2.), ('2023-03-02', 3.),
+                        ('2023-03-03', 4.), ('2023-03-02', 5.), ('2023-03-05', 6.)]:
+        repo.add(Expense(amount, 1 + int(amount) % 2, day, '2023-03-06 10:00',
+                         f'расход {amount:g}'))
+    return repo
+
+
+def test_expense_records_order_and_range(cat_repo, exp_repo):
+    # страницы по 2 расхода: остаток даты переходит на следующую страницу
+    records = list(expense_records(exp_repo, cat_repo, page_size=2))
+    assert [(r['date'], r['amount']) for r in records] == [
+        ('2023-03-01', 2.), ('2023-03-02', 1.), ('2023-03-02', 3.),
+        ('2023-03-02', 5.), ('2023-03-03', 4.), ('2023-03-05', 6.)]
+    assert records[0]['category'] == 'Продукты'
+    assert records[1]['category'] == 'Транспорт'
+    records = list(expense_records(exp_repo, cat_repo, '2023-03-02', '2023-03-03', 1))
+    assert [r['amount'] for r in records] == [1., 3., 5., 4.]
+    assert list(expense_records(exp_repo, cat_repo, start='2023-03-06')) == []
+
+
+def test_write_csv_round_trip(cat_repo, exp_repo):
+    file = io.StringIO()
+    assert write_records(file, expense_records(exp_repo, cat_repo), EXPENSE_FIELDS) == 6
+    copy = MemoryRepository[Expense]()
+    file.seek(0)
+    stats = import_csv(file, cat_repo, copy)
+    assert (stats.imported, stats.skipped) == (6, 0)
+    assert sorted((e.expense_date, e.amount, e.category, e.comment)
+                  for e in copy.get_all()) == \
+        sorted((e.expense_date, e.amount, e.category, e.comment)
+               for e in exp_repo.get_all())
+
+
+def test_write_jsonl_gzip(tmp_path, cat_repo):
+    filename = str(tmp_path / 'categories.jsonl.gz')
+    with open_output(filename) as file:
+        assert write_records(file, category_records(cat_repo), CATEGORY_FIELDS,
+                             'jsonl') == 2
+    with gzip.open(filename, 'rt', encoding='utf-8') as file:
+        assert [json.loads(line) for line in file] == [
+            {'pk': 1, 'name': 'Продукты', 'parent': None},
+            {'pk': 2, 'name': 'Транспорт', 'parent': None}]
+    with pytest.raises(ValueError):
+        write_records(io.StringIO(), [], CATEGORY_FIELDS, 'xml')
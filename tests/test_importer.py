@@ -0,0 +1,95 @@
+import io
+
+import pytest
+
+from bookkeeper.importer import DateParser, import_csv
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.memory_repository import MemoryRepository
+
+
+@pytest.fixture
+def cat_repo():
+    repo = MemoryRepository[Category]()
+    repo.add(Category('Продукты'))
+    return repo
+
+
+@pytest.fixture
+def exp_repo():
+    return MemoryRepository[Expense]()
+
+
+STATEMENT = '''Дата;Сумма;Категория;Описание
+01.03.2023;-1 250,50;Продукты;Магазин
+01.03.2023;-300;Транспорт;Метро
+02.03.2023;5000;Зарплата;
+31.02.2023;-10;Продукты;
+03.03.2023;abc;Продукты;
+03.03.2023;-99,9;Продукты
+'''
+COLUMNS = {'expense_date': 'Дата', 'amount': 'Сумма',
+           'category': 'Категория', 'comment': 'Описание'}
+
+
+def test_import(cat_repo, exp_repo):
+    progress = []
+    stats = import_csv(io.StringIO(STATEMENT), cat_repo, exp_repo, batch_size=2,
+                       delimiter=';', columns=COLUMNS, date_format='%d.%m.%Y',
+                       sign=-1, progress=lambda s: progress.append(s.imported))
+    assert (stats.read, stats.imported, stats.skipped) == (6, 3, 3)
+    assert progress == [2, 3]
+    assert [error.split(':')[0] for error in stats.errors] == \
+        ['строка 4', 'строка 5', 'строка 6']
+    cats = {cat.name: cat.pk for cat in cat_repo.get_all()}
+    assert set(cats) == {'Продукты', 'Транспорт'}
+    assert [(e.expense_date, e.amount, e.category, e.comment)
+            for e in exp_repo.get_all()] == [
+        ('2023-03-01', 1250.5, cats['Продукты'], 'Магазин'),
+        ('2023-03-01', 300., cats['Транспорт'], 'Метро'),
+        ('2023-03-03', 99.9, cats['Продукты'], ''),
+    ]
+    assert stats.rows_per_second > 0
+
+
+def test_unknown_categories_skipped(cat_repo, exp_repo):
+    text = 'date,amount,category\n2023-03-01,10,Продукты\n2023-03-01,10,Кино\n'
+    stats = import_csv(io.StringIO(text), cat_repo, exp_repo, create_missing=False)
+    assert (stats.imported, stats.skipped) == (1, 1)
+    assert stats.errors == ["строка 3: unknown category 'Кино'"]
+    assert len(cat_repo.get_all()) == 1
+
+
+def test_missing_column(cat_repo, exp_repo):
+    with pytest.raises(ValueError):
+        import_csv(io.StringIO('date,sum,category\n'), cat_repo, exp_repo)
+
+
+def test_date_parser():
+    assert DateParser()('2023-03-01') == '2023-03-01'
+    assert DateParser('%d.%m.%Y')('01.03.2023') == '2023-03-01'
+    assert DateParser('%m/%d/%Y')('03/01/2023') == '2023-03-01'
+    with pytest.raises(ValueError):
+        DateParser('%d.%m.%Y')('01-03-2023')
+
+
+def test_field_limits(cat_repo, exp_repo):
+    text = ('date,amount,category,comment\n'
+            f'2023-03-01,10,Продукты,{"к" * 60}\n'
+            f'2023-03-01,10,{"д" * 31},\n'
+            '2023-03-01,nan,Продукты,\n'
+            '2023-03-01,inf,Продукты,\n')
+    stats = import_csv(io.StringIO(text), cat_repo, exp_repo)
+    assert (stats.imported, stats.skipped) == (1, 3)
+    assert exp_repo.get_all()[0].comment == 'к' * 50
+    assert len(cat_repo.get_all()) == 1
+
+
+def test_failed_batch_adds_no_categories(cat_repo, exp_repo, monkeypatch):
+    def fail(objs):
+        raise ValueError('disk is full')
+    monkeypatch.setattr(exp_repo, 'add_many', fail)
+    text = 'date,amount,category\n2023-03-01,10,Кино\n'
+    with pytest.raises(ValueError):
+        import_csv(io.StringIO(text), cat_repo, exp_repo)
+    assert [cat.name for cat in cat_repo.get_all()] == ['Продукты']
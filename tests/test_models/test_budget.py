@@ -1,6 +1,11 @@
+from datetime import date
+
 import pytest
 
-from bookkeeper.models.budget import Budget
+from bookkeeper.models.budget import (Budget, get_period_bounds, get_subtrees,
+                                      sum_budgets)
+from bookkeeper.models.category import Category
+from bookkeeper.repository.memory_repository import MemoryRepository
 
 def test_create_with_full_args_list():
     b = Budget(period='День', limit=100, spent=20, pk=1)
@@ -14,4 +19,65 @@ def test_period_values():
         b = Budget(period=period, limit=0, spent=0, pk=1)
     
     with pytest.raises(ValueError):
-        b = Budget(period='Квартал', limit=2, spent=4, pk=1)
\ No newline at end of file
+        b = Budget(period='Квартал', limit=2, spent=4, pk=1)
+    with pytest.raises(ValueError):
+        Budget('Интервал', start_date='2023-03-02', end_date='2023-03-01')
+    with pytest.raises(ValueError):
+        Budget('Интервал')
+    with pytest.raises(ValueError):
+        Budget('Окно', days=0)
+
+
+def test_period_bounds():
+    day = date(2023, 3, 15)  # wednesday
+    assert get_period_bounds('День', day) == (day, day)
+    assert get_period_bounds('Неделя', day) == (date(2023, 3, 13), date(2023, 3, 19))
+    assert get_period_bounds('Месяц', day) == (date(2023, 3, 1), date(2023, 3, 31))
+    assert get_period_bounds('Месяц', date(2024, 2, 10))[1] == date(2024, 2, 29)
+    with pytest.raises(ValueError):
+        get_period_bounds('Квартал', day)
+
+
+def test_get_bounds():
+    b = Budget(period='Неделя')
+    assert b.get_bounds(date(2023, 1, 1)) == ('2022-12-26', '2023-01-01')
+
+
+def test_range_and_window_bounds():
+    b = Budget('Интервал', start_date='2023-01-01', end_date='2023-03-31')
+    assert b.get_bounds(date(2024, 1, 1)) == ('2023-01-01', '2023-03-31')
+    assert b.describe() == 'Интервал 2023-01-01 - 2023-03-31'
+    b = Budget('Окно', days=7)
+    assert b.get_bounds(date(2023, 3, 2)) == ('2023-02-24', '2023-03-02')
+    assert b.describe() == 'Окно 7 дн.'
+    assert Budget('Месяц').describe() == 'Месяц'
+
+
+def test_overspent():
+    assert Budget('День', limit=100, spent=100.01).overspent
+    assert not Budget('День', limit=100, spent=100).overspent
+
+
+def test_sum_budgets():
+    day = date(2023, 3, 15)
+    budgets = [Budget('День'), Budget('Неделя'), Budget('Месяц', category=1),
+               Budget('Окно', days=30, category=3),
+               Budget('Интервал', start_date='2023-01-01', end_date='2023-01-31')]
+    expenses = [('2023-01-10', 1, 1.), ('2023-02-20', 3, 2.), ('2023-03-01', 2, 4.),
+                ('2023-03-01', None, 8.), ('2023-03-13', 1, 16.), ('2023-03-15', 3, 32.)]
+    subtrees = {1: {1, 2}, 3: {3}}
+    assert sum_budgets(budgets, expenses, day, subtrees) == [32., 48., 20., 34., 1.]
+    assert sum_budgets(budgets, [], day, subtrees) == [0.] * 5
+    assert sum_budgets([], expenses, day) == []
+
+
+def test_get_subtrees():
+    repo = MemoryRepository[Category]()
+    root, child, other = Category('root'), Category('child'), Category('other')
+    repo.add_many([root, other])
+    child.parent = root.pk
+    repo.add(child)
+    budgets = [Budget('День'), Budget('Месяц', category=root.pk),
+               Budget('Неделя', category=other.pk), Budget('День', category=root.pk)]
+    assert get_subtrees(budgets, repo) == {root.pk: {root.pk, child.pk},
+                                           other.pk: {other.pk}}
@@ -7,6 +7,7 @@ import pytest
 
 from bookkeeper.models.category import Category
 from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.utils import read_tree
 
 
 @pytest.fixture
@@ -106,3 +107,20 @@ def test_create_from_tree_error(repo):
     tree = [('1', 'parent'), ('parent', None)]
     with pytest.raises(KeyError):
         Category.create_from_tree(tree, repo)
+
+
+def test_create_from_tree_in_batches(repo):
+    tree = ((name, None if i == 0 else str(i - 1))
+            for i, name in enumerate(str(i) for i in range(10)))
+    cats = Category.create_from_tree(tree, repo, batch_size=3)
+    assert len(repo.get_all()) == 10
+    assert [c.name for c in cats[-1].get_all_parents(repo)] == \
+        [str(i) for i in range(8, -1, -1)]
+
+
+def test_create_from_tree_rollback(repo):
+    repo.add(Category('existing'))
+    text = ['parent', '    child1', '        grandchild', '      child2']
+    with pytest.raises(IndentationError):
+        Category.create_from_tree(read_tree(text), repo, batch_size=2)
+    assert [c.name for c in repo.get_all()] == ['existing']
@@ -0,0 +1,195 @@
+from datetime import date, timedelta
+
+import pytest
+
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.expense import Expense
+from bookkeeper.presenter import Bookkeeper
+from bookkeeper.repository.raw_sqlite_repository import RawSQLiteRepository
+from bookkeeper.utils import iso2display_date
+
+
+class StubView:
+    """ View replacement recording presenter calls """
+
+    class _Window:
+        def show(self):
+            pass
+
+    def __init__(self):
+        self.window = self._Window()
+        self.calls = []
+
+    def __getattr__(self, name):
+        def record(*args):
+            self.calls.append((name, *args))
+        return record
+
+
+class TmpRepository(RawSQLiteRepository):
+    """ Repository bound to temporary database by fixture """
+
+    @classmethod
+    def bind_database(cls, db_filename='database.db', profile=None):
+        return cls.get_pragmas()
+
+
+@pytest.fixture
+def bookkeeper(tmp_path):
+    RawSQLiteRepository.bind_database(str(tmp_path / 'presenter.db'))
+    return Bookkeeper(StubView(), TmpRepository)
+
+
+def day(days_ago):
+    return (date.today() - timedelta(days=days_ago)).isoformat()
+
+
+def add_expenses(bookkeeper, dates):
+    ctg = bookkeeper.cat_repo.get_all()[0].pk
+    exps = [Expense(amount=10., category=ctg, expense_date=d) for d in dates]
+    bookkeeper.exp_repo.add_many(exps)
+    return exps
+
+
+def sorted_pks(exps):
+    return [exp.pk for exp in sorted(exps, key=lambda exp: (exp.expense_date, exp.pk),
+                                     reverse=True)]
+
+
+def expense_data(bookkeeper, expense_date, amount='10'):
+    return {'expense_date': iso2display_date(expense_date), 'amount': amount,
+            'category': bookkeeper.cat_repo.get_all()[0].name, 'comment': ''}
+
+
+def apply(changes):
+    for change in changes:
+        change()
+
+
+def test_pages_with_equal_dates(bookkeeper):
+    exps = add_expenses(bookkeeper, [day(1)] * 5 + [day(3)] * 2 + [day(2)] * 3)
+    bookkeeper.expense_cursor = None
+    pages = [bookkeeper.expense_page(3) for _ in range(4)]
+    assert [len(page) for page in pages] == [3, 3, 3, 1]
+    assert [int(row[0]) for page in pages for row in page] == sorted_pks(exps)
+    assert bookkeeper.expense_cursor == ('', 0)
+    assert bookkeeper.expense_page(3) == []
+
+
+def test_add_expense_position(bookkeeper):
+    exps = add_expenses(bookkeeper, [day(1)] * 3 + [day(5)] * 3)
+    bookkeeper.expense_cursor = None
+    bookkeeper.expense_page(4)
+    view = bookkeeper.view
+
+    view.calls.clear()
+    apply(bookkeeper.add_expense(expense_data(bookkeeper, day(1))))
+    new_pk = bookkeeper.exp_repo.get_all(order_by='-pk', limit=1)[0].pk
+    (name, position, row), = view.calls
+    assert name == 'insert_expense_row'
+    assert position == 0  # the newest of the same date
+    assert row[0] == str(new_pk)
+
+    view.calls.clear()
+    apply(bookkeeper.add_expense(expense_data(bookkeeper, day(3))))
+    (name, position, row), = view.calls
+    assert position == 4  # after all expenses of day(1)
+
+    view.calls.clear()
+    apply(bookkeeper.add_expense(expense_data(bookkeeper, day(9))))
+    assert view.calls == []  # comes later with the next pages
+    assert len(exps) == 6
+
+
+def test_update_expense(bookkeeper):
+    exp, = add_expenses(bookkeeper, [day(1)])
+    bookkeeper.expense_cursor = None
+    bookkeeper.expense_page(10)
+    view = bookkeeper.view
+
+    view.calls.clear()
+    apply(bookkeeper.update_expense(str(exp.pk), expense_data(bookkeeper, day(1), '20')))
+    (name, row), = view.calls
+    assert name == 'update_expense_row'
+    assert row[0] == str(exp.pk) and row[2] == '20'
+
+    view.calls.clear()
+    apply(bookkeeper.update_expense(str(exp.pk), expense_data(bookkeeper, day(2))))
+    assert [call[0] for call in view.calls] == [
+        'remove_expense_rows', 'insert_expense_row']
+
+    view.calls.clear()
+    apply(bookkeeper.update_expense('1000', expense_data(bookkeeper, day(1))))
+    assert view.calls == [('remove_expense_rows', ['1000'])]
+    assert bookkeeper.exp_repo.get(1000) is None
+
+
+def test_delete_expenses(bookkeeper):
+    exps = add_expenses(bookkeeper, [day(0)] * 3)
+    view = bookkeeper.view
+    view.calls.clear()
+    del_pk = [str(exps[0].pk), str(exps[1].pk), '1000']
+    apply(bookkeeper.delete_expenses(del_pk))
+    assert view.calls == [('remove_expense_rows', del_pk)]
+    assert bookkeeper.exp_repo.get_all() == [exps[2]]
+
+
+def test_failed_delete_rolls_back(bookkeeper, monkeypatch):
+    exps = add_expenses(bookkeeper, [day(0)] * 3)
+    bookkeeper.update_budget_spent_column()
+    spent = [budget.spent for budget in bookkeeper.bgt_repo.get_all()]
+    delete_many = bookkeeper.exp_repo.delete_many
+
+    def fail(pks):
+        delete_many(pks)
+        raise RuntimeError
+
+    monkeypatch.setattr(bookkeeper.exp_repo, 'delete_many', fail)
+
+    with pytest.raises(RuntimeError):
+        bookkeeper.delete_expenses([str(exp.pk) for exp in exps])
+    assert bookkeeper.exp_repo.get_all() == exps
+    assert [budget.spent for budget in bookkeeper.bgt_repo.get_all()] == spent
+
+
+def test_budget_spent_delta(bookkeeper):
+    ctgs = bookkeeper.cat_repo.get_all()
+    bookkeeper.bgt_repo.add(Budget('Месяц', category=ctgs[1].pk))
+    add_expenses(bookkeeper, [day(0), day(2), day(40)])
+    bookkeeper.update_budget_spent_column()
+
+    def check():
+        spent = [budget.spent for budget in bookkeeper.bgt_repo.get_all()]
+        bookkeeper.update_budget_spent_column()
+        assert spent == [budget.spent for budget in bookkeeper.bgt_repo.get_all()]
+        return spent
+
+    before = check()
+    bookkeeper.add_expense(expense_data(bookkeeper, day(0), '12.5'))
+    assert check() != before
+    exp = bookkeeper.exp_repo.get_all(order_by='-pk', limit=1)[0]
+    data = expense_data(bookkeeper, day(0), '7')
+    bookkeeper.update_expense(str(exp.pk), dict(data))
+    check()
+    bookkeeper.update_expense(str(exp.pk), {**data, 'category': ctgs[1].name})
+    check()
+    bookkeeper.update_expense(str(exp.pk), {**data, 'category': ctgs[1].name,
+                                            'expense_date': iso2display_date(day(1))})
+    check()
+    bookkeeper.delete_expenses([str(exp.pk)])
+    assert check() == before
+
+
+def test_budget_rows_overspent(bookkeeper):
+    budget = bookkeeper.bgt_repo.get_all()[0]
+    budget.limit = 15.
+    bookkeeper.bgt_repo.update(budget)
+    add_expenses(bookkeeper, [day(0)])
+    bookkeeper.update_budget_spent_column()
+    row = next(row for row in bookkeeper.budget_rows() if row[0] == str(budget.pk))
+    assert row[-1] == ''
+    add_expenses(bookkeeper, [day(0)])
+    bookkeeper.update_budget_spent_column()
+    row = next(row for row in bookkeeper.budget_rows() if row[0] == str(budget.pk))
+    assert row[-1] == '1'
+    assert all(len(row) == 6 for row in bookkeeper.budget_rows())
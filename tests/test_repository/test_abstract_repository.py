@@ -18,3 +18,73 @@ def test_can_create_subclass():
 
     t = Test()
     assert isinstance(t, AbstractRepository)
+
+
+class Obj:
+    def __init__(self, pk=0, value=0):
+        self.pk = pk
+        self.value = value
+
+
+class DictRepository(AbstractRepository):
+    """ Repository with only abstract methods implemented """
+    def __init__(self):
+        self.objs = {}
+
+    def add(self, obj):
+        obj.pk = len(self.objs) + 1
+        self.objs[obj.pk] = obj
+        return obj.pk
+
+    def get(self, pk):
+        return self.objs.get(pk)
+
+    def get_all(self, where=None, order_by=None, limit=None):
+        return list(self.objs.values())
+
+    def update(self, obj):
+        self.objs[obj.pk] = obj
+
+    def delete(self, pk):
+        self.objs.pop(pk)
+
+
+@pytest.fixture
+def repo():
+    return DictRepository()
+
+
+def test_default_get_many(repo):
+    objs = [Obj() for i in range(5)]
+    for obj in objs:
+        repo.add(obj)
+    assert repo.get_many([1, 3, 10]) == {1: objs[0], 3: objs[2]}
+    assert repo.get_many([]) == {}
+
+
+def test_default_batch_methods(repo):
+    objs = [Obj() for i in range(5)]
+    assert repo.add_many(objs) == [1, 2, 3, 4, 5]
+    changed = [Obj(pk=2, value=20), Obj(pk=4, value=40)]
+    repo.update_many(changed)
+    assert [obj.value for obj in repo.get_all()] == [0, 20, 0, 40, 0]
+    repo.delete_many([1, 2])
+    assert repo.get_all() == [objs[2], changed[1], objs[4]]
+
+
+def test_default_aggregate(repo):
+    repo.add_many([Obj(value=v) for v in (3, 1, 3, 5)])
+    assert repo.aggregate('count') == 4
+    assert repo.aggregate('sum', 'value') == 12
+    assert repo.aggregate('max', 'value') == 5
+    assert repo.aggregate('count', group_by='value') == {1: 1, 3: 2, 5: 1}
+    with pytest.raises(ValueError):
+        repo.aggregate('median', 'value')
+
+
+def test_default_get_page_and_iter_all(repo):
+    objs = [Obj() for i in range(5)]
+    repo.add_many(objs)
+    assert repo.get_page(after_pk=2, limit=2) == objs[2:4]
+    assert repo.get_page(after_pk=5) == []
+    assert list(repo.iter_all(batch_size=2)) == objs
@@ -0,0 +1,90 @@
+import asyncio
+
+from bookkeeper.repository.async_abstract_repository import AsyncAbstractRepository
+from bookkeeper.repository.async_memory_repository import AsyncMemoryRepository
+
+import pytest
+
+
+class Custom():
+    def __init__(self, value=0, pk=0):
+        self.value = value
+        self.pk = pk
+
+
+async def collect(aiter):
+    return [obj async for obj in aiter]
+
+
+def test_cannot_create_abstract_repository():
+    with pytest.raises(TypeError):
+        AsyncAbstractRepository()
+
+
+def test_default_get_page_and_iter_all():
+    class Test(AsyncAbstractRepository):
+        def __init__(self):
+            self.objs = {}
+
+        async def add(self, obj):
+            obj.pk = len(self.objs) + 1
+            self.objs[obj.pk] = obj
+            return obj.pk
+
+        async def get(self, pk): return self.objs.get(pk)
+
+        async def get_all(self, where=None, order_by=None, limit=None):
+            return sorted(self.objs.values(), key=lambda obj: obj.pk)
+
+        async def update(self, obj): self.objs[obj.pk] = obj
+        async def delete(self, pk): self.objs.pop(pk)
+
+    async def main():
+        repo = Test()
+        for i in range(5):
+            await repo.add(Custom(i))
+        page = await repo.get_page(after_pk=2, limit=2)
+        objs = await collect(repo.iter_all(batch_size=2))
+        return page, objs
+
+    page, objs = asyncio.run(main())
+    assert [obj.pk for obj in page] == [3, 4]
+    assert [obj.pk for obj in objs] == [1, 2, 3, 4, 5]
+
+
+def test_memory_crud():
+    async def main():
+        repo = AsyncMemoryRepository(indexed_fields=['value'])
+        obj = Custom(1)
+        pk = await repo.add(obj)
+        assert obj.pk == pk
+        assert await repo.get(pk) is obj
+        upd = Custom(2, pk)
+        await repo.update(upd)
+        assert await repo.get_all({'value': 2}) == [upd]
+        await repo.delete(pk)
+        assert await repo.get(pk) is None
+        with pytest.raises(ValueError):
+            await repo.add(upd)
+
+    asyncio.run(main())
+
+
+def test_memory_concurrent_coroutines():
+    async def worker(repo, i):
+        obj = Custom(i % 3)
+        await repo.add(obj)
+        await asyncio.sleep(0)
+        obj.value += 10
+        await repo.update(obj)
+        return obj.pk
+
+    async def main():
+        repo = AsyncMemoryRepository(indexed_fields=['value'])
+        pks = await asyncio.gather(*(worker(repo, i) for i in range(100)))
+        objs = await collect(repo.iter_all({'value': ('>=', 10)}, batch_size=7))
+        return pks, objs
+
+    pks, objs = asyncio.run(main())
+    assert sorted(pks) == list(range(1, 101))
+    assert [obj.pk for obj in objs] == list(range(1, 101))
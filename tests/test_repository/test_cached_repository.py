@@ -0,0 +1,135 @@
+import pytest
+
+from bookkeeper.models.category import Category
+from bookkeeper.repository.cached_repository import CachedRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+
+
+class CountingRepository(MemoryRepository):
+    """ Memory repository counting read calls """
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+
+    def get(self, pk):
+        self.reads += 1
+        return super().get(pk)
+
+    def get_many(self, pks):
+        self.reads += 1
+        return super().get_many(pks)
+
+    def get_all(self, where=None, order_by=None, limit=None):
+        self.reads += 1
+        return super().get_all(where, order_by, limit)
+
+
+@pytest.fixture
+def inner():
+    return CountingRepository()
+
+
+@pytest.fixture
+def repo(inner):
+    return CachedRepository(inner)
+
+
+def test_get_is_cached(repo, inner):
+    c = Category('a')
+    pk = repo.add(c)
+    assert repo.get(pk) == c
+    assert repo.get(pk) == c
+    assert repo.get(100) is None
+    assert repo.get(100) is None
+    assert inner.reads == 2
+    assert (repo.hits, repo.misses) == (2, 2)
+
+
+def test_get_all_is_cached(repo, inner):
+    cats = [Category(str(i)) for i in range(3)]
+    repo.add_many(cats)
+    assert repo.get_all({'name': '1'}) == [cats[1]]
+    assert repo.get_all({'name': '1'}) == [cats[1]]
+    assert repo.get_all() == cats
+    assert repo.get(cats[2].pk) == cats[2]  # filled by get_all
+    assert inner.reads == 2
+    assert repo.hits == 2
+
+
+def test_get_many_uses_cache(repo, inner):
+    cats = [Category(str(i)) for i in range(3)]
+    pks = repo.add_many(cats)
+    repo.get(pks[0])
+    assert repo.get_many(pks + [100]) == dict(zip(pks, cats))
+    assert repo.get_many(pks + [100]) == dict(zip(pks, cats))
+    assert inner.reads == 2
+
+
+def test_precise_invalidation(repo, inner):
+    cats = [Category(str(i)) for i in range(3)]
+    repo.add_many(cats)
+    assert repo.get_all({'name': '0'}) == [cats[0]]
+    assert repo.get_all({'name': '1'}) == [cats[1]]
+    reads = inner.reads
+
+    new = Category('1')
+    repo.add(new)  # only query for name '1' is affected
+    assert repo.get_all({'name': '0'}) == [cats[0]]
+    assert inner.reads == reads
+    assert repo.get_all({'name': '1'}) == [cats[1], new]
+    assert inner.reads == reads + 1
+
+    upd = Category('0', pk=cats[1].pk)
+    repo.update(upd)
+    assert repo.get(cats[1].pk) == upd
+    assert repo.get_all({'name': '0'}) == [cats[0], upd]
+    assert repo.get_all({'name': '1'}) == [new]
+
+    repo.delete(cats[0].pk)
+    assert repo.get(cats[0].pk) is None
+    assert repo.get_all({'name': '0'}) == [upd]
+
+
+def test_lru_eviction(inner):
+    repo = CachedRepository(inner, max_objects=2, max_queries=1)
+    pks = repo.add_many([Category(str(i)) for i in range(3)])
+    for pk in pks:
+        repo.get(pk)
+    reads = inner.reads
+    repo.get(pks[2])
+    assert inner.reads == reads
+    repo.get(pks[0])  # evicted
+    assert inner.reads == reads + 1
+
+    repo.get_all({'name': '0'})
+    repo.get_all({'name': '1'})
+    repo.get_all({'name': '0'})  # evicted
+    assert inner.reads == reads + 4
+
+
+def test_transaction_rollback_clears_cache(repo, inner):
+    with pytest.raises(RuntimeError):
+        with repo.transaction():
+            pk = repo.add(Category('a'))
+            assert repo.get(pk) is not None
+            raise RuntimeError
+    assert repo.get(pk) is None
+    assert repo.get_all() == []
+
+
+def test_failed_update_invalidates(repo, inner):
+    def fail(*args):
+        raise RuntimeError
+
+    pk = repo.add(Category('a'))
+    inner.update = fail
+    inner.update_many = fail
+    for update in (repo.update, lambda obj: repo.update_many([obj])):
+        obj = repo.get(pk)
+        repo.get_all({'name': 'a'})
+        reads = inner.reads
+        with pytest.raises(RuntimeError):
+            update(obj)
+        repo.get(pk)
+        repo.get_all({'name': 'a'})
+        assert inner.reads == reads + 2
@@ -0,0 +1,139 @@
+import sys
+
+import pytest
+
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository import columnar_repository
+from bookkeeper.repository.columnar_repository import ColumnarExpenseRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+
+
+@pytest.fixture(params=['array', 'numpy'])
+def repo(request, monkeypatch):
+    if request.param == 'array':
+        monkeypatch.setattr(columnar_repository, 'np', None)
+    elif columnar_repository.np is None:
+        pytest.skip('numpy is not installed')
+    return ColumnarExpenseRepository()
+
+
+@pytest.fixture
+def expenses(repo):
+    objs = [Expense(amount, category, day, '2023-03-06 10:00', comment)
+            for amount, category, day, comment in [
+                (10., 1, '2023-03-02', 'кофе'), (20., 2, '2023-03-01', ''),
+                (30., 1, '2023-03-03', 'кофе'), (40., None, '2023-03-02', 'такси'),
+                (50., 2, '2023-03-05', '')]]
+    repo.add_many(objs)
+    return objs
+
+
+def test_crud(repo):
+    exp = Expense(100., 1, '2023-03-01', '2023-03-01 12:00', 'обед')
+    pk = repo.add(exp)
+    assert exp.pk == pk
+    assert repo.get(pk) == exp
+    assert repo.get(pk) is not exp  # objects are built on demand
+    exp.amount = 200.
+    exp.expense_date = '2023-03-02'
+    repo.update(exp)
+    assert repo.get(pk) == exp
+    repo.delete(pk)
+    assert repo.get(pk) is None
+    with pytest.raises(KeyError):
+        repo.delete(pk)
+    with pytest.raises(KeyError):
+        repo.update(exp)
+
+
+def test_invalid_objects(repo, expenses):
+    with pytest.raises(ValueError):
+        repo.add(Expense(1., 1, pk=1))
+    with pytest.raises(ValueError):
+        repo.add_many([Expense(1., 1), Expense(1., 1, expense_date='02-03-2023')])
+    with pytest.raises(ValueError):
+        repo.update(Expense(1., 1))
+    assert repo.get_all() == expenses
+
+
+def test_get_all(repo, expenses):
+    assert repo.get_all() == expenses
+    assert repo.get_all({'category': 1}) == [expenses[0], expenses[2]]
+    assert repo.get_all({'category': None}) == [expenses[3]]
+    assert repo.get_all({'amount': ('>', 20.), 'comment': ''}) == [expenses[4]]
+    assert repo.get_all({'expense_date': ('between', ('2023-03-02', '2023-03-03'))}) \
+        == [expenses[0], expenses[2], expenses[3]]
+    assert repo.get_all({'expense_date': ('<', '2023-03-02 12:00')}) == expenses[:2] + \
+        [expenses[3]]
+    assert repo.get_all({'comment': ('in', ['такси', 'чай'])}) == [expenses[3]]
+    assert repo.get_all({'pk': ('!=', expenses[0].pk), 'category': ('in', [1, 2])}) \
+        == [expenses[1], expenses[2], expenses[4]]
+    assert repo.get_all(order_by=['-expense_date', 'pk'], limit=3) == \
+        [expenses[4], expenses[2], expenses[0]]
+    assert repo.get_all(order_by=['comment', '-amount']) == \
+        [expenses[4], expenses[1], expenses[2], expenses[0], expenses[3]]
+    with pytest.raises(ValueError):
+        repo.get_all({'name': 'x'})
+    with pytest.raises(ValueError):
+        repo.get_all({'category': ('subtree', 1)})
+
+
+def test_aggregate(repo, expenses):
+    assert repo.aggregate('sum', 'amount') == 150.
+    assert repo.aggregate('count') == 5
+    assert repo.aggregate('min', 'expense_date') == '2023-03-01'
+    assert repo.aggregate('max', 'amount', {'category': 1}) == 30.
+    assert repo.aggregate('max', 'amount', {'category': 3}) is None
+    assert repo.aggregate('sum', 'amount', group_by='category') == \
+        {1: 40., 2: 70., None: 40.}
+    assert repo.aggregate('count', group_by='expense_date') == \
+        {'2023-03-01': 1, '2023-03-02': 2, '2023-03-03': 1, '2023-03-05': 1}
+    assert repo.aggregate('max', 'comment', group_by='category') == \
+        {1: 'кофе', 2: '', None: 'такси'}
+    with pytest.raises(ValueError):
+        repo.aggregate('median', 'amount')
+
+
+def test_page_iter_and_columns(repo, expenses):
+    assert repo.get_page(expenses[1].pk, 2) == expenses[2:4]
+    assert repo.get_many([expenses[4].pk, 100]) == {expenses[4].pk: expenses[4]}
+    for exp in repo.iter_all({'category': ('!=', 2)}, batch_size=2):
+        repo.delete(exp.pk)  # repository may change while iterating
+    assert repo.get_all() == [expenses[1], expenses[4]]
+    columns = repo.get_columns(['amount', 'expense_date'], {'amount': ('>', 20.)})
+    assert list(columns['amount']) == [50.]
+    assert columns['expense_date'].typecode == 'i'
+    with pytest.raises(ValueError):
+        repo.get_columns(['comment'])
+
+
+def test_delete_many_and_transaction(repo, expenses):
+    repo.delete_many([expenses[0].pk, expenses[3].pk])
+    assert repo.get_all() == [expenses[1], expenses[2], expenses[4]]
+    with pytest.raises(KeyError):
+        repo.delete_many([expenses[1].pk, expenses[0].pk])
+    with pytest.raises(RuntimeError):
+        with repo.transaction():
+            repo.add(Expense(1., 1, '2023-04-01'))
+            repo.delete(expenses[1].pk)
+            raise RuntimeError
+    assert repo.get_all() == [expenses[1], expenses[2], expenses[4]]
+
+
+def test_rollup(repo, expenses):
+    cat_repo = MemoryRepository[Category]()
+    cat_repo.add_many([Category('root'), Category('sub', 1)])
+    assert cat_repo.rollup(repo, 'amount', 'category') == {1: 110., 2: 70.}
+
+
+def test_memory_usage(repo):
+    objs = [Expense(float(i), i % 50, f'2023-{i % 12 + 1:02}-01', '2023-03-06 10:00',
+                    f'comment {i % 100}') for i in range(10000)]
+    repo.add_many(objs)
+    memory = MemoryRepository[Expense]()
+    memory.add_many(Expense(o.amount, o.category, o.expense_date[:], o.added_date,
+                            o.comment) for o in objs)
+    per_object = sum(sys.getsizeof(o) + sys.getsizeof(o.amount) + sys.getsizeof(o.pk)
+                     + sys.getsizeof(o.expense_date) for o in memory.get_all())
+    assert repo.memory_usage() * 4 < per_object
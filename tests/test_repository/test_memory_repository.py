@@ -1,4 +1,7 @@
 from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.abstract_repository import expand_subtree
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
 
 import pytest
 
@@ -69,3 +72,291 @@ def test_get_all_with_condition(repo, custom_class):
         objects.append(o)
     assert repo.get_all({'name': '0'}) == [objects[0]]
     assert repo.get_all({'test': 'test'}) == objects
+
+
+def test_get_all_with_operators(repo, custom_class):
+    objects = []
+    for i in range(5):
+        o = custom_class()
+        o.value = i
+        o.test = 'test'
+        repo.add(o)
+        objects.append(o)
+    assert repo.get_all({'value': ('>=', 3)}) == objects[3:]
+    assert repo.get_all({'value': ('<', 1), 'test': 'test'}) == objects[:1]
+    assert repo.get_all({'value': ('!=', 0)}) == objects[1:]
+    assert repo.get_all({'value': ('in', [1, 4])}) == [objects[1], objects[4]]
+    assert repo.get_all({'value': ('between', (1, 2))}) == objects[1:3]
+
+
+def test_get_all_order_by_and_limit(repo, custom_class):
+    objects = []
+    for value in [3, 1, 2]:
+        o = custom_class()
+        o.value = value
+        repo.add(o)
+        objects.append(o)
+    assert repo.get_all(order_by='value') == [objects[1], objects[2], objects[0]]
+    assert repo.get_all(order_by='-value', limit=2) == [objects[0], objects[2]]
+    assert repo.get_all({'value': ('>', 1)}, limit=1) == [objects[0]]
+
+
+def test_add_many(repo, custom_class):
+    objects = [custom_class() for i in range(5)]
+    pks = repo.add_many(objects)
+    assert pks == [o.pk for o in objects]
+    assert repo.get_all() == objects
+
+
+def test_cannot_add_many_with_pk(repo, custom_class):
+    objects = [custom_class() for i in range(3)]
+    objects[2].pk = 1
+    with pytest.raises(ValueError):
+        repo.add_many(objects)
+    assert repo.get_all() == []
+
+
+def test_update_many(repo, custom_class):
+    pks = repo.add_many([custom_class() for i in range(3)])
+    new_objects = []
+    for pk in pks:
+        o = custom_class()
+        o.pk = pk
+        new_objects.append(o)
+    repo.update_many(new_objects)
+    assert repo.get_all() == new_objects
+
+
+def test_cannot_update_missing(repo, custom_class):
+    o = custom_class()
+    o.pk = 1
+    with pytest.raises(KeyError):
+        repo.update(o)
+    with pytest.raises(KeyError):
+        repo.update_many([o])
+    assert repo.get_all() == []
+
+
+def test_delete_many(repo, custom_class):
+    objects = [custom_class() for i in range(5)]
+    pks = repo.add_many(objects)
+    repo.delete_many(pks[1:4])
+    assert repo.get_all() == [objects[0], objects[4]]
+    with pytest.raises(KeyError):
+        repo.delete_many([pks[0], pks[1]])
+    assert repo.get(pks[0]) == objects[0]
+
+
+@pytest.fixture
+def indexed_repo():
+    return MemoryRepository(indexed_fields=['name', 'parent'])
+
+
+def test_indexed_get_all(indexed_repo, custom_class):
+    objects = []
+    for i in range(6):
+        o = custom_class()
+        o.name = str(i % 3)
+        o.parent = i % 2
+        indexed_repo.add(o)
+        objects.append(o)
+    assert indexed_repo.get_all({'name': '0'}) == [objects[0], objects[3]]
+    assert indexed_repo.get_all({'name': '0', 'parent': 1}) == [objects[3]]
+    assert indexed_repo.get_all({'name': ('in', ['1', '2'])}) == \
+        [objects[1], objects[2], objects[4], objects[5]]
+    assert indexed_repo.get_all({'name': '0', 'pk': ('>', 1)}) == [objects[3]]
+    assert indexed_repo.get_all({'name': 'missing'}) == []
+
+
+def test_index_follows_changes(indexed_repo, custom_class):
+    o = custom_class()
+    o.name = 'a'
+    o.parent = None
+    pk = indexed_repo.add(o)
+
+    o.name = 'b'  # changed in place
+    indexed_repo.update(o)
+    assert indexed_repo.get_all({'name': 'a'}) == []
+    assert indexed_repo.get_all({'name': 'b'}) == [o]
+
+    indexed_repo.delete(pk)
+    assert indexed_repo.get_all({'name': 'b'}) == []
+    assert indexed_repo.get_all({'parent': None}) == []
+
+
+def test_index_memory_usage(indexed_repo, custom_class):
+    empty_usage = indexed_repo.index_memory_usage()
+    assert set(empty_usage) == {'name', 'parent'}
+    pks = []
+    for i in range(100):
+        o = custom_class()
+        o.name = str(i)
+        o.parent = None
+        pks.append(indexed_repo.add(o))
+    usage = indexed_repo.index_memory_usage()
+    assert usage['name'] > empty_usage['name']
+    assert usage['name'] > usage['parent']
+
+
+def test_aggregate(repo, custom_class):
+    for i in range(6):
+        o = custom_class()
+        o.amount = i
+        o.group = i % 2
+        repo.add(o)
+    assert repo.aggregate('sum', 'amount') == 15
+    assert repo.aggregate('count') == 6
+    assert repo.aggregate('min', 'amount', where={'amount': ('>', 2)}) == 3
+    assert repo.aggregate('max', 'amount', where={'group': 0}) == 4
+    assert repo.aggregate('sum', 'amount', group_by='group') == {0: 6, 1: 9}
+    assert repo.aggregate('count', where={'amount': ('<', 3)}, group_by='group') == \
+        {0: 2, 1: 1}
+    assert repo.aggregate('sum', 'amount', where={'amount': ('>', 10)}) == 0
+    assert repo.aggregate('max', 'amount', where={'amount': ('>', 10)}) is None
+    with pytest.raises(ValueError):
+        repo.aggregate('median', 'amount')
+
+
+def test_get_page_and_iter_all(repo, custom_class):
+    objects = []
+    for i in range(7):
+        o = custom_class()
+        o.group = i % 2
+        repo.add(o)
+        objects.append(o)
+    assert repo.get_page(limit=3) == objects[:3]
+    assert repo.get_page(after_pk=objects[2].pk, limit=3) == objects[3:6]
+    assert repo.get_page(after_pk=objects[6].pk) == []
+    assert repo.get_page(limit=2, where={'group': 1}) == [objects[1], objects[3]]
+
+    assert list(repo.iter_all(batch_size=2)) == objects
+    assert list(repo.iter_all({'group': 0}, batch_size=2)) == objects[::2]
+    for o in repo.iter_all(batch_size=2):  # repository may change while iterating
+        repo.delete(o.pk)
+    assert repo.get_all() == []
+
+
+def test_iter_all_reads_pages(repo, custom_class, monkeypatch):
+    objects = [custom_class() for i in range(5)]
+    repo.add_many(objects)
+    pages = []
+    get_page = repo.get_page
+    monkeypatch.setattr(repo, 'get_page',
+                        lambda *args: pages.append(get_page(*args)) or pages[-1])
+    iterator = repo.iter_all(batch_size=2)
+    assert next(iterator) is objects[0]
+    assert len(pages) == 1  # the rest is not read yet
+    assert list(iterator) == objects[1:]
+    assert [len(page) for page in pages] == [2, 2, 1]
+
+
+def test_get_many(repo, custom_class):
+    objects = [custom_class() for i in range(4)]
+    pks = repo.add_many(objects)
+    assert repo.get_many([pks[0], pks[2], pks[2], 100]) == \
+        {pks[0]: objects[0], pks[2]: objects[2]}
+    assert repo.get_many([]) == {}
+
+
+def test_get_all_order_by_many_fields(repo, custom_class):
+    objects = []
+    for value, group in [(1, 'a'), (2, 'b'), (3, 'a'), (4, 'b')]:
+        o = custom_class()
+        o.value = value
+        o.group = group
+        repo.add(o)
+        objects.append(o)
+    assert repo.get_all(order_by=['group', '-value']) == \
+        [objects[2], objects[0], objects[3], objects[1]]
+    assert repo.get_all(order_by=['-group', 'value'], limit=3) == \
+        [objects[1], objects[3], objects[0]]
+
+
+def test_transaction(custom_class):
+    repo = MemoryRepository(indexed_fields=['value'])
+    kept = custom_class()
+    kept.value = 1
+    repo.add(kept)
+    with repo.transaction():
+        obj = custom_class()
+        obj.value = 2
+        repo.add(obj)
+    assert len(repo.get_all()) == 2
+
+    with pytest.raises(RuntimeError):
+        with repo.transaction():
+            new = custom_class()
+            new.value = 3
+            repo.add(new)
+            repo.delete(kept.pk)
+            raise RuntimeError
+    assert repo.get_all() == [kept, obj]
+    assert repo.get_all({'value': 1}) == [kept]
+    assert repo.get_all({'value': 3}) == []
+
+
+def test_rollup():
+    cat_repo = MemoryRepository[Category]()
+    exp_repo = MemoryRepository[Expense]()
+    root = Category('root')
+    cat_repo.add(root)
+    sub = Category('sub', root.pk)
+    cat_repo.add(sub)
+    leaf = Category('leaf', sub.pk)
+    orphan = Category('orphan', 100)  # parent deleted
+    cat_repo.add_many([leaf, orphan])
+    exp_repo.add_many([Expense(amount=1., category=root.pk, expense_date='2023-03-01'),
+                       Expense(amount=10., category=leaf.pk, expense_date='2023-03-02'),
+                       Expense(amount=100., category=leaf.pk, expense_date='2023-04-01'),
+                       Expense(amount=1000., category=orphan.pk)])
+    march = {'expense_date': ('between', ('2023-03-01', '2023-03-31'))}
+    assert cat_repo.rollup(exp_repo, 'amount', 'category', march) == \
+        {root.pk: 11., sub.pk: 10., leaf.pk: 10., orphan.pk: 0}
+    assert cat_repo.rollup(exp_repo, 'amount', 'category')[orphan.pk] == 1000.
+
+
+def test_delete_middle_category():
+    repo = MemoryRepository[Category]()
+    root = Category('root')
+    repo.add(root)
+    mid = Category('mid', root.pk)
+    repo.add(mid)
+    leaf = Category('leaf', mid.pk)
+    repo.add(leaf)
+
+    with pytest.raises(RuntimeError):
+        with repo.transaction():
+            repo.delete(mid.pk)
+            raise RuntimeError
+    assert repo.get(leaf.pk).parent == mid.pk
+
+    repo.delete(mid.pk)  # children become top level, as in sqlite repositories
+    assert repo.get(leaf.pk).parent is None
+    assert repo.get_descendants(root.pk) == []
+
+
+def test_subtree_condition():
+    cat_repo = MemoryRepository[Category]()
+    exp_repo = MemoryRepository[Expense]()
+    root = Category('root')
+    cat_repo.add(root)
+    sub = Category('sub', root.pk)
+    other = Category('other')
+    cat_repo.add_many([sub, other])
+    objs = [Expense(amount=1., category=cat.pk) for cat in (root, sub, other)]
+    exp_repo.add_many(objs)
+    with pytest.raises(ValueError):
+        exp_repo.get_all({'category': ('subtree', root.pk)})
+    where = expand_subtree({'category': ('subtree', root.pk), 'amount': 1.}, cat_repo)
+    assert exp_repo.get_all(where) == objs[:2]
+
+
+def test_tree_methods_need_parent():
+    repo = MemoryRepository()
+    pk = repo.add(Expense(amount=1., category=1))
+    with pytest.raises(TypeError):
+        repo.get_ancestors(pk)
+    with pytest.raises(TypeError):
+        repo.get_descendants(pk)
+    with pytest.raises(TypeError):
+        repo.rollup(repo, 'amount', 'category')
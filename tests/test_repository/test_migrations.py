@@ -0,0 +1,141 @@
+import sqlite3
+
+from bookkeeper.repository.closure_table import create_closure_table
+from bookkeeper.repository.migrations import migrate, SCHEMA_VERSION
+
+
+def create_old_database(filename):
+    connection = sqlite3.connect(filename)
+    connection.execute(
+        'CREATE TABLE "Expense" ("pk" INTEGER PRIMARY KEY AUTOINCREMENT, '
+        '"amount" REAL NOT NULL, "category" INTEGER NOT NULL, '
+        '"comment" VARCHAR(50) NOT NULL, "added_date" VARCHAR(30) NOT NULL, '
+        '"expense_date" VARCHAR(30) NOT NULL)')
+    connection.execute(
+        'INSERT INTO "Expense" VALUES (1, 10.0, 1, \'\', \'13-03-2023 19:34\', '
+        '\'13-03-2023\')')
+    connection.execute(
+        'INSERT INTO "Expense" VALUES (2, 10.0, 1, \'\', \'2023-03-14 10:00\', '
+        '\'2023-03-14\')')
+    connection.commit()
+    connection.close()
+
+
+def read_dates(filename):
+    connection = sqlite3.connect(filename)
+    rows = connection.execute(
+        'SELECT "expense_date", "added_date" FROM "Expense" ORDER BY "pk"').fetchall()
+    version = connection.execute('PRAGMA user_version').fetchone()[0]
+    connection.close()
+    return rows, version
+
+
+def test_migrate_dates_to_iso(tmp_path):
+    filename = str(tmp_path / 'old.db')
+    create_old_database(filename)
+
+    migrate(filename)
+    rows, version = read_dates(filename)
+    assert rows == [('2023-03-13', '2023-03-13 19:34'),
+                    ('2023-03-14', '2023-03-14 10:00')]
+    assert version == SCHEMA_VERSION
+
+    migrate(filename)  # second run changes nothing
+    assert read_dates(filename) == (rows, version)
+
+
+def test_migrate_missing_file(tmp_path):
+    filename = tmp_path / 'new.db'
+    migrate(str(filename))
+    assert not filename.exists()
+
+
+def test_migrate_category_tree(tmp_path):
+    filename = str(tmp_path / 'old.db')
+    create_old_database(filename)
+    connection = sqlite3.connect(filename)
+    connection.execute(
+        'CREATE TABLE "Category" ("pk" INTEGER PRIMARY KEY AUTOINCREMENT, '
+        '"parent" INTEGER, "name" VARCHAR(30) NOT NULL)')
+    connection.executemany('INSERT INTO "Category" VALUES (?, ?, ?)',
+                           [(1, -1000, 'root'), (2, 1, 'a'), (3, 2, 'b'),
+                            (4, 77, 'lost')])
+    connection.commit()
+    connection.close()
+
+    migrate(filename)
+    connection = sqlite3.connect(filename)
+    rows = connection.execute('SELECT * FROM "CategoryTree" '
+                              'ORDER BY "descendant", "depth"').fetchall()
+    assert rows == [(1, 1, 0), (2, 2, 0), (1, 2, 1), (3, 3, 0), (2, 3, 1), (1, 3, 2),
+                    (4, 4, 0)]
+    # triggers keep the tree for new rows
+    connection.execute('INSERT INTO "Category" VALUES (5, 3, \'c\')')
+    assert connection.execute('SELECT count(*) FROM "CategoryTree" '
+                              'WHERE "descendant" = 5').fetchone()[0] == 4
+    indexes = [row[1] for row in connection.execute('PRAGMA index_list("Expense")')]
+    assert 'idx_expense__category' in indexes
+    connection.close()
+
+
+def test_migrate_daily_rollup(tmp_path):
+    filename = str(tmp_path / 'old.db')
+    create_old_database(filename)
+    migrate(filename)
+    connection = sqlite3.connect(filename)
+    assert connection.execute('SELECT * FROM "expense_daily" ORDER BY 1').fetchall() == \
+        [('2023-03-13', 1, 10., 1), ('2023-03-14', 1, 10., 1)]
+    # triggers keep the rollup for new rows
+    connection.execute('INSERT INTO "Expense" VALUES (3, 5.0, 1, \'\', '
+                       '\'2023-03-14 11:00\', \'2023-03-14\')')
+    assert connection.execute(
+        'SELECT "amount", "count" FROM "expense_daily" '
+        'WHERE "expense_date" = \'2023-03-14\'').fetchone() == (15., 2)
+    connection.close()
+
+
+def test_migrate_budget_scopes(tmp_path):
+    filename = str(tmp_path / 'old.db')
+    create_old_database(filename)
+    connection = sqlite3.connect(filename)
+    connection.execute(
+        'CREATE TABLE "Budget" ("pk" INTEGER PRIMARY KEY AUTOINCREMENT, '
+        '"period" VARCHAR(20) NOT NULL, "limit" REAL NOT NULL, "spent" REAL NOT NULL)')
+    connection.execute('INSERT INTO "Budget" VALUES (1, \'Месяц\', 100.0, 20.0)')
+    connection.commit()
+    connection.close()
+
+    migrate(filename)
+    connection = sqlite3.connect(filename)
+    assert connection.execute('SELECT * FROM "Budget"').fetchall() == \
+        [(1, 'Месяц', 100., 20., -1000, '', '', 0)]
+    connection.close()
+
+
+def test_migrate_detach_orphans(tmp_path):
+    filename = str(tmp_path / 'old.db')
+    connection = sqlite3.connect(filename)
+    connection.execute(
+        'CREATE TABLE "Category" ("pk" INTEGER PRIMARY KEY AUTOINCREMENT, '
+        '"parent" INTEGER, "name" VARCHAR(30) NOT NULL)')
+    connection.executemany('INSERT INTO "Category" VALUES (?, ?, ?)',
+                           [(1, -1000, 'root'), (2, 1, 'a'), (3, 2, 'b'),
+                            (4, 77, 'lost')])
+    create_closure_table(connection, 'Category', fill=True)
+    # delete trigger of version 4 kept parent of children
+    connection.execute('DROP TRIGGER "categorytree_delete"')
+    connection.execute('CREATE TRIGGER "categorytree_delete" AFTER DELETE ON "Category" '
+                       'BEGIN DELETE FROM "CategoryTree" '
+                       'WHERE "descendant" = OLD."pk" OR "ancestor" = OLD."pk"; END')
+    connection.execute('PRAGMA user_version = 4')
+    connection.commit()
+    connection.close()
+
+    migrate(filename)
+    connection = sqlite3.connect(filename)
+    assert connection.execute('SELECT "parent" FROM "Category" '
+                              'WHERE "pk" = 4').fetchone() == (-1000,)
+    connection.execute('DELETE FROM "Category" WHERE "pk" = 2')
+    assert connection.execute('SELECT "parent" FROM "Category" '
+                              'WHERE "pk" = 3').fetchone() == (-1000,)
+    connection.close()
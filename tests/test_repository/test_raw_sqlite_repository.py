@@ -0,0 +1,139 @@
+import sqlite3
+import sys
+
+from bookkeeper.repository.raw_sqlite_repository import RawSQLiteRepository
+from bookkeeper.repository.daily_rollup import main, rebuild_rollup, verify_rollup
+from bookkeeper.repository.sqlite_profile import database_path
+from bookkeeper.repository import migrations
+from bookkeeper.repository.migrations import SCHEMA_VERSION
+from bookkeeper.models.expense import Expense
+from bookkeeper.models.category import Category
+from bookkeeper.models.budget import Budget
+
+import pytest
+
+# the same tests as for pony repository, run with fixtures of this module
+from test_sqlite_repository import (  # noqa: F401
+    test_expense_crud, test_budget_crud, test_budget_scopes, test_category_crud,
+    test_cannot_add_with_pk, test_cannot_add_without_pk,
+    test_get_all_with_condition, test_get_all_with_operators,
+    test_get_all_order_by_and_limit, test_get_all_none_condition,
+    test_bulk_crud, test_update_missing, test_cannot_add_many_with_pk,
+    test_expense_date_range_and_order,
+    test_aggregate, test_get_page_and_iter_all, test_get_many,
+    test_get_all_order_by_many_fields, test_category_tree, test_delete_middle_category,
+    test_subtree_condition,
+    test_transaction, test_create_from_tree_rollback, test_rollup, test_daily_rollup,
+)
+
+
+@pytest.fixture(autouse=True)
+def database(tmp_path):
+    db_file = str(tmp_path / 'raw.db')
+    RawSQLiteRepository.bind_database(db_file)
+    return db_file
+
+
+@pytest.fixture
+def repo_expense():
+    return RawSQLiteRepository[Expense](Expense, Expense.__name__)
+
+
+@pytest.fixture
+def repo_category():
+    return RawSQLiteRepository[Category](Category, Category.__name__)
+
+
+@pytest.fixture
+def repo_budget():
+    return RawSQLiteRepository[Budget](Budget, Budget.__name__)
+
+
+def test_schema(database, repo_expense, repo_category):
+    connection = sqlite3.connect(database)
+    columns = {row[1]: (row[2], row[3]) for row in
+               connection.execute('PRAGMA table_info("Category")')}
+    assert columns == {'pk': ('INTEGER', 0), 'name': ('TEXT', 1),
+                       'parent': ('INTEGER', 0)}
+    indexes = [row[1] for row in connection.execute('PRAGMA index_list("Expense")')]
+    assert sorted(indexes) == ['idx_expense__category', 'idx_expense__expense_date']
+    connection.close()
+
+
+def test_none_stored_as_pony_does(database, repo_category):
+    repo_category.add(Category(name='top', parent=None))
+    connection = sqlite3.connect(database)
+    assert connection.execute('SELECT "parent" FROM "Category"').fetchone()[0] == -1000
+    connection.close()
+    assert repo_category.aggregate('count', group_by='parent') == {None: 1}
+
+
+def test_verify_and_rebuild_rollup(database, repo_expense):
+    repo_expense.add_many([Expense(amount=10., category=1, expense_date='2023-03-01'),
+                           Expense(amount=5., category=1, expense_date='2023-03-01'),
+                           Expense(amount=7., category=2, expense_date='2023-03-02')])
+    connection = sqlite3.connect(database)
+    assert verify_rollup(connection) == []
+    connection.execute('UPDATE "expense_daily" SET "amount" = 1 WHERE "category" = 1')
+    connection.execute('DELETE FROM "expense_daily" WHERE "category" = 2')
+    assert verify_rollup(connection) == [('2023-03-01', 1, 1., 2, 15., 2),
+                                         ('2023-03-02', 2, 0, 0, 7., 1)]
+    assert rebuild_rollup(connection) == 2
+    assert verify_rollup(connection) == []
+    connection.close()
+
+
+def test_daily_rollup_main(tmp_path, database, repo_expense, monkeypatch, capsys):
+    repo_expense.add(Expense(amount=10., category=1, expense_date='2023-03-01'))
+    monkeypatch.setattr(sys, 'argv', ['daily_rollup', 'verify', '--database', database])
+    with pytest.raises(SystemExit) as exit_info:
+        main()
+    assert exit_info.value.code == 0
+    assert '0 mismatching rows' in capsys.readouterr().out
+
+    # relative names are resolved as bind_database does, not against the cwd
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, 'argv', ['daily_rollup', 'verify', '--database', 'raw.db'])
+    with pytest.raises(SystemExit) as exit_info:
+        main()
+    assert exit_info.value.code == f'database file {database_path("raw.db")} not found'
+
+
+def test_new_database_not_migrated_again(tmp_path, monkeypatch):
+    db_file = str(tmp_path / 'new.db')
+    RawSQLiteRepository.bind_database(db_file)
+    RawSQLiteRepository[Category](Category, Category.__name__).add(Category('root'))
+    connection = sqlite3.connect(db_file)
+    assert connection.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+    connection.close()
+    applied = []
+    monkeypatch.setattr(migrations, 'MIGRATIONS',
+                        [lambda connection: applied.append(1)] * SCHEMA_VERSION)
+    RawSQLiteRepository.bind_database(db_file)
+    assert not applied
+
+
+def test_unknown_field(repo_expense):
+    with pytest.raises(ValueError):
+        repo_expense.get_all({'amount; DROP TABLE "Expense"': 1})
+    with pytest.raises(ValueError):
+        repo_expense.get_all(order_by='-nothing')
+
+
+def test_not_bound():
+    RawSQLiteRepository.connection.close()
+    RawSQLiteRepository.connection = None
+    with pytest.raises(RuntimeError):
+        RawSQLiteRepository(Expense, Expense.__name__)
+
+
+def test_profile(database):
+    pragmas = RawSQLiteRepository.bind_database(database, profile='interactive')
+    assert pragmas['journal_mode'] == 'WAL'
+    assert pragmas['synchronous'] == 'NORMAL'
+    assert pragmas['temp_store'] == 'MEMORY'
+    pragmas = RawSQLiteRepository.set_profile({'synchronous': 'OFF', 'cache_size': -500})
+    assert pragmas['synchronous'] == 'OFF'
+    assert pragmas['cache_size'] == -500
+    assert pragmas['journal_mode'] == 'WAL'  # kept in database file
+    assert RawSQLiteRepository.get_pragmas() == pragmas
@@ -0,0 +1,39 @@
+import sqlite3
+from os import path
+
+from bookkeeper.repository import sqlite_profile
+from bookkeeper.repository.sqlite_profile import (
+    PROFILES, PRAGMAS, apply_pragmas, database_path, read_pragmas, resolve_profile
+)
+
+import pytest
+
+
+def test_resolve_profile():
+    assert resolve_profile(None) == {}
+    assert resolve_profile('bulk_import') == PROFILES['bulk_import']
+    assert resolve_profile({'cache_size': -100}) == {'cache_size': -100}
+    with pytest.raises(ValueError):
+        resolve_profile('fastest')
+    with pytest.raises(ValueError):
+        resolve_profile({'foreign_keys': 1})
+    with pytest.raises(ValueError):
+        resolve_profile({'synchronous': 'OFF; DROP TABLE "Expense"'})
+
+
+def test_apply_and_read_pragmas(tmp_path):
+    connection = sqlite3.connect(tmp_path / 'test.db')
+    apply_pragmas(connection, PROFILES['interactive'])
+    assert read_pragmas(connection) == PROFILES['interactive']
+    apply_pragmas(connection, PROFILES['default'])
+    pragmas = read_pragmas(connection)
+    assert set(pragmas) == set(PRAGMAS)
+    assert pragmas == {**PROFILES['default'], 'journal_mode': 'WAL'}
+    connection.close()
+
+
+def test_database_path(tmp_path):
+    repository_dir = path.dirname(path.abspath(sqlite_profile.__file__))
+    assert database_path('database.db') == path.join(repository_dir, 'database.db')
+    assert database_path(':memory:') == ':memory:'
+    assert database_path(str(tmp_path / 'test.db')) == str(tmp_path / 'test.db')
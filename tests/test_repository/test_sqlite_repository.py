@@ -1,22 +1,43 @@
+from bookkeeper.repository import sqlite_repository
 from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.repository.async_sqlite_repository import AsyncSQLiteRepository
 from bookkeeper.models.expense import Expense
 from bookkeeper.models.category import Category
 from bookkeeper.models.budget import Budget
+from bookkeeper.repository.abstract_repository import AbstractRepository, expand_subtree
+from bookkeeper.repository.migrations import SCHEMA_VERSION
+from bookkeeper.utils import read_tree
 
 import pytest
 
 from os import remove, path
+import asyncio
 import random
+import sqlite3
 
 
 def test_bind_database():
-    filepath = 'D:\\Python\\mipt23-python-project-bookkeeper\\bookkeeper\\repository\\'
+    # pony resolves relative file names against the module calling bind
+    filepath = path.dirname(sqlite_repository.__file__)
     test_db_name = 'tmp_test_database.db'
 
-    if path.isfile(filepath + test_db_name):
-        remove(filepath + test_db_name)
+    if path.isfile(path.join(filepath, test_db_name)):
+        remove(path.join(filepath, test_db_name))
 
     SQLiteRepository.bind_database(test_db_name)
+    # new database has the current schema, it must not be migrated next time
+    connection = sqlite3.connect(path.join(filepath, test_db_name))
+    assert connection.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+    connection.close()
+
+
+def test_profile():
+    pragmas = SQLiteRepository.set_profile({'synchronous': 'OFF', 'cache_size': -500})
+    assert pragmas['synchronous'] == 'OFF'
+    assert pragmas['cache_size'] == -500
+    assert SQLiteRepository.get_pragmas() == pragmas
+    pragmas = SQLiteRepository.set_profile('default')
+    assert pragmas['synchronous'] == 'FULL'
 
 @pytest.fixture
 def repo_expense():
@@ -117,6 +138,17 @@ def test_budget_crud(repo_budget):
         repo_budget.delete(pk)
     assert all([repo_budget.get(pk) == None for pk in pks]) 
 
+
+def test_budget_scopes(repo_budget):
+    objs = [Budget('Интервал', 100., category=5, start_date='2023-01-01',
+                   end_date='2023-03-31'),
+            Budget('Окно', 50., days=30)]
+    pks = repo_budget.add_many(objs)
+    assert [repo_budget.get(pk) for pk in pks] == objs
+    assert repo_budget.get_all({'category': 5}) == [objs[0]]
+    for pk in pks:
+        repo_budget.delete(pk)
+
 def test_category_crud(repo_category):
     # test add
     objs = []
@@ -166,3 +198,321 @@ def test_get_all_with_condition(repo_expense):
         objs.append(p)
     assert repo_expense.get_all({'comment': '0', 'category': 10}) == [objs[0]]
     assert repo_expense.get_all({'category': 10}) == objs
+
+
+def test_get_all_with_operators(repo_expense):
+    objs = []
+    for i in range(5):
+        p = Expense(amount=float(i), category=20, expense_date=f'2023-02-0{i+1}')
+        repo_expense.add(p)
+        objs.append(p)
+
+    assert repo_expense.get_all({'category': 20, 'amount': ('>=', 3)}) == objs[3:]
+    assert repo_expense.get_all({'category': 20, 'amount': ('<', 1)}) == objs[:1]
+    assert repo_expense.get_all({'category': 20, 'amount': ('!=', 0)}) == objs[1:]
+    assert repo_expense.get_all({'pk': ('in', [objs[1].pk, objs[4].pk])}) == \
+        [objs[1], objs[4]]
+    assert repo_expense.get_all({'category': 20, 'amount': ('between', (1, 2))}) == \
+        objs[1:3]
+
+
+def test_get_all_order_by_and_limit(repo_expense):
+    objs = []
+    for amount in [3., 1., 2.]:
+        p = Expense(amount=amount, category=30)
+        repo_expense.add(p)
+        objs.append(p)
+
+    assert repo_expense.get_all({'category': 30}, order_by='amount') == \
+        [objs[1], objs[2], objs[0]]
+    assert repo_expense.get_all({'category': 30}, order_by='-amount', limit=2) == \
+        [objs[0], objs[2]]
+
+
+def test_get_all_none_condition(repo_category):
+    parent = Category(name='parent', parent=None)
+    repo_category.add(parent)
+    child = Category(name='child', parent=parent.pk)
+    repo_category.add(child)
+
+    assert parent in repo_category.get_all({'parent': None})
+    assert child not in repo_category.get_all({'parent': None})
+    assert repo_category.get_all({'parent': parent.pk}) == [child]
+
+
+def test_bulk_crud(repo_expense):
+    objs = [Expense(amount=float(i), category=40, comment=str(i)) for i in range(10)]
+    pks = repo_expense.add_many(objs)
+    assert pks == [obj.pk for obj in objs]
+    assert repo_expense.get_all({'category': 40}) == objs
+
+    upd_objs = [Expense(amount=100., category=40, pk=pk) for pk in pks[:5]]
+    repo_expense.update_many(upd_objs)
+    assert repo_expense.get_all({'category': 40, 'amount': 100.}) == upd_objs
+
+    repo_expense.delete_many(pks[:8] + [345678])
+    assert repo_expense.get_all({'category': 40}) == objs[8:]
+
+
+def test_update_missing(repo_expense):
+    with pytest.raises(KeyError):
+        repo_expense.update(Expense(amount=1., category=1, pk=345678))
+    pk = repo_expense.add(Expense(amount=1., category=45))
+    with pytest.raises(KeyError):
+        repo_expense.update_many([Expense(amount=2., category=45, pk=pk),
+                                  Expense(amount=2., category=45, pk=345678)])
+    assert repo_expense.get(pk).amount == 1.  # the batch is rolled back
+
+
+def test_cannot_add_many_with_pk(repo_expense):
+    objs = [Expense(amount=1., category=50), Expense(amount=1., category=50, pk=1)]
+    with pytest.raises(ValueError):
+        repo_expense.add_many(objs)
+    assert repo_expense.get_all({'category': 50}) == []
+
+
+def test_expense_date_range_and_order(repo_expense):
+    dates = ['2023-03-02', '2023-01-15', '2023-02-28', '2022-12-31']
+    objs = [Expense(amount=1., category=60, expense_date=d) for d in dates]
+    repo_expense.add_many(objs)
+
+    assert repo_expense.get_all({'category': 60, 'expense_date': (
+        'between', ('2023-01-01', '2023-02-28'))}, order_by='expense_date') == \
+        [objs[1], objs[2]]
+    assert repo_expense.get_all({'category': 60}, order_by='-expense_date') == \
+        [objs[0], objs[2], objs[1], objs[3]]
+
+
+def test_aggregate(repo_expense):
+    repo_expense.add_many([Expense(amount=float(i), category=70 + i % 2, comment='agg')
+                           for i in range(6)])
+    where = {'comment': 'agg'}
+
+    assert repo_expense.aggregate('sum', 'amount', where=where) == 15.
+    assert repo_expense.aggregate('count', where=where) == 6
+    assert repo_expense.aggregate(
+        'min', 'amount', where={**where, 'amount': ('>', 2)}) == 3.
+    assert repo_expense.aggregate('max', 'amount', where={'category': 70}) == 4.
+    assert repo_expense.aggregate('sum', 'amount', where=where, group_by='category') == \
+        {70: 6., 71: 9.}
+    assert repo_expense.aggregate('count', where={**where, 'amount': ('<', 3)},
+                                  group_by='category') == {70: 2, 71: 1}
+    assert repo_expense.aggregate('sum', 'amount', where={'category': 79}) == 0
+    assert repo_expense.aggregate('max', 'amount', where={'category': 79}) is None
+    with pytest.raises(ValueError):
+        repo_expense.aggregate('median', 'amount')
+
+
+def test_get_page_and_iter_all(repo_expense):
+    objs = [Expense(amount=float(i), category=80 + i % 2) for i in range(7)]
+    repo_expense.add_many(objs)
+    where = {'category': ('in', [80, 81])}
+
+    assert repo_expense.get_page(limit=3, where=where) == objs[:3]
+    assert repo_expense.get_page(after_pk=objs[2].pk, limit=3, where=where) == objs[3:6]
+    assert repo_expense.get_page(after_pk=objs[6].pk, where=where) == []
+    assert repo_expense.get_page(limit=2, where={'category': 81}) == [objs[1], objs[3]]
+
+    assert list(repo_expense.iter_all(where, batch_size=2)) == objs
+    assert list(repo_expense.iter_all({'category': 80}, batch_size=3)) == objs[::2]
+
+
+def test_get_many(repo_category):
+    objs = [Category(name=str(i)) for i in range(4)]
+    pks = repo_category.add_many(objs)
+    assert repo_category.get_many([pks[0], pks[2], pks[2], 345678]) == \
+        {pks[0]: objs[0], pks[2]: objs[2]}
+    assert repo_category.get_many([]) == {}
+
+
+def test_get_all_order_by_many_fields(repo_expense):
+    objs = [Expense(amount=float(i), category=90, expense_date=d)
+            for i, d in enumerate(['2023-01-01', '2023-01-02',
+                                   '2023-01-01', '2023-01-02'])]
+    repo_expense.add_many(objs)
+    assert repo_expense.get_all({'category': 90}, order_by=['-expense_date', '-pk']) == \
+        [objs[3], objs[1], objs[2], objs[0]]
+    assert repo_expense.get_all({'category': 90}, order_by=['expense_date', '-amount'],
+                                limit=3) == [objs[2], objs[0], objs[3]]
+
+
+def test_category_tree(repo_category):
+    root = Category('root')
+    repo_category.add(root)
+    a = Category('a', root.pk)
+    d = Category('d', root.pk)
+    repo_category.add_many([a, d])
+    b = Category('b', a.pk)
+    repo_category.add(b)
+    c = Category('c', b.pk)
+    repo_category.add(c)
+
+    assert repo_category.get_ancestors(c.pk) == [b, a, root]
+    assert repo_category.get_ancestors(root.pk) == []
+    descendants = repo_category.get_descendants(root.pk)
+    assert {obj.name for obj in descendants[:2]} == {'a', 'd'}
+    assert [obj.name for obj in descendants[2:]] == ['b', 'c']
+    assert repo_category.get_descendants(345678) == []
+
+    b.parent = d.pk  # move subtree
+    repo_category.update(b)
+    assert repo_category.get_ancestors(c.pk) == [b, d, root]
+    assert repo_category.get_descendants(a.pk) == []
+    assert repo_category.get_descendants(d.pk) == [b, c]
+
+    repo_category.delete(b.pk)  # children of deleted category become top level
+    assert repo_category.get_ancestors(c.pk) == []
+    assert repo_category.get(c.pk).parent is None
+    assert {obj.name for obj in repo_category.get_descendants(root.pk)} == {'a', 'd'}
+
+
+def test_subtree_condition(repo_category, repo_expense):
+    root = Category('root')
+    repo_category.add(root)
+    sub = Category('sub', root.pk)
+    repo_category.add(sub)
+    leaf = Category('leaf', sub.pk)
+    repo_category.add(leaf)
+    other = Category('other')
+    repo_category.add(other)
+    objs = [Expense(amount=float(i + 1), category=cat.pk)
+            for i, cat in enumerate([root, sub, leaf, other])]
+    repo_expense.add_many(objs)
+
+    assert repo_expense.get_all({'category': ('subtree', sub.pk)}, order_by='pk') \
+        == objs[1:3]
+    assert repo_expense.aggregate('sum', 'amount', {'category': ('subtree', root.pk)}) \
+        == 6.
+    assert repo_category.get_all({'pk': ('subtree', other.pk)}) == [other]
+    # the same condition expanded into 'in' works for any repository
+    where = expand_subtree({'category': ('subtree', sub.pk)}, repo_category)
+    assert repo_expense.get_all(where, order_by='pk') == objs[1:3]
+
+
+def test_transaction(repo_category):
+    with repo_category.transaction():
+        a = Category('transaction a')
+        repo_category.add(a)
+        repo_category.add(Category('transaction b', a.pk))
+    names = ['transaction a', 'transaction b']
+    assert len(repo_category.get_all({'name': ('in', names)})) == 2
+
+    with pytest.raises(RuntimeError):
+        with repo_category.transaction():
+            repo_category.add(Category('rolled back'))
+            repo_category.delete(a.pk)
+            raise RuntimeError
+    assert repo_category.get_all({'name': 'rolled back'}) == []
+    assert repo_category.get(a.pk) == a
+
+
+def test_create_from_tree_rollback(repo_category):
+    text = ['tree root', '    tree child', '        tree grandchild', '      bad']
+    with pytest.raises(IndentationError):
+        Category.create_from_tree(read_tree(text), repo_category, batch_size=2)
+    assert repo_category.get_all({'name': ('in', ['tree root', 'tree child'])}) == []
+
+    cats = Category.create_from_tree(read_tree(text[:3]), repo_category, batch_size=2)
+    assert repo_category.get_descendants(cats[0].pk) == cats[1:]
+
+
+def rollup_data(repo_category, repo_expense):
+    root = Category('rollup root')
+    repo_category.add(root)
+    sub = Category('rollup sub', root.pk)
+    repo_category.add(sub)
+    leaf = Category('rollup leaf', sub.pk)
+    other = Category('rollup other', root.pk)
+    repo_category.add_many([leaf, other])
+    repo_expense.add_many([
+        Expense(amount=1., category=root.pk, expense_date='2023-03-01'),
+        Expense(amount=10., category=sub.pk, expense_date='2023-03-02'),
+        Expense(amount=100., category=leaf.pk, expense_date='2023-03-03'),
+        Expense(amount=1000., category=leaf.pk, expense_date='2023-04-01'),
+    ])
+    return root, sub, leaf, other
+
+
+def test_rollup(repo_category, repo_expense):
+    root, sub, leaf, other = rollup_data(repo_category, repo_expense)
+    march = {'expense_date': ('between', ('2023-03-01', '2023-03-31'))}
+    totals = repo_category.rollup(repo_expense, 'amount', 'category', march)
+    assert set(totals) == {cat.pk for cat in repo_category.get_all()}
+    assert [totals[cat.pk] for cat in (root, sub, leaf, other)] == [111., 110., 100., 0]
+    totals = repo_category.rollup(repo_expense, 'amount', 'category')
+    assert totals[sub.pk] == 1110.
+
+
+def test_daily_rollup(repo_expense):
+    days = {'expense_date': ('between', ('2001-01-01', '2001-01-31'))}
+    objs = [Expense(amount=0.1 * i, category=80 + i % 3,
+                    expense_date=f'2001-01-0{i % 4 + 1}')
+            for i in range(12)]
+    repo_expense.add_many(objs)
+    objs[0].amount = 5.
+    objs[1].expense_date = '2001-01-09'
+    objs[2].category = None
+    repo_expense.update_many(objs[:3])
+    repo_expense.delete(objs[3].pk)
+    repo_expense.delete_many([obj.pk for obj in objs if obj.expense_date == '2001-01-02'])
+    stored = repo_expense.get_all(days)
+
+    # aggregates are read from the rollup table and must match the rows
+    assert repo_expense.aggregate('count', where=days) == len(stored)
+    assert repo_expense.aggregate('sum', 'amount', days) == \
+        pytest.approx(sum(obj.amount for obj in stored))
+    by_day = repo_expense.aggregate('sum', 'amount', days, group_by='expense_date')
+    assert '2001-01-02' not in by_day
+    assert by_day == pytest.approx(
+        {day: sum(obj.amount for obj in stored if obj.expense_date == day)
+         for day in {obj.expense_date for obj in stored}})
+    assert repo_expense.aggregate('count', where={**days, 'category': None}) == 1
+    assert repo_expense.aggregate('max', 'expense_date', days) == '2001-01-09'
+
+
+def test_async_repository():
+    async def worker(repo, i):
+        obj = Expense(amount=float(i), category=100 + i % 2)
+        pk = await repo.add(obj)
+        assert await repo.get(pk) == obj
+        obj.comment = 'updated'
+        await repo.update(obj)
+        return obj
+
+    async def main():
+        repo = AsyncSQLiteRepository[Expense](Expense, Expense.__name__,
+                                              max_connections=3)
+        try:
+            objs = await asyncio.gather(*(worker(repo, i) for i in range(20)))
+            objs = sorted(objs, key=lambda obj: obj.pk)
+            assert await repo.get_all({'category': 100}, order_by='pk') == \
+                [obj for obj in objs if obj.category == 100]
+            assert [obj async for obj in repo.iter_all({'category': ('in', [100, 101])},
+                                                       batch_size=6)] == objs
+            await asyncio.gather(*(repo.delete(obj.pk) for obj in objs))
+            assert await repo.get_all({'category': 101}) == []
+        finally:
+            repo.close()
+
+    asyncio.run(main())
+
+
+def test_delete_middle_category(repo_category, repo_expense):
+    root = Category('root')
+    repo_category.add(root)
+    mid = Category('mid', root.pk)
+    repo_category.add(mid)
+    leaf = Category('leaf', mid.pk)
+    repo_category.add(leaf)
+    repo_expense.add_many([Expense(amount=1., category=root.pk),
+                           Expense(amount=10., category=leaf.pk)])
+
+    repo_category.delete(mid.pk)
+    assert repo_category.get(leaf.pk).parent is None
+    assert repo_category.get_ancestors(leaf.pk) == []
+    assert repo_category.get_descendants(root.pk) == []
+    # closure table and parent fields describe the same hierarchy
+    totals = repo_category.rollup(repo_expense, 'amount', 'category')
+    assert totals == AbstractRepository.rollup(repo_category, repo_expense,
+                                               'amount', 'category')
+    assert (totals[root.pk], totals[leaf.pk]) == (1., 10.)
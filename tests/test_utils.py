@@ -1,9 +1,13 @@
+from inspect import isgenerator
 import tempfile
 from textwrap import dedent
 
 import pytest
 
-from bookkeeper.utils import read_tree
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.utils import (read_tree, iso2display_date, display2iso_date, date_range,
+                              expense_pages)
 
 
 def test_create_tree():
@@ -14,7 +18,7 @@ def test_create_tree():
             child2
         parent2
     ''')
-    assert read_tree(text.splitlines()) == [
+    assert list(read_tree(text.splitlines())) == [
         ('parent1', None),
         ('child1', 'parent1'),
         ('grandchild', 'child1'),
@@ -33,7 +37,7 @@ def test_ignore_empty_strings():
 
         parent2
     ''')
-    assert read_tree(text.splitlines()) == [
+    assert list(read_tree(text.splitlines())) == [
         ('parent1', None),
         ('child1', 'parent1'),
         ('grandchild', 'child1'),
@@ -50,7 +54,7 @@ def test_indentation_error():
           child2
     ''')
     with pytest.raises(IndentationError):
-        read_tree(text.splitlines())
+        list(read_tree(text.splitlines()))
 
 
 def test_with_file():
@@ -64,10 +68,47 @@ def test_with_file():
     with tempfile.TemporaryFile('w+') as f:
         f.write(text)
         f.seek(0)
-        assert read_tree(f) == [
+        assert list(read_tree(f)) == [
             ('parent1', None),
             ('child1', 'parent1'),
             ('grandchild', 'child1'),
             ('child2', 'parent1'),
             ('parent2', None)
         ]
+
+
+def test_read_tree_is_lazy():
+    def lines():
+        yield 'parent1'
+        yield '    child1'
+        raise AssertionError('line read too early')
+
+    pairs = read_tree(lines())
+    assert isgenerator(pairs)
+    assert next(pairs) == ('parent1', None)
+
+
+def test_date_conversion():
+    assert iso2display_date('2023-03-01') == '01-03-2023'
+    assert display2iso_date('01-03-2023') == '2023-03-01'
+    assert display2iso_date(iso2display_date('2022-12-31')) == '2022-12-31'
+
+
+def test_date_range():
+    assert date_range() == {}
+    assert date_range('2023-03-01') == {'expense_date': ('>=', '2023-03-01')}
+    assert date_range(end='2023-03-01') == {'expense_date': ('<=', '2023-03-01')}
+    assert date_range('2023-03-01', '2023-03-02') == {
+        'expense_date': ('between', ('2023-03-01', '2023-03-02'))}
+
+
+def test_expense_pages():
+    repo = MemoryRepository[Expense]()
+    for day in ['2023-03-02', '2023-03-01', '2023-03-02', '2023-03-04', '2023-03-02']:
+        repo.add(Expense(1., 1, day))
+    pages = list(expense_pages(repo, page_size=2))
+    assert [[(exp.expense_date, exp.pk) for exp in page] for page in pages] == [
+        [('2023-03-01', 2), ('2023-03-02', 1)], [('2023-03-02', 3), ('2023-03-02', 5)],
+        [('2023-03-04', 4)]]
+    assert [len(page) for page in expense_pages(repo, '2023-03-02', '2023-03-03', 2)] \
+        == [2, 1]
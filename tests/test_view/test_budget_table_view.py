@@ -2,7 +2,7 @@ from pytestqt.qt_compat import qt_api
 
 from PySide6 import QtWidgets, QtCore
 
-from bookkeeper.view.budget_table_view import BudgetWidget
+from bookkeeper.view.budget_table_view import BudgetWidget, OVERSPENT_COLOR
 
 class CallbackChecker():
     def __init__(self):
@@ -73,4 +73,16 @@ def test_update(qtbot):
     assert callback_checker.args[0] == '1' and callback_checker.args[1] == '4000'
 
 
+def test_overspent_highlight(qtbot):
+    user_data = [['1', 'Day', '1000', '500', '-500', '1'],
+                 ['2', 'Week', '200', '600', '400', '']]
 
+    widget = BudgetWidget()
+    qtbot.addWidget(widget)
+    widget.set_data(user_data)
+
+    for col in range(4):
+        assert widget.table.item(0, col).background().color() == OVERSPENT_COLOR
+        assert widget.table.item(0, col).toolTip()
+        assert widget.table.item(1, col).background().color() != OVERSPENT_COLOR
+        assert not widget.table.item(1, col).toolTip()
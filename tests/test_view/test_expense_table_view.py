@@ -110,17 +110,120 @@ def test_table_mtg(qtbot):
 
     w.set_data(user_data)
 
-    assert w.table.columnCount() == 4
-    assert w.table.rowCount() == len(user_data)
+    assert w.model.columnCount() == 4
+    assert w.model.rowCount() == len(user_data)
 
     for row in range(len(user_data)):
         for col in range(4):
-            item = QtWidgets.QTableWidgetItem(w.table.item(row, col))
+            index = w.model.index(row, col)
 
-            assert item.text() == user_data[row][col+1]
+            assert w.model.data(index) == user_data[row][col+1]
 
-            assert item.flags() == (QtCore.Qt.ItemFlag.ItemIsSelectable |
-                                        QtCore.Qt.ItemFlag.ItemIsEnabled)
+            assert w.model.flags(index) == (QtCore.Qt.ItemFlag.ItemIsSelectable |
+                                            QtCore.Qt.ItemFlag.ItemIsEnabled)
+
+    w.close()
+
+
+def test_fetch_more_mtg(qtbot):
+    w = MainTableWidget(None)
+    qtbot.addWidget(w)
+
+    all_rows = [[str(i), '01-01-2022', '1.0', 'cat1', ''] for i in range(5)]
+    requested = []
+
+    def fetch(n):
+        requested.append(n)
+        start = len(w.user_data)
+        return all_rows[start:start + n]
+
+    w.model.fetch_batch = 2
+    w.register_fetch_callback(fetch)
+    w.set_data(all_rows[:2])
+    assert w.model.rowCount() == 2
+    assert w.model.canFetchMore()
+
+    w.model.fetchMore()
+    assert w.model.rowCount() == 4
+    assert w.model.canFetchMore()
+    w.model.fetchMore()
+    assert w.model.rowCount() == 5
+    assert not w.model.canFetchMore()
+    assert w.user_data == all_rows
+    assert requested == [2, 2]
+
+    w.set_data(all_rows[:1])  # new data can be fetched again
+    assert w.model.canFetchMore()
+
+    w.close()
+
+
+def test_fetch_later_mtg(qtbot):
+    w = MainTableWidget(None)
+    qtbot.addWidget(w)
+    w.model.fetch_batch = 2
+    requested = []
+    w.register_fetch_callback(lambda n: requested.append(n))  # rows come later
+    w.set_data([['0', '01-01-2022', '1.0', 'cat1', '']])
+
+    w.model.fetchMore()
+    assert requested == [2]
+    assert not w.model.canFetchMore()  # waiting for requested rows
+
+    w.append_rows([['1', '01-01-2022', '1.0', 'cat1', ''],
+                   ['2', '01-01-2022', '1.0', 'cat1', '']])
+    assert w.model.rowCount() == 3
+    assert w.model.canFetchMore()
+    w.model.fetchMore()
+    w.append_rows([])
+    assert not w.model.canFetchMore()
+
+    w.close()
+
+
+def test_fetch_failed_mtg(qtbot):
+    w = MainTableWidget(None)
+    qtbot.addWidget(w)
+    w.model.fetch_batch = 2
+    w.register_fetch_callback(lambda n: None)  # rows come later
+    w.set_data([['0', '01-01-2022', '1.0', 'cat1', '']])
+    w.model.fetchMore()
+    assert not w.model.canFetchMore()
+    w.fetch_failed()  # background task failed, rows will not come
+    assert w.model.canFetchMore()
+
+    def fail(n):
+        raise ValueError('bad')
+
+    w.register_fetch_callback(fail)
+    with pytest.raises(ValueError):
+        w.model.fetchMore()
+    assert w.model.canFetchMore()
+
+    w.close()
+
+
+def test_row_deltas_mtg(qtbot):
+    w = MainTableWidget(None)
+    qtbot.addWidget(w)
+    rows = [[str(i), '01-01-2022', '1.0', 'cat1', ''] for i in range(3)]
+    w.set_data([row.copy() for row in rows])
+
+    with qtbot.waitSignal(w.model.rowsInserted):
+        w.insert_row(1, ['10', '02-01-2022', '5.0', 'cat2', 'new'])
+    assert [row[0] for row in w.user_data] == ['0', '10', '1', '2']
+    w.insert_row(100, ['11', '01-01-2021', '1.0', 'cat1', ''])
+    assert w.user_data[-1][0] == '11'
+
+    with qtbot.waitSignal(w.model.dataChanged):
+        w.update_row(['1', '01-01-2022', '7.0', 'cat2', 'upd'])
+    assert w.model.data(w.model.index(2, 1)) == '7.0'
+    w.update_row(['99', '01-01-2022', '7.0', 'cat2', ''])  # not loaded
+    assert w.model.rowCount() == 5
+
+    with qtbot.waitSignal(w.model.rowsRemoved):
+        w.remove_rows(['0', '2', '99'])
+    assert [row[0] for row in w.user_data] == ['10', '1', '11']
 
     w.close()
 
@@ -0,0 +1,83 @@
+import threading
+
+from bookkeeper.view.task_runner import TaskRunner
+
+
+def test_run_in_background(qtbot):
+    runner = TaskRunner()
+    results = []
+    gui_thread = threading.get_ident()
+
+    with qtbot.waitSignal(runner.busy_changed) as busy:
+        runner.run(threading.get_ident, results.append)
+    assert busy.args == [True]
+
+    with qtbot.waitSignal(runner.busy_changed) as busy:
+        pass
+    assert busy.args == [False]
+    assert len(results) == 1 and results[0] != gui_thread
+
+
+def test_results_in_order(qtbot):
+    runner = TaskRunner()
+    results = []
+    for i in range(5):
+        runner.run(lambda i=i: i * i, results.append)
+    qtbot.waitUntil(lambda: not runner.pending)
+    assert results == [0, 1, 4, 9, 16]
+
+
+def test_stale_results_dropped(qtbot):
+    runner = TaskRunner()
+    started = threading.Event()
+    release = threading.Event()
+    results = []
+    calls = []
+
+    def blocking():
+        started.set()
+        release.wait(5)
+        return 'write'
+
+    def read(value):
+        calls.append(value)
+        return value
+
+    runner.run(blocking, results.append, key='data')
+    started.wait(5)
+    runner.run(lambda: read('old'), results.append, key='data', supersede=True)
+    runner.run(lambda: read('new'), results.append, key='data', supersede=True)
+    runner.run(lambda: 'other', results.append, key='other', supersede=True)
+    release.set()
+    qtbot.waitUntil(lambda: not runner.pending)
+
+    assert calls == ['new']  # superseded read is not run
+    assert results == ['new', 'other']
+
+
+def test_error_reported_in_gui_thread(qtbot):
+    runner = TaskRunner()
+    results = []
+
+    def fail():
+        raise ValueError('bad')
+
+    with qtbot.captureExceptions() as exceptions:
+        with qtbot.waitSignal(runner.failed) as failed:
+            runner.run(fail, results.append)
+        qtbot.waitUntil(lambda: not runner.pending)
+    assert isinstance(failed.args[0], ValueError)
+    assert not exceptions  # nothing is raised into Qt event loop
+    assert results == []
+
+
+def test_error_passed_to_callback(qtbot):
+    runner = TaskRunner()
+    errors = []
+
+    def fail():
+        raise ValueError('bad')
+
+    with qtbot.waitSignal(runner.failed):
+        runner.run(fail, errors.append, on_error=errors.append)
+    assert len(errors) == 1 and isinstance(errors[0], ValueError)